@@ -14,6 +14,7 @@ import {
   message,
   Card,
   Collapse,
+  Switch,
 } from "antd";
 import { SearchOutlined } from "@ant-design/icons";
 
@@ -42,6 +43,8 @@ function App() {
   const [results, setResults] = useState({});
   const [loading, setLoading] = useState(false);
   const [showSources, setShowSources] = useState(false);
+  // Full document text by default; snippets only send the matching passages
+  const [snippetsOnly, setSnippetsOnly] = useState(false);
 
   const handleInputChange = (e) => {
     setQuery(e.target.value);
@@ -58,7 +61,7 @@ function App() {
 
     try {
       // Fixed API URL - added back the 'api/' prefix to match the Django URL configuration
-      const apiUrl = `${API_BASE_URL}/api/search/?q=${encodeURIComponent(query)}`;
+      const apiUrl = `${API_BASE_URL}/api/search/?q=${encodeURIComponent(query)}${snippetsOnly ? "&snippets=true" : ""}`;
       console.log(`Calling API: ${apiUrl}`);
       
       const response = await axios.get(apiUrl, {
@@ -132,6 +135,14 @@ function App() {
           Search
         </Button>
       </div>
+      <div style={styles.optionsContainer}>
+        <Switch
+          size="small"
+          checked={snippetsOnly}
+          onChange={setSnippetsOnly}
+        />
+        <Text style={styles.optionLabel}>Show matching passages only</Text>
+      </div>
 
       {loading ? (
         <div style={styles.loading}>
@@ -141,6 +152,11 @@ function App() {
         <div>
           {results["answer"] && (
             <Card style={styles.answerCard}>
+              {results["extractive"] && (
+                <Tag color="green" style={styles.extractiveTag}>
+                  Quoted from the top source
+                </Tag>
+              )}
               <div className="markdown-body">
                 <ReactMarkdown 
                   remarkPlugins={[remarkGfm]}
@@ -171,7 +187,9 @@ function App() {
             dataSource={results["relevant_documents"] || []}
                 renderItem={(item) => {
                   // For display in the UI, prioritize regular text content
-                  const displayText = item.text || item.description || '';
+                  const displayText = item.snippets
+                    ? item.snippets.map((snippet) => snippet.text).join(' … ')
+                    : item.text || item.description || '';
                   
                   return (
               <Card
@@ -251,6 +269,16 @@ const styles = {
   searchButton: {
     width: "150px",
   },
+  optionsContainer: {
+    display: "flex",
+    justifyContent: "center",
+    alignItems: "center",
+    marginTop: "-10px",
+    marginBottom: "20px",
+  },
+  optionLabel: {
+    marginLeft: "8px",
+  },
   loading: {
     display: "flex",
     justifyContent: "center",
@@ -279,6 +307,9 @@ const styles = {
     color: "#555",
     fontSize: "16px",
   },
+  extractiveTag: {
+    marginBottom: "10px",
+  },
   sourcesButton: {
     marginTop: "10px",
     padding: "0",
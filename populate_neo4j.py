@@ -308,10 +308,17 @@ def create_indexes(session):
     ON EACH [n.id, n.text, n.title, n.space_name, n.space_key]
     """)
     
+    from docuquery.graph.acl import create_acl_indexes
+    create_acl_indexes(session)
+
+    from docuquery.graph.faq import create_faq_indexes
+    create_faq_indexes(session)
+
     print("Created Neo4j indexes")
 
 def clear_existing_data(session):
     session.run("MATCH (n:Confluence) DETACH DELETE n")
+    session.run("MATCH (n) WHERE n:AclUser OR n:AclGroup DETACH DELETE n")
     print("Cleared existing Confluence data")
 
 def create_confluence_node(session, page):
@@ -319,8 +326,10 @@ def create_confluence_node(session, page):
     try:
         # Extract relevant data from the page
         page_id = page.get('id')
-        title = page.get('title', '')
-        space_name = page.get('space_name', '')
+        # Decoded here once so search responses can return fields as stored;
+        # BeautifulSoup already decodes the entities of the body text
+        title = html.unescape(page.get('title') or '')
+        space_name = html.unescape(page.get('space_name') or '')
         space_key = page.get('space_key', '')
         
         # Extract plain text content from HTML
@@ -330,12 +339,12 @@ def create_confluence_node(session, page):
         if 'body' in page and 'storage' in page.get('body', {}):
             html_content = page['body']['storage'].get('value', '')
             soup = BeautifulSoup(html_content, 'html.parser')
-            text = html.unescape(soup.get_text(separator=' ', strip=True))
+            text = soup.get_text(separator=' ', strip=True)
         # Check for the v1 API format
         elif 'content' in page and 'body' in page.get('content', {}) and 'storage' in page.get('content', {}).get('body', {}):
             html_content = page['content']['body']['storage'].get('value', '')
             soup = BeautifulSoup(html_content, 'html.parser')
-            text = html.unescape(soup.get_text(separator=' ', strip=True))
+            text = soup.get_text(separator=' ', strip=True)
         
         # Generate embedding for the document text
         text_for_embedding = f"{title} {text}"
@@ -359,8 +368,35 @@ def create_confluence_node(session, page):
         print(f"  Error creating node for page {page.get('title', 'Unknown')}: {str(e)}")
         return False
 
+def get_question_embeddings(texts):
+    """Embeddings of FAQ questions in one request; unlike get_embedding, failures raise"""
+    from openai import OpenAI
+    client = OpenAI(api_key=OPENAI_API_KEY)
+    response = client.embeddings.create(model="text-embedding-ada-002", input=texts)
+    return [item.embedding for item in response.data]
+
+def faq_source(page):
+    """Title, space key and storage format body of a page, for the FAQ index"""
+    from docuquery.graph.faq import storage_html
+    return html.unescape(page.get('title') or ''), page.get('space_key', ''), storage_html(page)
+
+def store_faq_pages(session, faq_pages):
+    """Split FAQ and how-to pages into questions; only changed pages are embedded again"""
+    from docuquery.constants.faq import FAQ_ENABLED
+    from docuquery.graph.faq import sync_faq_pages
+    if not FAQ_ENABLED:
+        return
+    if not OPENAI_API_KEY:
+        # Random fallback embeddings would be stored as unchanged for good
+        print("Skipping the FAQ index: OPENAI_API_KEY is not set")
+        return
+    counts = sync_faq_pages(session, faq_pages, get_question_embeddings)
+    print(f"Stored FAQ questions: {counts['questions']} from {counts['pages']} changed pages, "
+          f"{counts['unchanged']} pages unchanged, {counts['removed']} removed")
+
 def fetch_and_store_confluence_data():
     """Fetch data from Confluence API and store in Neo4j"""
+    from docuquery.graph.acl import PageAcls
     client = ConfluenceClient()
     
     # Get spaces
@@ -397,6 +433,10 @@ def fetch_and_store_confluence_data():
         
         total_spaces = len(spaces.get('results', []))
         successful_pages = 0
+        # Read restrictions, stored once every page and its ancestors are known
+        page_acls = PageAcls(client)
+        # Sources of the ingested pages, split into the FAQ index at the end
+        faq_pages = {}
         total_pages = 0
         processed_page_ids = set()  # Keep track of processed pages to avoid duplicates
         
@@ -433,6 +473,9 @@ def fetch_and_store_confluence_data():
                     try:
                         # Get full page content
                         page_data = client.get_page_content(page.get('id'))
+                        # Recorded even if the page fails to ingest: its restrictions
+                        # still apply to its children
+                        page_acls.add(page.get('id'))
                         if page_data:
                             # Add space information to the page data
                             page_data['space_name'] = space.get('name')
@@ -440,6 +483,7 @@ def fetch_and_store_confluence_data():
                             if create_confluence_node(session, page_data):
                                 successful_pages += 1
                                 processed_page_ids.add(page.get('id'))
+                                faq_pages[page.get('id')] = faq_source(page_data)
                         
                         # Check for child pages
                         child_pages_data = client.get_child_pages(page.get('id'))
@@ -454,11 +498,22 @@ def fetch_and_store_confluence_data():
             except Exception as e:
                 print(f"ERROR processing space {space.get('name', 'Unknown')}: {str(e)}")
         
+        page_acls.store(session)
+        store_faq_pages(session, faq_pages)
+
         print(f"\nSummary: Processed {total_pages} pages from {total_spaces} spaces")
         print(f"Successfully created {successful_pages} nodes in Neo4j")
     
     return successful_pages > 0
 
+def refresh_vector_mirror():
+    """Re-export the embeddings the web workers search in-process"""
+    from docuquery.constants.retrieval import VECTOR_MIRROR_ENABLED
+    if not VECTOR_MIRROR_ENABLED:
+        return
+    from docuquery.graph.vector_mirror import export_all
+    export_all(driver=driver)
+
 def main():
     # Validate required environment variables
     missing_vars = []
@@ -485,6 +540,7 @@ def main():
     
     if success:
         print("Successfully populated Neo4j with Confluence data")
+        refresh_vector_mirror()
     else:
         print("Failed to populate Neo4j with Confluence data")
 
@@ -0,0 +1,94 @@
+"""
+Compares answering a list of queries with one POST /api/search/batch call
+against one GET /api/search/ call per query.
+
+Separate calls are sent --concurrency at a time, the way internal tools
+loop over their questions. The report gives the wall time and queries per
+second of both, the time to the first streamed batch result, and how
+many distinct queries the batch searched.
+
+Needs a running server; with the local OpenAI stand-in
+(benchmarks/llm_stub.py) LLM latency is controlled and free.
+
+Usage:
+    python benchmarks/batch_search.py --url http://127.0.0.1:8000 --queries questions.txt --concurrency 1
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import DEFAULT_QUERIES
+
+
+def run_separate(base_url, queries, concurrency, timeout):
+    session = requests.Session()
+
+    def search(query):
+        return session.get(f"{base_url}/api/search/", params={"q": query}, timeout=timeout).status_code
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(search, queries))
+    elapsed = time.monotonic() - started
+    return {
+        "seconds": round(elapsed, 2),
+        "queries_per_second": round(len(queries) / elapsed, 2),
+        "errors": sum(1 for status in statuses if status != 200),
+    }
+
+
+def run_batch(base_url, queries, timeout):
+    started = time.monotonic()
+    first = None
+    errors = 0
+    summary = {}
+    with requests.post(
+        f"{base_url}/api/search/batch", json={"queries": queries}, stream=True, timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            if "summary" in result:
+                summary = result["summary"]
+                continue
+            first = first or time.monotonic() - started
+            errors += 1 if "error" in result else 0
+    elapsed = time.monotonic() - started
+    return {
+        "seconds": round(elapsed, 2),
+        "queries_per_second": round(len(queries) / elapsed, 2),
+        "first_result_seconds": round(first, 2) if first else None,
+        "errors": errors,
+        "distinct": summary.get("distinct"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server base URL")
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--repeat", type=int, default=1, help="send the query list this many times over")
+    parser.add_argument("--concurrency", type=int, default=1, help="separate calls in flight")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as file:
+            queries = [line.strip() for line in file if line.strip()]
+    queries = queries * args.repeat
+
+    separate = run_separate(args.url, queries, args.concurrency, args.timeout)
+    print(f"separate: {json.dumps(separate)}")
+    batch = run_batch(args.url, queries, args.timeout)
+    print(f"batch:    {json.dumps(batch)}")
+    print(f"speedup:  {separate['seconds'] / batch['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Times building the relevant_documents entries of a search response.
+
+Compares the per-document work views.search used to do, parsing the
+"key: value" page content built by the retrieval query (line splitting and
+html.unescape, then regex clean-up of the text), with copying the fields
+the retrieval query now returns as metadata. Pages are synthetic, with
+--words words of body text each.
+
+Usage:
+    python benchmarks/document_fields.py --documents 10 --words 8000
+"""
+import argparse
+import html
+import random
+import re
+import statistics
+import sys
+import time
+
+VOCABULARY = (
+    "redcap project user role survey data export access consortium study site funding protocol "
+    "enrollment biospecimen tracker guide login the and of a to in for with &amp; &rsquo;s"
+).split()
+
+
+def time_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def parse_document_content(page_content):
+    # As removed from DocuQueryMultiRetriever
+    properties = {}
+    content_lines = []
+    for line in page_content.strip().split('\n'):
+        if line.strip().startswith('data_source:'):
+            continue
+        content_lines.append(line)
+    for line in content_lines:
+        key_value = line.split(':', 1)
+        if len(key_value) == 2:
+            key = key_value[0].strip()
+            value = key_value[1].strip()
+            if value and key not in ['data_source']:
+                properties[key] = html.unescape(value)
+    return properties
+
+
+def parsed_document(page_content, metadata):
+    # The document loop views.search used to run
+    data = parse_document_content(page_content)
+    if not data.get("text"):
+        page_text = page_content
+        page_text = re.sub(r'id:"[^"]*"\s*', '', page_text)
+        page_text = re.sub(r'title:"[^"]*"\s*', '', page_text)
+        page_text = re.sub(r'data_source:"[^"]*"\s*', '', page_text)
+        data["text"] = page_text.strip()
+    return {
+        "id": data.get("id", metadata.get("id", "")),
+        "title": data.get("title", metadata.get("title", "")),
+        "data_source": metadata.get("data_source", ""),
+        "text": data.get("text", ""),
+        "space_name": data.get("space_name", metadata.get("space_name", "")),
+        "space_key": data.get("space_key", metadata.get("space_key", "")),
+        "score": metadata.get("similarity"),
+    }
+
+
+def structured_document(page_content, metadata):
+    # The document loop of views.search
+    return {
+        "id": metadata.get("id", ""),
+        "title": metadata.get("title", ""),
+        "data_source": metadata.get("data_source", ""),
+        "text": page_content,
+        "space_name": metadata.get("space_name", ""),
+        "space_key": metadata.get("space_key", ""),
+        "score": metadata.get("similarity"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--words", type=int, default=8000, help="words of body text per page")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    pages = []
+    for i in range(args.documents):
+        fields = {
+            "id": str(1000 + i),
+            "title": f"Page {i}",
+            "space_name": "RDCRN Platform Documentation",
+            "space_key": "RPD",
+        }
+        # Page bodies are stored as one line of text
+        body = " ".join(random.choices(VOCABULARY, k=args.words))
+        # Old retrieval: every text property folded into the page content
+        legacy = "".join(f"\n{key}: {value}" for key, value in {**fields, "text": body}.items())
+        metadata = {"data_source": "confluence", "similarity": 0.8}
+        pages.append((legacy, metadata, body, {**metadata, **fields}))
+
+    parsed_ms = time_ms(lambda: [parsed_document(legacy, metadata) for legacy, metadata, _, _ in pages], args.repeat)
+    structured_ms = time_ms(
+        lambda: [structured_document(body, metadata) for _, _, body, metadata in pages], args.repeat
+    )
+    print(f"parse page content   p50 {parsed_ms:9.3f} ms")
+    print(f"copy metadata        p50 {structured_ms:9.3f} ms")
+    if structured_ms > parsed_ms:
+        print("FAIL: copying fields is slower than parsing")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
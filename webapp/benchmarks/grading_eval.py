@@ -0,0 +1,151 @@
+"""
+Compares the local relevancy graders with the LLM grader on logged queries.
+
+Each line of the input JSONL file is a logged query:
+
+    {"query": "...", "query_embedding": [...],
+     "documents": [{"page_content": "...", "metadata": {"_embedding_": [...]}}]}
+
+Lines with only a query are retrieved live (with stored embeddings), and
+`query_embedding` is computed when missing. Use --save to write the
+retrieved documents back out, so later runs need no Neo4j.
+
+For every local mode the script reports agreement, precision and recall
+against the LLM verdicts at the configured threshold, the threshold that
+agrees best with the LLM, and the grading time per query.
+
+Usage:
+    python benchmarks/grading_eval.py logged_queries.jsonl --save graded.jsonl --output report.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from langchain_core.documents import Document
+
+from docuquery.graph.DocuQueryMultiRetriever import RETRIEVAL_SOURCES, retrieve_from_source, relevancy_check
+from docuquery.graph.graders import LOCAL_GRADERS
+from docuquery.graph.neo4j_retrievers.base import Neo4jBaseRetriever
+
+
+def load_cases(path):
+    embeddings = None
+    cases = []
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            if case.get("query_embedding") is None:
+                embeddings = embeddings or Neo4jBaseRetriever().get_embeddings()
+                case["query_embedding"] = embeddings.embed_query(case["query"])
+            if "documents" in case:
+                case["documents"] = [Document(**document) for document in case["documents"]]
+            else:
+                case["documents"] = [
+                    document
+                    for source in RETRIEVAL_SOURCES
+                    for document in retrieve_from_source(
+                        source, case["query"], case["query_embedding"], include_embeddings=True
+                    )
+                ]
+            cases.append(case)
+    return cases
+
+
+def llm_verdicts(case):
+    relevant = relevancy_check({
+        "user_query": case["query"],
+        "accessible_documents": case["documents"],
+        "grading_mode": "llm",
+    })["relevant_documents"]
+    relevant_ids = {id(document) for document in relevant}
+    return [id(document) in relevant_ids for document in case["documents"]]
+
+
+def compare(expected, predicted):
+    pairs = list(zip(expected, predicted))
+    true_positive = sum(1 for e, p in pairs if e and p)
+    predicted_positive = sum(1 for _, p in pairs if p)
+    expected_positive = sum(1 for e, _ in pairs if e)
+    return {
+        "agreement": sum(1 for e, p in pairs if e == p) / len(pairs) if pairs else None,
+        "precision": true_positive / predicted_positive if predicted_positive else None,
+        "recall": true_positive / expected_positive if expected_positive else None,
+    }
+
+
+def evaluate_mode(mode, cases, expected):
+    grader = LOCAL_GRADERS[mode]()
+    timings = []
+    scores = []
+    for case in cases:
+        started = time.perf_counter()
+        case_scores = grader.scores(case["query"], case["documents"], case["query_embedding"])
+        timings.append((time.perf_counter() - started) * 1000)
+        scores.extend(case_scores)
+
+    # Documents without a score are kept by the grader, mirror that here
+    def verdicts(threshold):
+        return [score is None or score >= threshold for score in scores]
+
+    candidates = sorted({score for score in scores if score is not None})
+    best_threshold = max(
+        candidates or [grader.threshold],
+        key=lambda threshold: compare(expected, verdicts(threshold))["agreement"] or 0,
+    )
+    return {
+        "threshold": grader.threshold,
+        **compare(expected, verdicts(grader.threshold)),
+        "best_threshold": best_threshold,
+        "best_agreement": compare(expected, verdicts(best_threshold))["agreement"],
+        "ms_per_query_p50": statistics.median(timings) if timings else None,
+        "ms_per_query_max": max(timings) if timings else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="JSONL file of logged queries")
+    parser.add_argument("--save", help="write queries with their documents and LLM verdicts to this JSONL file")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    cases = load_cases(args.queries)
+    expected = []
+    for case in cases:
+        case["llm_verdicts"] = case.get("llm_verdicts") or llm_verdicts(case)
+        expected.extend(case["llm_verdicts"])
+
+    report = {
+        "queries": len(cases),
+        "documents": len(expected),
+        "modes": {mode: evaluate_mode(mode, cases, expected) for mode in LOCAL_GRADERS},
+    }
+    print(json.dumps(report, indent=4))
+
+    if args.save:
+        with open(args.save, "w") as file:
+            for case in cases:
+                file.write(json.dumps({
+                    **case,
+                    "documents": [
+                        {"page_content": document.page_content, "metadata": document.metadata}
+                        for document in case["documents"]
+                    ],
+                # Embeddings from the vector mirror are arrays
+                }, default=lambda value: value.tolist()) + "\n")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures hedged chat completions against plain ones.
+
+Starts the local OpenAI stand-in (benchmarks/llm_stub.py) with a long
+tailed --chat-latency and sends --calls completions, --concurrency at a
+time, through llm_provider.call_with_deadline: once without hedging and
+once per --budgets value with hedging. The report gives latency
+percentiles, the share of calls that were duplicated, how often the
+duplicate answered first, and the extra requests the stand-in served.
+
+Usage:
+    python benchmarks/hedging.py --calls 2000 --concurrency 32 --chat-latency lognormal:0.8,0.6
+    python benchmarks/hedging.py --budgets 0.02,0.05,0.1 --quantile 0.95 --output hedging.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from llm_stub import add_stub_arguments, start_stub, stub_config
+
+
+def run(calls, concurrency, timeout, policy, hedge, config):
+    from docuquery.graph.llm_provider import call_with_deadline, get_openai_client
+
+    def request():
+        return get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": "What is the RDCRN?"}],
+            max_tokens=20,
+            timeout=timeout,
+        )
+
+    def call(_):
+        started = time.monotonic()
+        try:
+            call_with_deadline(request, ("gpt-4o-mini", "generation"), timeout, hedge=hedge, policy=policy)
+            return (time.monotonic() - started) * 1000, None
+        except Exception as e:
+            return (time.monotonic() - started) * 1000, type(e).__name__
+
+    before = config.requests["chat"]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(calls)))
+    # Let abandoned attempts finish, so they are counted as sent
+    time.sleep(timeout if hedge else 0)
+    latencies = sorted(latency for latency, error in results if error is None)
+    stats = policy.stats()
+
+    def at(fraction):
+        return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)], 1) if latencies else None
+
+    return {
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1) if latencies else None,
+            "p90": at(0.90),
+            "p99": at(0.99),
+            "max": round(latencies[-1], 1) if latencies else None,
+        },
+        "errors": sum(1 for _, error in results if error is not None),
+        "hedge_rate": stats["hedge_rate"],
+        "hedge_win_rate": stats["hedge_win_rate"],
+        "stub_requests": config.requests["chat"] - before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=10.0, help="hard per-call timeout")
+    parser.add_argument("--budgets", default="0.05", help="comma separated hedge budgets to compare")
+    parser.add_argument("--quantile", type=float, default=0.9, help="latency quantile to hedge after")
+    parser.add_argument("--stub-port", type=int, default=8092)
+    parser.add_argument("--output", help="write results to this JSON file")
+    add_stub_arguments(parser)
+    parser.set_defaults(chat_latency="lognormal:0.5,0.8", tokens_per_second=1000.0, answer_tokens=20)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from docuquery.graph.llm_provider import HedgePolicy
+
+    config = stub_config(args)
+    stub = start_stub(config, port=args.stub_port)
+    results = {}
+    try:
+        results["unhedged"] = run(args.calls, args.concurrency, args.timeout, HedgePolicy(), False, config)
+        for budget in args.budgets.split(","):
+            policy = HedgePolicy(budget=float(budget), quantile=args.quantile)
+            results[f"hedged {budget}"] = run(args.calls, args.concurrency, args.timeout, policy, True, config)
+    finally:
+        stub.shutdown()
+
+    print(f"{'':<14} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'hedged':>8} {'won':>8} {'requests':>9}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<14} {latency['p50'] or 0:>8.1f} {latency['p90'] or 0:>8.1f} {latency['p99'] or 0:>8.1f} "
+            f"{latency['max'] or 0:>8.1f} {(result['hedge_rate'] or 0) * 100:>7.1f}% "
+            f"{(result['hedge_win_rate'] or 0) * 100:>7.1f}% {result['stub_requests']:>9}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+                "results": results,
+            }, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Checks what a worker has to import before it can answer a request.
+
+Runs a fresh interpreter with `python -X importtime` --runs times per
+target and parses its report:
+
+    health    Django setup and the URL conf, i.e. everything /api/health/ needs
+    pipeline  the search pipeline (docuquery.graph.DocuQueryMultiRetriever)
+
+The report gives the median total import time of each target and its
+heaviest top-level packages. A target fails when its median exceeds its
+budget or, for health, when it imports one of the --forbid packages that
+should only load on the first search. The exit status is 1 on failure, so
+the check can run in CI.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --targets health --health-budget-ms 500 --top 15
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP = (
+    "import os, django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp.settings'); "
+    "django.setup(); "
+)
+TARGETS = {
+    "health": SETUP + "from django.urls import resolve; resolve('/api/health/')",
+    "pipeline": SETUP + "import docuquery.graph.DocuQueryMultiRetriever",
+}
+DEFAULT_FORBID = "langgraph,langchain,langchain_core,langchain_openai,langchain_ollama,langchain_community,openai,neo4j"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(output):
+    """
+    Parses `-X importtime` lines into (module, self us, cumulative us, depth).
+    """
+    imports = []
+    for line in output.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def measure(code):
+    env = {**os.environ, "DJANGO_SECRET_KEY": os.environ.get("DJANGO_SECRET_KEY", "import-time")}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=WEBAPP_DIR, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed")
+    return parse_importtime(completed.stderr)
+
+
+def summarize(imports, top):
+    # Self time of every module, charged to its top-level package
+    packages = defaultdict(int)
+    for module, self_us, _, _ in imports:
+        packages[module.split(".")[0]] += self_us
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {
+        "total_ms": round(sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000, 1),
+        "modules": len(imports),
+        "packages": {package: round(us / 1000, 1) for package, us in heaviest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default="health,pipeline", help="comma separated: health, pipeline")
+    parser.add_argument("--runs", type=int, default=3, help="interpreters per target; the median is reported")
+    parser.add_argument("--health-budget-ms", type=float, default=600.0)
+    parser.add_argument("--pipeline-budget-ms", type=float, default=5000.0)
+    parser.add_argument("--forbid", default=DEFAULT_FORBID, help="packages the health target must not import")
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to list")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    budgets = {"health": args.health_budget_ms, "pipeline": args.pipeline_budget_ms}
+    forbidden = {name.strip() for name in args.forbid.split(",") if name.strip()}
+    measure(TARGETS["health"])  # compiles bytecode, so no run pays for it
+
+    results = {}
+    failed = False
+    for target in args.targets.split(","):
+        target = target.strip()
+        runs = [measure(TARGETS[target]) for _ in range(args.runs)]
+        summaries = sorted((summarize(imports, args.top) for imports in runs), key=lambda s: s["total_ms"])
+        result = summaries[len(summaries) // 2]
+        result["runs_ms"] = [summary["total_ms"] for summary in summaries]
+        result["median_ms"] = round(statistics.median(result["runs_ms"]), 1)
+        result["budget_ms"] = budgets[target]
+
+        problems = []
+        if result["median_ms"] > budgets[target]:
+            problems.append(f"{result['median_ms']} ms is over the {budgets[target]} ms budget")
+        if target == "health":
+            loaded = sorted({module.split(".")[0] for module, _, _, _ in runs[0]} & forbidden)
+            if loaded:
+                problems.append(f"imports {', '.join(loaded)}")
+        result["problems"] = problems
+        failed = failed or bool(problems)
+        results[target] = result
+
+        print(f"{target}: {result['median_ms']} ms over {result['modules']} modules "
+              f"(budget {budgets[target]} ms) {'FAIL' if problems else 'ok'}")
+        for package, ms in result["packages"].items():
+            print(f"    {package:<32} {ms:>8.1f} ms")
+        for problem in problems:
+            print(f"    {problem}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+                "results": results,
+            }, file, indent=4)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
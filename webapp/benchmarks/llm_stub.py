@@ -0,0 +1,251 @@
+"""
+Local OpenAI-compatible stand-in for chat completions and embeddings.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+configurable latency, so the search stack can be load tested on one machine
+without network access or API costs. Point the app at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_BASE=http://127.0.0.1:8090/v1 OPENAI_API_KEY=stub
+
+Latencies are distributions in seconds:
+    fixed:0.5            always 0.5
+    uniform:0.2,1.0      between 0.2 and 1.0
+    normal:0.8,0.2       mean 0.8, standard deviation 0.2 (clipped at 0)
+    lognormal:0.8,0.5    median 0.8, sigma 0.5
+
+Chat latency is the time to the first token; the rest of the answer then
+arrives at --tokens-per-second. Relevancy prompts get {"score": "yes"} (or
+"no" with probability --no-rate), text-to-Cypher prompts get a trivial
+read-only query, and everything else an answer of --answer-tokens words.
+
+Usage:
+    python benchmarks/llm_stub.py --port 8090 --chat-latency lognormal:0.8,0.5 --embedding-latency fixed:0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def parse_distribution(spec):
+    kind, _, values = spec.partition(":")
+    values = [float(value) for value in values.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(random.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(np.log(values[0]), values[1])
+    raise argparse.ArgumentTypeError(f"unknown distribution '{spec}'")
+
+
+def stub_embedding(text, dimensions):
+    # Token id lists (what OpenAIEmbeddings sends) hash the same way as text
+    tokens = text.split() if isinstance(text, str) else [str(token) for token in text]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token in tokens:
+        bucket = zlib.crc32(token.encode())
+        vector[bucket % dimensions] += 1.0 if bucket & 1 << 31 else -1.0
+    vector /= np.linalg.norm(vector) or 1.0
+    return vector.tolist()
+
+
+class StubConfig:
+    def __init__(self, chat_latency="fixed:0.5", embedding_latency="fixed:0.05", tokens_per_second=50.0,
+                 answer_tokens=120, dimensions=1536, no_rate=0.2, error_rate=0.0):
+        self.chat_latency = parse_distribution(chat_latency)
+        self.embedding_latency = parse_distribution(embedding_latency)
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.dimensions = dimensions
+        self.no_rate = no_rate
+        self.error_rate = error_rate
+        self.requests = {"chat": 0, "embeddings": 0}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    def reply(self, messages, max_tokens=None):
+        prompt = " ".join(str(message.get("content", "")) for message in messages)
+        if '"score"' in prompt:
+            return json.dumps({"score": "no" if random.random() < self.no_rate else "yes"})
+        if "Cypher" in prompt:
+            return "MATCH (n) RETURN count(n) AS count"
+        tokens = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        return " ".join(f"word{i}" for i in range(tokens))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if random.random() < self.config.error_rate:
+            self.send_json(500, {"error": {"message": "injected error", "type": "server_error"}})
+        elif self.path.endswith("/embeddings"):
+            self.embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            self.chat(body)
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def embeddings(self, body):
+        self.config.count("embeddings")
+        time.sleep(self.config.embedding_latency())
+        inputs = body.get("input", [])
+        # A single string, a list of strings, or a list of token id lists
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        self.send_json(200, {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": stub_embedding(text, self.config.dimensions)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def chat(self, body):
+        self.config.count("chat")
+        started = time.time()
+        time.sleep(self.config.chat_latency())
+        content = self.config.reply(body.get("messages", []), body.get("max_tokens"))
+        words = content.split(" ")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)}
+
+        if not body.get("stream"):
+            time.sleep(len(words) / self.config.tokens_per_second)
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(started),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1 / self.config.tokens_per_second)
+            send_event(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(started),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if not i else " " + word}, "finish_reason": None}],
+            }))
+        send_event(json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(started),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_stub(config, host="127.0.0.1", port=8090):
+    """
+    Starts the stand-in in a daemon thread.
+
+    Returns:
+        The running ThreadingHTTPServer; call shutdown() to stop it
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--chat-latency", default="lognormal:0.8,0.5", help="time to first token")
+    parser.add_argument("--embedding-latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--dimensions", type=int, default=1536, help="must match the Neo4j vector index")
+    parser.add_argument("--no-rate", type=float, default=0.2, help="share of documents graded irrelevant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+
+
+def stub_config(args):
+    return StubConfig(
+        chat_latency=args.chat_latency,
+        embedding_latency=args.embedding_latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        dimensions=args.dimensions,
+        no_rate=args.no_rate,
+        error_rate=args.error_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    config = stub_config(args)
+    server = start_stub(config, args.host, args.port)
+    print(f"Serving OpenAI stand-in on http://{args.host}:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"requests so far: {config.requests}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
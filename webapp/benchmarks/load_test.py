@@ -0,0 +1,275 @@
+"""
+Load tests /api/search/ at a fixed concurrency.
+
+Each of --concurrency clients sends queries back to back for --duration
+seconds, after --warmup seconds whose requests are not counted. The report
+gives throughput, latency percentiles of successful requests, the error
+rate by status, how many answers came back degraded, and the mean LLM cost
+per request from the response's usage report.
+
+With --url the tool drives a server that is already running. With
+--worker-classes it starts gunicorn once per worker class on this machine,
+pointed at a local OpenAI stand-in (benchmarks/llm_stub.py), and runs the
+same load against each:
+
+    sync     one request per worker process
+    gthread  --threads threads per worker
+    gevent   --worker-connections greenlets per worker
+    asgi     uvicorn workers on webapp.asgi (needs `pip install uvicorn`)
+
+Retrieval still needs Neo4j; run this inside docker compose or next to a
+local Neo4j.
+
+Usage:
+    python benchmarks/load_test.py --url http://127.0.0.1:8000/api/search/ --concurrency 16 --duration 60
+    python benchmarks/load_test.py --worker-classes sync,gthread,gevent,asgi --workers 4 --concurrency 32 \\
+        --chat-latency lognormal:0.8,0.5 --output load.json
+    GRADING_MODEL_NAME=gpt-4o python benchmarks/load_test.py --url http://127.0.0.1:8000/api/search/ --model gpt-4
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from llm_stub import add_stub_arguments, start_stub, stub_config
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUERIES = [
+    "What is the RDCRN?",
+    "Which studies are recruiting for Lowe Syndrome?",
+    "Who is the contact for the Rett Syndrome consortium?",
+    "How do I request access to the data management center?",
+    "What funding opportunities are open?",
+    "Which sites participate in the Urea Cycle Disorders consortium?",
+]
+
+
+def run_load(url, queries, concurrency, duration, warmup=5.0, timeout=120.0, params=None):
+    queries = itertools.cycle(queries)
+    queries_lock = threading.Lock()
+    results = []
+    results_lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            with queries_lock:
+                query = next(queries)
+            sent = time.monotonic()
+            degraded = False
+            cost = None
+            try:
+                response = session.get(url, params={"q": query, **(params or {})}, timeout=timeout)
+                status = response.status_code
+                if status == 200:
+                    body = response.json()
+                    degraded = bool(body.get("degradations"))
+                    cost = body.get("usage", {}).get("total", {}).get("cost_usd")
+            except requests.RequestException as e:
+                status = type(e).__name__
+            finished = time.monotonic()
+            if sent >= measure_from and finished <= stop_at + timeout:
+                with results_lock:
+                    results.append((status, (finished - sent) * 1000, degraded, cost))
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - measure_from
+    return summarize(results, elapsed, concurrency)
+
+
+def summarize(results, elapsed, concurrency):
+    latencies = sorted(latency for status, latency, _, _ in results if status == 200)
+    statuses = Counter(str(status) for status, _, _, _ in results)
+    costs = [cost for status, _, _, cost in results if status == 200 and cost is not None]
+    errors = sum(count for status, count in statuses.items() if status != "200")
+
+    def at(fraction):
+        return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)], 1) if latencies else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1) if latencies else None,
+            "p90": at(0.90),
+            "p95": at(0.95),
+            "p99": at(0.99),
+            "max": round(latencies[-1], 1) if latencies else None,
+        },
+        "error_rate": round(errors / len(results), 4) if results else None,
+        "statuses": dict(statuses),
+        "degraded": sum(1 for status, _, degraded, _ in results if status == 200 and degraded),
+        "mean_cost_usd": round(statistics.mean(costs), 6) if costs else None,
+    }
+
+
+def gunicorn_command(worker_class, args, port):
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers),
+        "--timeout", "120",
+    ]
+    if worker_class == "sync":
+        return command + ["--worker-class", "sync", "webapp.wsgi:application"]
+    if worker_class == "gthread":
+        return command + ["--worker-class", "gthread", "--threads", str(args.threads), "webapp.wsgi:application"]
+    if worker_class == "gevent":
+        return command + [
+            "--worker-class", "gevent", "--worker-connections", str(args.worker_connections),
+            "webapp.wsgi:application",
+        ]
+    if worker_class == "asgi":
+        return command + ["--worker-class", "uvicorn.workers.UvicornWorker", "webapp.asgi:application"]
+    raise ValueError(f"unknown worker class '{worker_class}'")
+
+
+def wait_until_ready(base_url, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(f"{base_url}/api/health/", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def compare_worker_classes(args, queries, params):
+    stub = start_stub(stub_config(args), port=args.stub_port)
+    stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": stub_url,
+        "OPENAI_API_BASE": stub_url,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "stub"),
+        "DJANGO_SECRET_KEY": os.environ.get("DJANGO_SECRET_KEY", "load-test"),
+    }
+
+    results = {}
+    try:
+        for worker_class in args.worker_classes.split(","):
+            worker_class = worker_class.strip()
+            if worker_class == "asgi" and importlib.util.find_spec("uvicorn") is None:
+                print("Skipping asgi: uvicorn is not installed")
+                results[worker_class] = {"skipped": "uvicorn is not installed"}
+                continue
+
+            print(f"Starting gunicorn with {worker_class} workers...")
+            process = subprocess.Popen(
+                gunicorn_command(worker_class, args, args.port),
+                cwd=WEBAPP_DIR, env=env,
+                stdout=subprocess.DEVNULL if not args.server_logs else None,
+                stderr=subprocess.DEVNULL if not args.server_logs else None,
+            )
+            try:
+                base_url = f"http://127.0.0.1:{args.port}"
+                if not wait_until_ready(base_url, process):
+                    print(f"gunicorn with {worker_class} workers did not come up")
+                    results[worker_class] = {"skipped": "server did not start"}
+                    continue
+                results[worker_class] = run_load(
+                    f"{base_url}/api/search/", queries, args.concurrency, args.duration,
+                    args.warmup, args.timeout, params,
+                )
+                print(f"{worker_class}: {json.dumps(results[worker_class])}")
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+    finally:
+        stub.shutdown()
+    return results
+
+
+def print_table(results):
+    print(f"{'workers':<10} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>8} {'degraded':>9} {'cost':>10}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<10} skipped: {result['skipped']}")
+            continue
+        latency = result["latency_ms"]
+        print(
+            f"{name:<10} {result['throughput_rps'] or 0:>8.2f} {latency['p50'] or 0:>9.1f} "
+            f"{latency['p95'] or 0:>9.1f} {latency['p99'] or 0:>9.1f} "
+            f"{(result['error_rate'] or 0) * 100:>7.1f}% {result['degraded']:>9} "
+            f"{result['mean_cost_usd'] or 0:>10.6f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="search endpoint of a running server")
+    parser.add_argument("--worker-classes", help="comma separated: sync, gthread, gevent, asgi")
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--budget", type=float, help="latency budget passed as ?budget=")
+    parser.add_argument("--model", help="generation model passed as ?model=")
+    parser.add_argument("--tool", help="pipeline variant passed as ?tool=")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--worker-connections", type=int, default=1000, help="greenlets per gevent worker")
+    parser.add_argument("--port", type=int, default=8077)
+    parser.add_argument("--stub-port", type=int, default=8090)
+    parser.add_argument("--server-logs", action="store_true", help="show gunicorn output")
+    parser.add_argument("--output", help="write results to this JSON file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if bool(args.url) == bool(args.worker_classes):
+        parser.error("pass either --url or --worker-classes")
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as file:
+            queries = [line.strip() for line in file if line.strip()]
+    params = {"budget": args.budget} if args.budget else {}
+    if args.model:
+        params["model"] = args.model
+    if args.tool:
+        params["tool"] = args.tool
+
+    if args.url:
+        results = {"server": run_load(
+            args.url, queries, args.concurrency, args.duration, args.warmup, args.timeout, params
+        )}
+    else:
+        results = compare_worker_classes(args, queries, params)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+                "results": results,
+            }, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Times MMR selection over fetched candidates.
+
+Compares docuquery.graph.mmr.mmr_select with langchain's
+maximal_marginal_relevance on random vectors shaped like OpenAI
+embeddings, and checks that both pick the same documents. The cost of
+converting the candidate lists returned by Neo4j into an array is
+reported separately; --budget-ms applies to selection only.
+
+Usage:
+    python benchmarks/mmr_selection.py --fetch-k 100 --k 5 --dimensions 1536
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from docuquery.graph.mmr import mmr_select
+
+
+def time_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch-k", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--lambda-mult", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="fail if the p50 exceeds this")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=args.dimensions)
+    # Candidates come back from Neo4j as lists of floats
+    candidates = rng.normal(size=(args.fetch_k, args.dimensions)).tolist()
+
+    expected = maximal_marginal_relevance(query, candidates, args.lambda_mult, args.k)
+    selected = mmr_select(query, candidates, args.k, args.lambda_mult)
+    print(f"same selection as langchain: {selected == expected}")
+
+    # Neo4j returns lists of floats, so conversion is paid once per search
+    convert_p50, convert_worst = time_ms(lambda: np.asarray(candidates, dtype=np.float32), args.repeat)
+    print(f"list -> float32 array        p50 {convert_p50:7.3f} ms  max {convert_worst:7.3f} ms")
+    matrix = np.asarray(candidates, dtype=np.float32)
+    p50, worst = time_ms(lambda: mmr_select(query, matrix, args.k, args.lambda_mult), args.repeat)
+    print(f"mmr_select                   p50 {p50:7.3f} ms  max {worst:7.3f} ms")
+    baseline_p50, baseline_worst = time_ms(
+        lambda: maximal_marginal_relevance(query, candidates, args.lambda_mult, args.k), args.repeat
+    )
+    print(f"maximal_marginal_relevance   p50 {baseline_p50:7.3f} ms  max {baseline_worst:7.3f} ms")
+
+    if p50 > args.budget_ms:
+        print(f"FAIL: p50 {p50:.3f} ms is over the {args.budget_ms} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Replays logged search traces against the current code.
+
+Loads traces stored by the app (docuquery/graph/traces.py, TRACE_DB_PATH),
+slowest first, runs each query again in process with the same tool, model
+and budget, and compares the runs: total and per stage milliseconds,
+retrieved document ids (overlap of the old and new lists), how many
+documents were graded relevant, and degradations. The summary gives the old
+and new latency percentiles over the replayed queries.
+
+Replays are not traced themselves. Retrieval still needs Neo4j and the
+LLM settings of the app; point OPENAI_BASE_URL at benchmarks/llm_stub.py to
+replay without API costs.
+
+Usage:
+    python benchmarks/replay_traces.py --reason slow --since-hours 24 --limit 20
+    python benchmarks/replay_traces.py --db /data/traces.sqlite3 --min-seconds 15 --output replay.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from docuquery.constants.traces import TRACE_DB_PATH
+from docuquery.graph.DocuQueryMultiRetriever import DocuQuery
+from docuquery.graph.traces import document_traces, load_traces
+
+
+def stage_totals(stages):
+    totals = defaultdict(float)
+    for timing in stages:
+        totals[timing["stage"]] += timing["ms"]
+    return totals
+
+
+def replay(trace, tool=None):
+    tool = tool or trace["tool"]
+    data = {
+        "query": trace["query"],
+        "model": trace["model"],
+        "budget": trace["budget"],
+        "grading_mode": trace["grading_mode"],
+        "trace": False,
+    }
+    started = time.monotonic()
+    try:
+        result = DocuQuery(tool).invoke(data)
+        error = None
+    except Exception as e:
+        result = {}
+        error = str(e)
+    duration_ms = round((time.monotonic() - started) * 1000, 1)
+
+    old_ids = [document["id"] for document in trace["documents"]]
+    new_documents = document_traces(result)
+    new_ids = [document["id"] for document in new_documents]
+    union = set(old_ids) | set(new_ids)
+    old_stages = stage_totals(trace["stages"])
+    new_stages = stage_totals(result.get("stage_timings") or [])
+    return {
+        "trace_id": trace["id"],
+        "query": trace["query"],
+        "tool": tool,
+        "old_ms": trace["duration_ms"],
+        "new_ms": duration_ms,
+        "old_error": trace["error"],
+        "new_error": error,
+        "stages": {
+            stage: {"old_ms": round(old_stages.get(stage, 0.0), 1), "new_ms": round(new_stages.get(stage, 0.0), 1)}
+            for stage in sorted(set(old_stages) | set(new_stages))
+        },
+        "document_overlap": round(len(set(old_ids) & set(new_ids)) / len(union), 3) if union else None,
+        "old_relevant": sum(1 for document in trace["documents"] if document["relevant"]),
+        "new_relevant": sum(1 for document in new_documents if document["relevant"]),
+        "old_degradations": trace["degradations"],
+        "new_degradations": result.get("degradations") or [],
+    }
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": round(statistics.median(values), 1),
+        "p95": round(values[min(int(0.95 * len(values)), len(values) - 1)], 1),
+        "max": round(values[-1], 1),
+    }
+
+
+def print_replay(run):
+    print(
+        f"#{run['trace_id']} {run['old_ms']:>9.1f} -> {run['new_ms']:>9.1f} ms  "
+        f"overlap {run['document_overlap'] if run['document_overlap'] is not None else '-':>5}  "
+        f"relevant {run['old_relevant']} -> {run['new_relevant']}  {run['query'][:60]!r}"
+    )
+    for stage, timing in run["stages"].items():
+        print(f"    {stage:<36} {timing['old_ms']:>9.1f} -> {timing['new_ms']:>9.1f}")
+    if run["new_error"]:
+        print(f"    error: {run['new_error']}")
+    if run["old_degradations"] != run["new_degradations"]:
+        print(f"    degradations: {run['old_degradations']} -> {run['new_degradations']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=TRACE_DB_PATH, help="trace database")
+    parser.add_argument("--since-hours", type=float, help="only traces from the last this many hours")
+    parser.add_argument("--min-seconds", type=float, help="only traces at least this slow")
+    parser.add_argument("--reason", choices=["slow", "error", "sample"], help="only traces stored for this reason")
+    parser.add_argument("--limit", type=int, default=20, help="replay at most this many traces")
+    parser.add_argument("--tool", help="replay with this pipeline variant instead of the logged one")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    traces = load_traces(
+        args.db,
+        since=time.time() - args.since_hours * 3600 if args.since_hours else None,
+        min_duration_ms=args.min_seconds * 1000 if args.min_seconds else None,
+        reason=args.reason,
+        limit=args.limit,
+    )
+    if not traces:
+        print("No matching traces")
+        return
+
+    runs = []
+    for trace in traces:
+        run = replay(trace, args.tool)
+        print_replay(run)
+        runs.append(run)
+
+    summary = {
+        "replayed": len(runs),
+        "old_ms": percentiles([run["old_ms"] for run in runs]),
+        "new_ms": percentiles([run["new_ms"] for run in runs]),
+        "faster": sum(1 for run in runs if run["new_ms"] < run["old_ms"]),
+        "new_errors": sum(1 for run in runs if run["new_error"]),
+    }
+    print(json.dumps(summary, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+                "summary": summary,
+                "runs": runs,
+            }, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measures search response bytes and serialization time.
+
+Builds the relevant_documents of a search over --documents synthetic pages
+of --words words each, shaped like the Confluence pages views.search
+returns, and reports for full text and for snippets=true the JSON size,
+its gzip and brotli sizes, and the time to serialize with the json module
+and with docuquery.responses.dumps (orjson when installed). Snippet
+extraction time is reported separately.
+
+Usage:
+    python benchmarks/response_size.py --documents 10 --words 8000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from docuquery.graph.snippets import best_snippets
+from docuquery.middleware import brotli
+from docuquery.responses import dumps, orjson
+
+VOCABULARY = (
+    "redcap project user role survey data export access consortium study site funding protocol "
+    "enrollment biospecimen tracker guide login the and of a to in for with"
+).split()
+# Mostly filler, so query terms are as sparse as on real pages
+FILLER = [f"term{i}" for i in range(2000)]
+QUERY = "how do I export redcap data for my study"
+
+
+def time_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def build_response(documents, snippets):
+    relevant_documents = []
+    for i, text in enumerate(documents):
+        document = {
+            "id": str(i),
+            "title": f"Page {i}",
+            "data_source": "confluence",
+            "space_name": "RDCRN Platform Documentation",
+            "space_key": "RPD",
+            "score": 0.8,
+        }
+        if snippets:
+            document["snippets"] = best_snippets(text, QUERY)
+        else:
+            document["text"] = text
+        relevant_documents.append(document)
+    return {"answer": " ".join(VOCABULARY * 4), "query": QUERY, "relevant_documents": relevant_documents}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--words", type=int, default=8000, help="words per page")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    documents = [
+        " ".join(random.choices(VOCABULARY + FILLER, k=args.words)) for _ in range(args.documents)
+    ]
+    print(f"orjson: {'yes' if orjson is not None else 'no'}  brotli: {'yes' if brotli is not None else 'no'}")
+
+    snippet_ms = time_ms(lambda: [best_snippets(text, QUERY) for text in documents], args.repeat)
+    print(f"snippet extraction {snippet_ms:8.3f} ms")
+    print(f"{'mode':<10} {'json':>10} {'gzip':>10} {'brotli':>10} {'json ms':>9} {'dumps ms':>9}")
+    for mode, snippets in (("full", False), ("snippets", True)):
+        response = build_response(documents, snippets)
+        body = dumps(response)
+        brotli_size = len(brotli.compress(body, quality=5)) if brotli is not None else None
+        json_ms = time_ms(lambda: json.dumps(response, cls=DjangoJSONEncoder).encode(), args.repeat)
+        dumps_ms = time_ms(lambda: dumps(response), args.repeat)
+        print(
+            f"{mode:<10} {len(body):>10} {len(gzip.compress(body)):>10} {brotli_size or '-':>10} "
+            f"{json_ms:>9.3f} {dumps_ms:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Measures retrieval quality and latency against a golden set.
+
+Each line of the golden JSONL file is a query with the ids of the nodes
+(Confluence page ids, Postgres row ids) that should be retrieved for it:
+
+    {"query": "...", "expected_ids": ["123456", "789012"]}
+
+Every mode runs each query through the source retrievers the search graph
+uses, fuses their results the same way, and reports recall@k and MRR over
+the fused list, plus p50/p95/p99 retrieval latency. Query embeddings are
+computed once up front and are not part of the latency.
+
+Modes:
+    union     built-in hybrid union query
+    rrf       concurrent vector and keyword arms fused by reciprocal rank
+    weighted  concurrent arms fused by weighted, normalized scores
+    mirror    in-process vector mirror (needs an export, live only)
+
+With --fake, retrieval runs against an in-memory store built from --corpus
+(JSONL of {"id", "title", "text", "source"}) with deterministic hashed
+bag-of-words embeddings, so no Neo4j or embedding API is needed. Without a
+corpus or golden set, --fake generates a synthetic one.
+
+Usage:
+    python benchmarks/retrieval_eval.py golden.jsonl --modes union,rrf --output results.json
+    python benchmarks/retrieval_eval.py golden.jsonl --compare results.json
+    python benchmarks/retrieval_eval.py --fake --output results.json
+
+MMR follows MMR_ENABLED. To check it before enabling, compare an MMR run
+against a relevance-only baseline:
+
+    python benchmarks/retrieval_eval.py golden.jsonl --no-mmr --output baseline.json
+    python benchmarks/retrieval_eval.py golden.jsonl --mmr-lambda 0.7 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from docuquery.constants.retrieval import FETCH_K, FUSED_TOP_K, MMR_ENABLED, MMR_LAMBDA, RRF_K
+from docuquery.extensions.Neo4jVectorPlus import Neo4jVectorPlus
+from docuquery.graph.DocuQueryMultiRetriever import RETRIEVAL_SOURCES
+from docuquery.graph.graders import BM25Grader, tokenize
+from docuquery.graph.rank_fusion import reciprocal_rank_fusion
+
+MODES = {
+    "union": {"fusion": "union", "use_mirror": False},
+    "rrf": {"fusion": "rrf", "use_mirror": False},
+    "weighted": {"fusion": "weighted", "use_mirror": False},
+    "mirror": {"fusion": "union", "use_mirror": True},
+}
+ID_PATTERN = re.compile(r"^id: (.+)$", re.MULTILINE)
+
+
+def document_id(document):
+    # The retrieval query moves `id` into the page content
+    if document.metadata.get("id") is not None:
+        return str(document.metadata["id"])
+    match = ID_PATTERN.search(document.page_content)
+    return match.group(1).strip() if match else None
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings, hashed into `dimensions` buckets."""
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            bucket = zlib.crc32(token.encode())
+            vector[bucket % self.dimensions] += 1.0 if bucket & 1 << 31 else -1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeVectorStore:
+    """
+    In-memory stand-in for Neo4jVectorPlus over one source. The vector arm is
+    an exact cosine search and the keyword arm is BM25; fusion modes reuse
+    Neo4jVectorPlus.fusion_search.
+    """
+    fusion_search = Neo4jVectorPlus.fusion_search
+
+    def __init__(self, rows, embeddings, fusion="union", include_embeddings=False):
+        self.node_label = "Fake"
+        self.fusion = fusion
+        self.vector_k = FETCH_K
+        self.keyword_k = FETCH_K
+        self.fusion_weights = {}
+        self.last_search_stats = {}
+        self.include_embeddings = include_embeddings
+        self.texts = [
+            "".join(f"\n{key}: {row.get(key, '')}" for key in ("id", "title", "text"))
+            for row in rows
+        ]
+        self.documents = [Document(page_content=text) for text in self.texts]
+        self.vectors = np.asarray(embeddings.embed_documents(self.texts), dtype=np.float32)
+
+    def document(self, i, similarity):
+        metadata = {"similarity": float(similarity)}
+        if self.include_embeddings:
+            metadata["_embedding_"] = self.vectors[i].tolist()
+        return Document(page_content=self.texts[i], metadata=metadata)
+
+    def search_arm(self, arm, embedding, query, k, params):
+        started = time.perf_counter()
+        similarities = (1 + self.vectors @ np.asarray(embedding, dtype=np.float32)) / 2
+        if arm == "vector":
+            scores = similarities
+        else:
+            scores = np.asarray(BM25Grader().scores(query, self.documents))
+        top = [i for i in np.argsort(-scores)[:k] if arm == "vector" or scores[i] > 0]
+        scored = [(self.document(i, similarities[i]), float(scores[i])) for i in top]
+        return scored, (time.perf_counter() - started) * 1000
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, query="", **kwargs):
+        if self.fusion != "union":
+            return self.fusion_search(embedding, query, k)
+
+        # Same as the union query: each arm divided by its best score, deduplicated by max
+        best = {}
+        for arm in ("vector", "keyword"):
+            scored, _ = self.search_arm(arm, embedding, query, k, {})
+            top_score = max((score for _, score in scored), default=0) or 1.0
+            for document, score in scored:
+                if document.page_content not in best or best[document.page_content][1] < score / top_score:
+                    best[document.page_content] = (document, score / top_score)
+        return sorted(best.values(), key=lambda pair: pair[1], reverse=True)[:k]
+
+
+def synthetic_data(documents=400, queries=100, topics=40):
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(topics * 25)]
+    rows = []
+    for i in range(documents):
+        topic = i % topics
+        words = vocabulary[topic * 25:(topic + 1) * 25]
+        rows.append({
+            "id": str(100000 + i),
+            "title": " ".join(rng.sample(words, 3)),
+            "text": " ".join(rng.choices(words, k=40) + rng.choices(vocabulary, k=20)),
+            "source": "confluence" if i % 4 else "postgres",
+        })
+    golden = []
+    for row in rng.sample(rows, queries):
+        golden.append({"query": " ".join(rng.sample(row["text"].split(), 5)), "expected_ids": [row["id"]]})
+    return rows, golden
+
+
+def load_jsonl(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def percentiles(timings):
+    if not timings:
+        return {}
+    timings = sorted(timings)
+    def at(fraction):
+        return round(timings[min(int(fraction * len(timings)), len(timings) - 1)], 3)
+    return {"p50": round(statistics.median(timings), 3), "p95": at(0.95), "p99": at(0.99)}
+
+
+def evaluate_mode(mode, retrievers, cases, k, lambda_mult):
+    for retriever in retrievers.values():
+        for name, value in MODES[mode].items():
+            setattr(retriever, name, value)
+
+    recalls, reciprocal_ranks = [], []
+    timings = {source: [] for source in retrievers}
+    timings["retrieval"] = []
+    errors = 0
+    for case in cases:
+        results = {}
+        slowest = 0.0
+        for source, retriever in retrievers.items():
+            started = time.perf_counter()
+            try:
+                results[source] = retriever.search_by_vector(
+                    case["query_embedding"], case["query"], lambda_mult=lambda_mult
+                )
+            except Exception as e:
+                print(f"{mode}/{source} failed on {case['query']!r}: {e}")
+                errors += 1
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            timings[source].append(elapsed)
+            # Sources run concurrently in the search graph
+            slowest = max(slowest, elapsed)
+        timings["retrieval"].append(slowest)
+
+        for source, documents in results.items():
+            for document in documents:
+                document.metadata["data_source"] = source
+        fused = reciprocal_rank_fusion(results, k=RRF_K, top_k=k)
+        ids = [document_id(document) for document in fused]
+        expected = {str(expected_id) for expected_id in case["expected_ids"]}
+        if not expected:
+            continue
+        recalls.append(len(expected & set(ids)) / len(expected))
+        reciprocal_ranks.append(next((1 / rank for rank, i in enumerate(ids, start=1) if i in expected), 0.0))
+
+    return {
+        f"recall@{k}": round(statistics.mean(recalls), 4) if recalls else None,
+        "mrr": round(statistics.mean(reciprocal_ranks), 4) if reciprocal_ranks else None,
+        "latency_ms": {name: percentiles(values) for name, values in timings.items()},
+        "errors": errors,
+    }
+
+
+def compare(results, baseline, max_drop):
+    regressions = []
+    for mode, metrics in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        for metric, value in metrics.items():
+            if metric.startswith("recall@") or metric == "mrr":
+                before = previous.get(metric)
+                if value is None or before is None:
+                    continue
+                print(f"{mode:<10} {metric:<10} {before:.4f} -> {value:.4f} ({value - before:+.4f})")
+                if before - value > max_drop:
+                    regressions.append(f"{mode} {metric}")
+        before = previous["latency_ms"]["retrieval"].get("p95")
+        after = metrics["latency_ms"]["retrieval"].get("p95")
+        if before and after:
+            print(f"{mode:<10} {'p95 ms':<10} {before:.1f} -> {after:.1f} ({after - before:+.1f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("golden", nargs="?", help="JSONL golden set of queries and expected ids")
+    parser.add_argument("--modes", default="union,rrf,weighted", help=f"comma separated, from {', '.join(MODES)}")
+    parser.add_argument("--k", type=int, default=FUSED_TOP_K, help="fused documents scored per query")
+    parser.add_argument("--mmr-lambda", type=float, default=MMR_LAMBDA if MMR_ENABLED else None,
+                        help="MMR trade-off, MMR_LAMBDA when MMR_ENABLED; omit with --no-mmr")
+    parser.add_argument("--no-mmr", action="store_true")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory store and hashed embeddings")
+    parser.add_argument("--corpus", help="JSONL corpus for --fake")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="recall/MRR drop that counts as a regression")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+    if args.fake and "mirror" in modes:
+        parser.error("the mirror mode needs Neo4j")
+    if not args.golden and not args.fake:
+        parser.error("a golden set is required without --fake")
+    lambda_mult = None if args.no_mmr else args.mmr_lambda
+
+    retrievers = {source: retriever_class() for source, retriever_class in RETRIEVAL_SOURCES.items()}
+    if args.fake:
+        rows, golden = synthetic_data()
+        if args.corpus:
+            rows = load_jsonl(args.corpus)
+        if args.golden:
+            golden = load_jsonl(args.golden)
+        embeddings = HashingEmbeddings()
+        for source, retriever in retrievers.items():
+            source_rows = [row for row in rows if row.get("source", "confluence") == source]
+            store = FakeVectorStore(source_rows, embeddings)
+
+            def get_vector_store(include_embeddings=False, acl_filter=False, retriever=retriever, store=store):
+                store.fusion = retriever.fusion
+                store.include_embeddings = include_embeddings
+                return store
+            retriever.get_vector_store = get_vector_store
+    else:
+        golden = load_jsonl(args.golden)
+        embeddings = next(iter(retrievers.values())).get_embeddings()
+
+    queries = [case["query"] for case in golden]
+    for case, embedding in zip(golden, embeddings.embed_documents(queries)):
+        case["query_embedding"] = embedding
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "golden": args.golden or "synthetic",
+        "store": "fake" if args.fake else "neo4j",
+        "queries": len(golden),
+        "k": args.k,
+        "mmr_lambda": lambda_mult,
+        "modes": {},
+    }
+    for mode in modes:
+        results["modes"][mode] = evaluate_mode(mode, retrievers, golden, args.k, lambda_mult)
+        print(f"{mode}: {json.dumps(results['modes'][mode])}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.max_drop)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
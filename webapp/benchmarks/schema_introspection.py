@@ -0,0 +1,166 @@
+"""
+Compares schema introspection strategies on a synthetic graph.
+
+Builds a graph of --nodes nodes (1M by default) spread over a handful of labels
+and relationship types, then times:
+
+- legacy: the three separate apoc.meta.data() calls refresh_schema used to run
+- single_pass: one apoc.meta.data() call split in Python
+- db_schema: the db.schema.* fallback used when APOC is not installed
+
+Needs a running Neo4j with APOC; no results are recorded in the repo.
+
+Usage:
+    python benchmarks/schema_introspection.py --nodes 1000000 --repeat 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from docuquery.constants.neo4j import URL, USERNAME, PASSWORD
+from docuquery.extensions.Neo4jGraphPlus import (
+    BASE_ENTITY_LABEL,
+    EXCLUDED_LABELS,
+    EXCLUDED_RELS,
+    Neo4jGraphPlus,
+)
+
+SYNTHETIC_LABEL = "SchemaBench"
+LABELS = ["Disease", "Study", "Site", "Contact", "Publication"]
+REL_TYPES = ["STUDIES", "LOCATED_AT", "AUTHORED", "CONTACT_FOR"]
+
+legacy_node_properties_query = """
+CALL apoc.meta.data()
+YIELD label, other, elementType, type, property
+WHERE NOT type = "RELATIONSHIP" AND elementType = "node"
+  AND NOT label IN $EXCLUDED_LABELS
+WITH label AS nodeLabels, collect({property:property, type:type}) AS properties
+RETURN {labels: nodeLabels, properties: properties} AS output
+"""
+
+legacy_rel_properties_query = """
+CALL apoc.meta.data()
+YIELD label, other, elementType, type, property
+WHERE NOT type = "RELATIONSHIP" AND elementType = "relationship"
+      AND NOT label in $EXCLUDED_LABELS
+WITH label AS nodeLabels, collect({property:property, type:type}) AS properties
+RETURN {type: nodeLabels, properties: properties} AS output
+"""
+
+legacy_rel_query = """
+CALL apoc.meta.data()
+YIELD label, other, elementType, type, property
+WHERE type = "RELATIONSHIP" AND elementType = "node"
+UNWIND other AS other_node
+WITH * WHERE NOT label IN $EXCLUDED_LABELS
+    AND NOT other_node IN $EXCLUDED_LABELS
+RETURN {start: label, type: property, end: toString(other_node)} AS output
+"""
+
+
+def build_synthetic_graph(graph, nodes):
+    print(f"Creating {nodes} synthetic nodes...")
+    graph.query(
+        f"""
+        UNWIND range(0, $nodes - 1) AS i
+        CALL {{
+            WITH i
+            CREATE (n:{SYNTHETIC_LABEL} {{
+                uid: i,
+                name: 'node-' + toString(i),
+                score: toFloat(i % 100),
+                active: i % 2 = 0,
+                tags: ['a', 'b']
+            }})
+        }} IN TRANSACTIONS OF 50000 ROWS
+        """,
+        params={"nodes": nodes},
+    )
+    for index, label in enumerate(LABELS):
+        graph.query(
+            f"""
+            MATCH (n:{SYNTHETIC_LABEL}) WHERE n.uid % $count = $index
+            CALL {{ WITH n SET n:{label} }} IN TRANSACTIONS OF 50000 ROWS
+            """,
+            params={"count": len(LABELS), "index": index},
+        )
+    print("Creating synthetic relationships...")
+    for index, rel_type in enumerate(REL_TYPES):
+        graph.query(
+            f"""
+            MATCH (a:{SYNTHETIC_LABEL}) WHERE a.uid % 10 = $index
+            CALL {{
+                WITH a
+                MATCH (b:{SYNTHETIC_LABEL} {{uid: (a.uid + 1) % $nodes}})
+                CREATE (a)-[:{rel_type} {{weight: 1.0}}]->(b)
+            }} IN TRANSACTIONS OF 50000 ROWS
+            """,
+            params={"index": index, "nodes": nodes},
+        )
+
+
+def drop_synthetic_graph(graph):
+    graph.query(
+        f"""
+        MATCH (n:{SYNTHETIC_LABEL})
+        CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 50000 ROWS
+        """
+    )
+
+
+def legacy(graph):
+    excluded_labels = EXCLUDED_LABELS + [BASE_ENTITY_LABEL]
+    graph.query(legacy_node_properties_query, params={"EXCLUDED_LABELS": excluded_labels})
+    graph.query(legacy_rel_properties_query, params={"EXCLUDED_LABELS": EXCLUDED_RELS})
+    graph.query(legacy_rel_query, params={"EXCLUDED_LABELS": excluded_labels})
+
+
+def time_strategy(name, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<12} median {statistics.median(timings):8.3f}s  min {min(timings):8.3f}s")
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sample", type=int, default=1000, help="apoc.meta.data sample size")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic graph afterwards")
+    parser.add_argument("--skip-build", action="store_true", help="reuse an existing synthetic graph")
+    args = parser.parse_args()
+
+    graph = Neo4jGraphPlus(
+        url=URL,
+        username=USERNAME,
+        password=PASSWORD,
+        refresh_schema=False,
+        schema_sample_size=args.sample,
+    )
+
+    if not args.skip_build:
+        build_synthetic_graph(graph, args.nodes)
+
+    try:
+        baseline = time_strategy("legacy", lambda: legacy(graph), args.repeat)
+        single_pass = time_strategy("single_pass", graph.introspect_schema, args.repeat)
+        db_schema = time_strategy("db_schema", graph.introspect_schema_without_apoc, args.repeat)
+        print(f"single_pass speedup: {baseline / single_pass:.1f}x")
+        print(f"db_schema speedup:   {baseline / db_schema:.1f}x")
+    finally:
+        if not args.keep:
+            drop_synthetic_graph(graph)
+
+
+if __name__ == "__main__":
+    main()
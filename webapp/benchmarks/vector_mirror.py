@@ -0,0 +1,154 @@
+"""
+Compares the in-process vector mirror with Neo4j's vector index.
+
+With --synthetic N, writes a mirror of N clustered random vectors to a
+temporary directory and times exhaustive and IVF search against it. Without
+it, exports --label from Neo4j (or reuses the current export with --reuse)
+and also times db.index.vector.queryNodes on the same queries.
+
+Queries are stored vectors with noise added. Recall@k is measured against
+the exhaustive float32 search of the mirror.
+
+Usage:
+    python benchmarks/vector_mirror.py --synthetic 200000 --partitions 256 --nprobe 16
+    python benchmarks/vector_mirror.py --label Confluence --index confluence_embedding
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from docuquery.constants.retrieval import VECTOR_MIRROR_DIR
+from docuquery.graph.vector_mirror import (
+    VectorMirror,
+    export_mirror,
+    get_driver,
+    read_manifest,
+    write_mirror,
+)
+
+
+def time_ms(fn, queries):
+    timings = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(fn(query))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return results, {
+        "p50": statistics.median(timings),
+        "p95": timings[int(0.95 * (len(timings) - 1))],
+        "max": timings[-1],
+    }
+
+
+def recall(expected, actual):
+    hits = [len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual) if e]
+    return sum(hits) / len(hits) if hits else None
+
+
+def report(name, timings, recall_at_k):
+    recall_text = f"  recall {recall_at_k:.3f}" if recall_at_k is not None else ""
+    print(f"{name:<24} p50 {timings['p50']:8.3f} ms  p95 {timings['p95']:8.3f} ms  max {timings['max']:8.3f} ms{recall_text}")
+
+
+def synthetic_mirrors(args, directory):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(args.partitions, 64), args.dimensions))
+    vectors = (
+        centers[rng.integers(len(centers), size=args.synthetic)]
+        + 0.5 * rng.normal(size=(args.synthetic, args.dimensions))
+    ).astype(np.float32)
+    ids = [f"synthetic:{i}" for i in range(args.synthetic)]
+
+    mirrors = {}
+    for name, dtype, partitions in [
+        ("exhaustive", "float32", 0),
+        ("exhaustive_float16", "float16", 0),
+        ("ivf", args.dtype, args.partitions),
+    ]:
+        label = f"Bench{name.title().replace('_', '')}"
+        started = time.perf_counter()
+        manifest = write_mirror(label, "1", ids, vectors.copy(), directory, dtype, partitions)
+        print(f"wrote {name} in {time.perf_counter() - started:.1f}s")
+        mirrors[name] = VectorMirror(manifest, directory)
+    return mirrors
+
+
+def live_mirrors(args, directory):
+    manifest = read_manifest(args.label, directory) if args.reuse else None
+    if manifest is None:
+        manifest = export_mirror(args.label, directory, args.dtype, args.partitions)
+    mirrors = {"mirror": VectorMirror(manifest, directory)}
+    if manifest["partitions"] or manifest["dtype"] != "float32":
+        # Exact reference for recall
+        exact_directory = tempfile.mkdtemp()
+        exact = export_mirror(args.label, exact_directory, "float32", 0)
+        mirrors["exhaustive"] = VectorMirror(exact, exact_directory)
+    else:
+        mirrors["exhaustive"] = mirrors.pop("mirror")
+    return mirrors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, help="benchmark N synthetic vectors instead of Neo4j")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--label", default="Confluence")
+    parser.add_argument("--index", default="confluence_embedding")
+    parser.add_argument("--reuse", action="store_true", help="use the current export instead of exporting")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--partitions", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        directory = tempfile.mkdtemp()
+        mirrors = synthetic_mirrors(args, directory)
+    else:
+        directory = VECTOR_MIRROR_DIR if args.reuse else tempfile.mkdtemp()
+        mirrors = live_mirrors(args, directory)
+
+    exhaustive = mirrors["exhaustive"]
+    rng = np.random.default_rng(1)
+    rows = rng.integers(len(exhaustive.vectors), size=args.queries)
+    queries = exhaustive.embeddings(rows) + 0.05 * rng.normal(size=(args.queries, exhaustive.dimensions))
+
+    expected, timings = time_ms(lambda query: [hit[1] for hit in exhaustive.search(query, args.k)], queries)
+    report("exhaustive", timings, None)
+    for name, mirror in mirrors.items():
+        if name == "exhaustive":
+            continue
+        results, timings = time_ms(
+            lambda query: [hit[1] for hit in mirror.search(query, args.k, args.nprobe)], queries
+        )
+        report(name, timings, recall(expected, results))
+
+    if not args.synthetic:
+        with get_driver().session() as session:
+            def query_nodes(query):
+                return [
+                    record["id"]
+                    for record in session.run(
+                        "CALL db.index.vector.queryNodes($index, $k, $embedding) "
+                        "YIELD node RETURN elementId(node) AS id",
+                        index=args.index, k=args.k, embedding=query.tolist(),
+                    )
+                ]
+            results, timings = time_ms(query_nodes, queries)
+            report("queryNodes", timings, recall(expected, results))
+
+
+if __name__ == "__main__":
+    main()
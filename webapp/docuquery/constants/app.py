@@ -1,3 +1,6 @@
+import os
+
+from docuquery.constants.llm import LLM_PROVIDER, OLLAMA_CHAT_MODEL
 
 MODELS = [
     ("gpt-4o", "GPT-4o"),
@@ -11,5 +14,24 @@ TOOLS = [
     ("basic_vector", "Basic Vector Search"),
     ("chatgpt", "ChatGPT Search"),
 ]
+# Pipeline variant used when a request does not pick one
+DEFAULT_TOOL = os.environ.get("DEFAULT_TOOL", "fusion_vector")
 
 DEFAULT_MODEL_NAME = "gpt-4o"
+
+# Model per pipeline stage; yes/no relevancy grading does not need the
+# frontier model. A request's `model` parameter overrides generation only.
+# With the Ollama provider every stage defaults to OLLAMA_CHAT_MODEL
+_OLLAMA = LLM_PROVIDER == "ollama"
+GENERATION_MODEL_NAME = os.environ.get("GENERATION_MODEL_NAME", OLLAMA_CHAT_MODEL if _OLLAMA else DEFAULT_MODEL_NAME)
+GRADING_MODEL_NAME = os.environ.get("GRADING_MODEL_NAME", OLLAMA_CHAT_MODEL if _OLLAMA else "gpt-3.5-turbo")
+# Text-to-Cypher and text-to-SQL
+QUERY_MODEL_NAME = os.environ.get("QUERY_MODEL_NAME", OLLAMA_CHAT_MODEL if _OLLAMA else DEFAULT_MODEL_NAME)
+
+# USD per million (input, output) tokens, for the per-request usage report
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
@@ -0,0 +1,7 @@
+import os
+
+# Queries accepted by one POST /api/search/batch call
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", 100))
+# Searches of a batch run side by side; each holds one retrieval and one
+# LLM call at a time, so this bounds the load a batch puts on both
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
@@ -0,0 +1,19 @@
+import os
+
+# Default end-to-end latency budget of a search, in seconds
+REQUEST_BUDGET_SECONDS = float(os.environ.get("REQUEST_BUDGET_SECONDS", 30))
+# Upper bound for per-call overrides; stays below gunicorn's --timeout 120
+MAX_REQUEST_BUDGET_SECONDS = 100
+
+# Below this much remaining budget, relevancy grading is skipped entirely
+MIN_GRADING_BUDGET_SECONDS = 6
+# Expected cost of grading one document, used to cut grading short
+GRADING_SECONDS_PER_DOCUMENT = 1.5
+# Remaining budget kept back for generation while grading
+GENERATION_RESERVE_SECONDS = 4
+
+# Below this much remaining budget, no LLM answer is generated at all
+MIN_GENERATION_BUDGET_SECONDS = 2
+# Below this much remaining budget, the answer is generated with SHORT_MAX_TOKENS
+FULL_GENERATION_BUDGET_SECONDS = 10
+SHORT_MAX_TOKENS = 256
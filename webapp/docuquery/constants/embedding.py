@@ -1,4 +1,6 @@
-OLLAMA_BASE_URL = "http://host.docker.internal:11434"
+import os
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
 # OLLAMA_BASE_URL = 'http://localhost:11434'
 
 EMBEDDING_MODEL_NAME = "nomic-embed-text"
@@ -0,0 +1,21 @@
+import os
+
+# Answer lookup questions with sentences of the top hit, skipping grading
+# and generation, when that hit is clearly the best (Neo4j cosine, 0-1).
+# Off by default: the thresholds below are starting points that have not
+# been measured against LLM answers yet
+EXTRACTIVE_ENABLED = os.environ.get("EXTRACTIVE_ENABLED", "false").lower() == "true"
+EXTRACTIVE_SOURCES = ["confluence"]
+EXTRACTIVE_MIN_SIMILARITY = float(os.environ.get("EXTRACTIVE_MIN_SIMILARITY", 0.95))
+# Lead of the top hit over the next one
+EXTRACTIVE_MIN_MARGIN = float(os.environ.get("EXTRACTIVE_MIN_MARGIN", 0.02))
+# Share of the query terms the chosen sentences and the page title must cover
+EXTRACTIVE_MIN_COVERAGE = float(os.environ.get("EXTRACTIVE_MIN_COVERAGE", 0.6))
+EXTRACTIVE_MAX_SENTENCES = 3
+EXTRACTIVE_MAX_CHARS = 600
+
+# Link to a Confluence page in an extractive answer
+CONFLUENCE_PAGE_URL = (
+    os.environ.get("CONFLUENCE_BASE_URL", "https://rdcrn.atlassian.net/wiki").rstrip("/")
+    + "/spaces/{space_key}/pages/{id}"
+)
@@ -0,0 +1,19 @@
+import os
+
+# Questions split out of FAQ and how-to Confluence pages at ingestion,
+# answered from the stored answer when a query matches one closely. Off by
+# default: it adds a query embedding and an index lookup before retrieval,
+# and needs an ingestion that built the FAQ index
+FAQ_ENABLED = os.environ.get("FAQ_ENABLED", "false").lower() == "true"
+FAQ_INDEX_NAME = "faq_question_embedding"
+# Neo4j cosine (0-1); question against question, so stricter than a page hit
+FAQ_MIN_SIMILARITY = float(os.environ.get("FAQ_MIN_SIMILARITY", 0.97))
+FAQ_LOOKUP_TIMEOUT = float(os.environ.get("FAQ_LOOKUP_TIMEOUT", 0.5))
+# Candidates fetched from the index, so pages the user can't read can be passed over
+FAQ_CANDIDATES = 5
+# Pages with a FAQ or how-to title, or at least this many questions, are split
+FAQ_MIN_PAIRS = 3
+FAQ_MAX_ANSWER_CHARS = 1500
+# Part of every page's content hash: bump it when the splitting changes, so
+# the next ingestion rebuilds every page's questions
+FAQ_EXTRACTOR_VERSION = "1"
@@ -0,0 +1,15 @@
+import os
+
+# How relevancy_check grades documents: "llm", "bm25" or "embedding"
+GRADING_MODE = os.environ.get("GRADING_MODE", "llm")
+GRADING_MODES = ["llm", "bm25", "embedding"]
+
+# Minimum normalized BM25 score (0-1) for a document to count as relevant. Not
+# calibrated on labelled data: 0.15 is roughly one mention of one of three query
+# terms in an average-length document, so a document needs at least that much
+# lexical overlap to be kept.
+BM25_THRESHOLD = float(os.environ.get("BM25_THRESHOLD", 0.15))
+# Minimum cosine similarity between query and document embeddings. Not
+# calibrated on labelled data, and similarity ranges differ between embedding
+# models, so tune it for the embedding model in use before using GRADING_MODE=embedding.
+EMBEDDING_THRESHOLD = float(os.environ.get("EMBEDDING_THRESHOLD", 0.75))
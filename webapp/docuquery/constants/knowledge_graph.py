@@ -0,0 +1,18 @@
+import os
+
+# Entity extraction of Confluence pages (graph/KnowledgeGraph.py)
+KG_CHUNK_TOKENS = int(os.environ.get("KG_CHUNK_TOKENS", 1500))
+KG_CHUNK_OVERLAP_TOKENS = int(os.environ.get("KG_CHUNK_OVERLAP_TOKENS", 100))
+# LLM extractions in flight at once
+KG_CONCURRENCY = int(os.environ.get("KG_CONCURRENCY", 8))
+# Graph documents written to Neo4j per add_graph_documents call
+KG_WRITE_BATCH_SIZE = int(os.environ.get("KG_WRITE_BATCH_SIZE", 20))
+# Extractions by chunk content hash, in a SQLite file next to db.sqlite3,
+# so re-runs only pay for new or changed chunks
+KG_CACHE_PATH = os.environ.get(
+    "KG_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "kg_cache.sqlite3"),
+)
+# Part of every chunk's hash: bump it when the extraction prompt or
+# transformer settings change, so cached extractions are not reused
+KG_EXTRACTOR_VERSION = "1"
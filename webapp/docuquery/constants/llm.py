@@ -0,0 +1,34 @@
+import os
+
+# "openai" or "ollama" (ChatOllama at OLLAMA_BASE_URL)
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai")
+LLM_PROVIDERS = ["openai", "ollama"]
+OLLAMA_CHAT_MODEL = os.environ.get("OLLAMA_CHAT_MODEL", "llama3.1")
+# Embeddings must match the vector indexes, so they are chosen separately
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "openai")
+
+# Default seconds per LLM request, and retries on connection errors and 429/5xx
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+
+# Keep-alive pool shared by every client in a worker process
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_SECONDS = float(os.environ.get("LLM_KEEPALIVE_SECONDS", 60))
+
+# Hedged chat completions: once a call has run longer than the recent
+# LLM_HEDGE_QUANTILE latency of its model and stage, a duplicate is sent and
+# the first response wins. Until LLM_HEDGE_MIN_SAMPLES calls are seen the
+# delay is LLM_HEDGE_DELAY_SECONDS. Off by default: every hedge is a second
+# paid call
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_STAGES = [stage.strip() for stage in os.environ.get("LLM_HEDGE_STAGES", "generation,grading").split(",")]
+LLM_HEDGE_QUANTILE = float(os.environ.get("LLM_HEDGE_QUANTILE", 0.9))
+LLM_HEDGE_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_DELAY_SECONDS", 3.0))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", 0.3))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_WINDOW = 500
+# Share of calls that may be duplicated, and how many hedges may go out in
+# a burst after a quiet period
+LLM_HEDGE_BUDGET = float(os.environ.get("LLM_HEDGE_BUDGET", 0.05))
+LLM_HEDGE_BURST = 10
@@ -1,8 +1,21 @@
+import os
+
 URL = "bolt://neo4j:7687"
 USERNAME = "neo4j"
 PASSWORD = "password"
+DATABASE = os.environ.get("NEO4J_DATABASE", "neo4j")
 EMBEDDING_NODE_LABEL = "Embeddable"
 EMBEDDING_NODE_PROPERTY = "embedding"
+# Skip ratio passed to apoc.meta.data() as `sample` when introspecting the schema:
+# it reads roughly every Nth node of each label, so larger values read fewer nodes.
+# Also used as `maxRels`, the relationships checked per type and label pair.
+SCHEMA_SAMPLE_SIZE = int(os.environ.get("NEO4J_SCHEMA_SAMPLE_SIZE", 1000))
+
+# Text-to-Cypher retrieval
+CYPHER_RETRIEVAL_ENABLED = os.environ.get("CYPHER_RETRIEVAL_ENABLED", "false").lower() == "true"
+CYPHER_QUERY_TIMEOUT = float(os.environ.get("CYPHER_QUERY_TIMEOUT", 5))
+CYPHER_CACHE_SIZE = int(os.environ.get("CYPHER_CACHE_SIZE", 512))
+CYPHER_MAX_ROWS = 50
 common_columns = [
     "id",
     "text",
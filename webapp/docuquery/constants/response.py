@@ -0,0 +1,17 @@
+import os
+
+# Passages returned per document with snippets=true, and their length in
+# characters
+SNIPPET_COUNT = int(os.environ.get("SNIPPET_COUNT", 3))
+SNIPPET_CHARS = int(os.environ.get("SNIPPET_CHARS", 240))
+
+# Fields a search request can select with fields=
+RESPONSE_FIELDS = [
+    "answer", "postgres_rows", "graph_rows", "query", "tool", "relevant_documents", "degradations", "usage",
+    "session", "extractive",
+]
+DOCUMENT_FIELDS = ["id", "title", "data_source", "text", "snippets", "space_name", "space_key", "score"]
+
+# Brotli level for compressed responses; 4-5 beat gzip on size at a similar
+# CPU cost, 11 is meant for static assets
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
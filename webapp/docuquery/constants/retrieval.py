@@ -0,0 +1,68 @@
+import os
+
+# Seconds each retrieval source may take before its results are dropped
+RETRIEVAL_SOURCE_TIMEOUTS = {
+    "confluence": float(os.environ.get("CONFLUENCE_RETRIEVAL_TIMEOUT", 8)),
+    "postgres": float(os.environ.get("POSTGRES_RETRIEVAL_TIMEOUT", 5)),
+}
+# Smoothing constant of reciprocal rank fusion, 60 is the usual choice
+RRF_K = 60
+# Number of documents kept after fusing all sources
+FUSED_TOP_K = 8
+
+# Documents returned per source, and candidates fetched before filtering
+TOP_K = 5
+FETCH_K = int(os.environ.get("FETCH_K", 20))
+# Minimum query similarity (Neo4j cosine, 0-1) a document needs to be returned
+SCORE_THRESHOLD = float(os.environ.get("SCORE_THRESHOLD", 0.5))
+# Documents at or above GRADING_ACCEPT_SCORE skip grading as relevant, those
+# below GRADING_REJECT_SCORE skip it as irrelevant; the band between is graded
+GRADING_ACCEPT_SCORE = float(os.environ.get("GRADING_ACCEPT_SCORE", 0.93))
+GRADING_REJECT_SCORE = float(os.environ.get("GRADING_REJECT_SCORE", 0.85))
+
+# Diversify the top k with maximal marginal relevance over the fetched
+# candidates; 1.0 ranks by relevance only, 0.0 by diversity only. Off until
+# benchmarks/retrieval_eval.py shows no recall or MRR drop against the
+# relevance-only ranking on the golden set
+MMR_ENABLED = os.environ.get("MMR_ENABLED", "false").lower() == "true"
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", 0.7))
+
+# Hybrid search fusion: "union" runs langchain's single union query, "rrf"
+# and "weighted" run the vector and keyword arms as concurrent queries and
+# fuse them in Python, each arm fetching its own number of candidates
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "union")
+HYBRID_FUSIONS = ["union", "rrf", "weighted"]
+HYBRID_VECTOR_K = int(os.environ.get("HYBRID_VECTOR_K", FETCH_K))
+HYBRID_KEYWORD_K = int(os.environ.get("HYBRID_KEYWORD_K", FETCH_K))
+HYBRID_WEIGHTS = {
+    "vector": float(os.environ.get("HYBRID_VECTOR_WEIGHT", 1.0)),
+    "keyword": float(os.environ.get("HYBRID_KEYWORD_WEIGHT", 1.0)),
+}
+
+# In-process vector mirror: embeddings exported to memory-mapped .npy files
+# that every worker shares through the page cache, searched without Neo4j
+VECTOR_MIRROR_ENABLED = os.environ.get("VECTOR_MIRROR_ENABLED", "false").lower() == "true"
+VECTOR_MIRROR_DIR = os.environ.get("VECTOR_MIRROR_DIR", "/webapp/vector_mirror")
+VECTOR_MIRROR_LABELS = ["Confluence", "Postgres"]
+# float16 halves memory and page cache use, but numpy has no float16 BLAS and
+# scores it several times slower; pair it with partitions
+VECTOR_MIRROR_DTYPE = os.environ.get("VECTOR_MIRROR_DTYPE", "float32")
+# IVF partitions built at export time, 0 searches every vector
+VECTOR_MIRROR_PARTITIONS = int(os.environ.get("VECTOR_MIRROR_PARTITIONS", 0))
+# Partitions scanned per query when the mirror is partitioned
+VECTOR_MIRROR_NPROBE = int(os.environ.get("VECTOR_MIRROR_NPROBE", 8))
+# Seconds between checks for a newer export
+VECTOR_MIRROR_CHECK_INTERVAL = float(os.environ.get("VECTOR_MIRROR_CHECK_INTERVAL", 30))
+# Share of mirror hits that must still exist in Neo4j; below it the export is
+# taken as stale (ingestion recreated the nodes) and Neo4j is searched instead
+VECTOR_MIRROR_MIN_RESOLVED = float(os.environ.get("VECTOR_MIRROR_MIN_RESOLVED", 0.5))
+
+# Document ACLs stored on nodes at ingestion (acl_restricted, acl_principals)
+# are enforced inside the retrieval query, before the top k is chosen
+ACL_FILTER_ENABLED = os.environ.get("ACL_FILTER_ENABLED", "true").lower() == "true"
+# Index candidates fetched per returned document while filtering; if too few
+# accessible ones survive, an exact search over accessible nodes fills up
+ACL_OVERFETCH = int(os.environ.get("ACL_OVERFETCH", 4))
+# Per-user group expansion is cached for this many seconds, for this many users
+ACL_CACHE_SECONDS = float(os.environ.get("ACL_CACHE_SECONDS", 300))
+ACL_CACHE_SIZE = int(os.environ.get("ACL_CACHE_SIZE", 1024))
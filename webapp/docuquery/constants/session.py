@@ -0,0 +1,20 @@
+import os
+
+# Conversations kept, in a SQLite file next to db.sqlite3 that every
+# worker process shares; least recently used dropped first, and seconds of
+# inactivity after which a session expires
+SESSION_DB_PATH = os.environ.get(
+    "SESSION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sessions.sqlite3"),
+)
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", 1024))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 1800))
+# Graded documents kept per session, and earlier turns kept both as context
+# for the reuse check and as history for generation
+SESSION_MAX_DOCUMENTS = int(os.environ.get("SESSION_MAX_DOCUMENTS", 8))
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", 4))
+# Minimum cosine similarity between a follow-up and the session's earlier
+# queries for its documents to be reused instead of retrieving again
+SESSION_REUSE_SIMILARITY = float(os.environ.get("SESSION_REUSE_SIMILARITY", 0.85))
+# Longest session id accepted from clients
+SESSION_ID_MAX_LENGTH = 128
@@ -0,0 +1,16 @@
+import os
+
+# Per-request traces of searches: every slow or failed one and a sample of
+# the rest, in a SQLite file next to db.sqlite3
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "true").lower() == "true"
+TRACE_DB_PATH = os.environ.get(
+    "TRACE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "traces.sqlite3"),
+)
+TRACE_SLOW_SECONDS = float(os.environ.get("TRACE_SLOW_SECONDS", 10))
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0.05))
+# Traces older than this, or beyond the newest TRACE_MAX_ROWS, are deleted
+# every TRACE_PRUNE_EVERY writes of a process
+TRACE_RETENTION_DAYS = float(os.environ.get("TRACE_RETENTION_DAYS", 14))
+TRACE_MAX_ROWS = int(os.environ.get("TRACE_MAX_ROWS", 20000))
+TRACE_PRUNE_EVERY = 100
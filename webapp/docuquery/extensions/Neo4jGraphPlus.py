@@ -1,46 +1,156 @@
 import json
+import logging
 from typing import Dict
 from langchain_community.graphs import Neo4jGraph
 
-from docuquery.constants.neo4j import EMBEDDING_NODE_LABEL
+from docuquery.constants.neo4j import EMBEDDING_NODE_LABEL, SCHEMA_SAMPLE_SIZE
 
 BASE_ENTITY_LABEL = "__Entity__"
 EXCLUDED_LABELS = ["_Bloom_Perspective_", "_Bloom_Scene_"] + [EMBEDDING_NODE_LABEL]
 EXCLUDED_RELS = ["_Bloom_HAS_SCENE_"]
 
-node_properties_query = """
-CALL apoc.meta.data()
+schema_query = """
+CALL apoc.meta.data({sample: $sample, maxRels: $max_rels})
 YIELD label, other, elementType, type, property
-WHERE NOT type = "RELATIONSHIP" AND elementType = "node" 
-  AND NOT label IN $EXCLUDED_LABELS
-WITH label AS nodeLabels, collect({property:property, type:type}) AS properties
-RETURN {labels: nodeLabels, properties: properties} AS output
+RETURN label, other, elementType, type, property
+"""
 
+node_type_properties_query = """
+CALL db.schema.nodeTypeProperties()
+YIELD nodeLabels, propertyName, propertyTypes
+WHERE propertyName IS NOT NULL
+RETURN nodeLabels, propertyName, propertyTypes
 """
 
-rel_properties_query = """
-CALL apoc.meta.data()
-YIELD label, other, elementType, type, property
-WHERE NOT type = "RELATIONSHIP" AND elementType = "relationship"
-      AND NOT label in $EXCLUDED_LABELS
-WITH label AS nodeLabels, collect({property:property, type:type}) AS properties
-RETURN {type: nodeLabels, properties: properties} AS output
+rel_type_properties_query = """
+CALL db.schema.relTypeProperties()
+YIELD relType, propertyName, propertyTypes
+WHERE propertyName IS NOT NULL
+RETURN relType, propertyName, propertyTypes
 """
 
-rel_query = """
-CALL apoc.meta.data()
-YIELD label, other, elementType, type, property
-WHERE type = "RELATIONSHIP" AND elementType = "node"
-UNWIND other AS other_node
-WITH * WHERE NOT label IN $EXCLUDED_LABELS
-    AND NOT other_node IN $EXCLUDED_LABELS
-RETURN {start: label, type: property, end: toString(other_node)} AS output
+schema_relationships_query = """
+CALL db.schema.visualization()
+YIELD relationships
+UNWIND relationships AS rel
+RETURN startNode(rel).name AS start, type(rel) AS type, endNode(rel).name AS end
 """
 
 CACHE_JSON = "./schema_cache.json"
 
 
+# db.schema.* reports Java type names, apoc.meta.data reports its own names
+SCHEMA_TYPE_NAMES = {
+    "String": "STRING",
+    "Long": "INTEGER",
+    "Double": "FLOAT",
+    "Boolean": "BOOLEAN",
+    "Date": "DATE",
+    "DateTime": "DATE_TIME",
+    "LocalDateTime": "LOCAL_DATE_TIME",
+    "Point": "POINT",
+}
+
+
+def split_meta_data(rows):
+    """
+    Splits the rows of a single apoc.meta.data() call into node properties,
+    relationship properties and relationships.
+    """
+    excluded_labels = EXCLUDED_LABELS + [BASE_ENTITY_LABEL]
+
+    node_properties = {}
+    rel_properties = {}
+    relationships = []
+    for row in rows:
+        if row["type"] == "RELATIONSHIP":
+            if row["elementType"] != "node" or row["label"] in excluded_labels:
+                continue
+            for other_node in row["other"]:
+                if other_node not in excluded_labels:
+                    relationships.append(
+                        {"start": row["label"], "type": row["property"], "end": str(other_node)}
+                    )
+        elif row["elementType"] == "node":
+            if row["label"] not in excluded_labels:
+                node_properties.setdefault(row["label"], []).append(
+                    {"property": row["property"], "type": row["type"]}
+                )
+        elif row["elementType"] == "relationship":
+            if row["label"] not in EXCLUDED_RELS:
+                rel_properties.setdefault(row["label"], []).append(
+                    {"property": row["property"], "type": row["type"]}
+                )
+
+    return (
+        [{"labels": label, "properties": props} for label, props in node_properties.items()],
+        [{"type": rel_type, "properties": props} for rel_type, props in rel_properties.items()],
+        relationships,
+    )
+
+
+def schema_type_name(property_types):
+    type_name = property_types[0] if property_types else "String"
+    if type_name.endswith("Array"):
+        return "LIST"
+    return SCHEMA_TYPE_NAMES.get(type_name, type_name.upper())
+
+
 class Neo4jGraphPlus(Neo4jGraph):
+    def __init__(self, *args, schema_sample_size: int = SCHEMA_SAMPLE_SIZE, **kwargs):
+        # Must be set before Neo4jGraph.__init__ calls refresh_schema()
+        self.schema_sample_size = schema_sample_size
+        super().__init__(*args, **kwargs)
+
+    def introspect_schema(self):
+        """
+        Samples the graph with a single apoc.meta.data() call and splits the
+        result into the three schema sections in Python.
+        """
+        rows = self.query(
+            schema_query,
+            params={"sample": self.schema_sample_size, "max_rels": self.schema_sample_size},
+        )
+        return split_meta_data(rows)
+
+    def introspect_schema_without_apoc(self):
+        """
+        Reads the schema from the built-in db.schema.* procedures, for
+        databases where APOC is not installed.
+        """
+        excluded_labels = EXCLUDED_LABELS + [BASE_ENTITY_LABEL]
+
+        node_properties = {}
+        for row in self.query(node_type_properties_query):
+            for label in row["nodeLabels"]:
+                if label in excluded_labels:
+                    continue
+                node_properties.setdefault(label, []).append(
+                    {"property": row["propertyName"], "type": schema_type_name(row["propertyTypes"])}
+                )
+
+        rel_properties = {}
+        for row in self.query(rel_type_properties_query):
+            # relType is reported as ":`TYPE`"
+            rel_type = row["relType"].lstrip(":").strip("`")
+            if rel_type in EXCLUDED_RELS:
+                continue
+            rel_properties.setdefault(rel_type, []).append(
+                {"property": row["propertyName"], "type": schema_type_name(row["propertyTypes"])}
+            )
+
+        relationships = [
+            el
+            for el in self.query(schema_relationships_query)
+            if el["start"] not in excluded_labels and el["end"] not in excluded_labels
+        ]
+
+        return (
+            [{"labels": label, "properties": props} for label, props in node_properties.items()],
+            [{"type": rel_type, "properties": props} for rel_type, props in rel_properties.items()],
+            relationships,
+        )
+
     def refresh_schema(self) -> None:
         """
         Refreshes the Neo4j graph schema information.
@@ -59,26 +169,13 @@ class Neo4jGraphPlus(Neo4jGraph):
             rel_properties = schema_json.get("relationship_properties")
             relationships = schema_json.get("relationships")
         else:
-            node_properties = [
-                el["output"]
-                for el in self.query(
-                    node_properties_query,
-                    params={"EXCLUDED_LABELS": EXCLUDED_LABELS + [BASE_ENTITY_LABEL]},
-                )
-            ]
-            rel_properties = [
-                el["output"]
-                for el in self.query(
-                    rel_properties_query, params={"EXCLUDED_LABELS": EXCLUDED_RELS}
-                )
-            ]
-            relationships = [
-                el["output"]
-                for el in self.query(
-                    rel_query,
-                    params={"EXCLUDED_LABELS": EXCLUDED_LABELS + [BASE_ENTITY_LABEL]},
-                )
-            ]
+            try:
+                node_properties, rel_properties, relationships = self.introspect_schema()
+            except ClientError as e:
+                if e.code != "Neo.ClientError.Procedure.ProcedureNotFound":
+                    raise
+                logging.warning("APOC is not available, reading schema from db.schema procedures")
+                node_properties, rel_properties, relationships = self.introspect_schema_without_apoc()
 
             schema_json["node_properties"] = node_properties
             schema_json["relationship_properties"] = rel_properties
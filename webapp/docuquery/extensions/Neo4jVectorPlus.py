@@ -1,29 +1,228 @@
 import traceback
 import logging
-from langchain_community.vectorstores.neo4j_vector import Neo4jVector
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_community.vectorstores.neo4j_vector import Neo4jVector, remove_lucene_chars
 import enum
 from typing import (
     Any,
+    Dict,
     List,
     Optional,
+    Tuple,
     Type,
 )
 
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 
+from docuquery.constants.retrieval import (
+    HYBRID_FUSION,
+    HYBRID_FUSIONS,
+    HYBRID_KEYWORD_K,
+    HYBRID_VECTOR_K,
+    HYBRID_WEIGHTS,
+    RRF_K,
+)
+from docuquery.graph.acl import ACL_PROPERTIES
+from docuquery.graph.rank_fusion import document_key, reciprocal_rank_fusion, weighted_score_fusion
+
 
 class SearchType(str, enum.Enum):
     """Enumerator of the Distance strategies."""
 
     VECTOR = "vector"
     HYBRID = "hybrid"
+    # Vector and keyword arms as concurrent queries, fused in Python
+    FUSION = "fusion"
 
 
 DEFAULT_SEARCH_TYPE = SearchType.VECTOR
 
+FUSION_ARM_QUERIES = {
+    "vector": (
+        "CALL db.index.vector.queryNodes($index, $k, $embedding) "
+        "YIELD node, score "
+    ),
+    "keyword": (
+        "CALL db.index.fulltext.queryNodes($keyword_index, $query, {limit: $k}) "
+        "YIELD node, score "
+    ),
+}
+
+# Shared by every store, so arms of concurrent searches don't each start threads
+_arm_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def default_retrieval_query(
+    text_node_properties: List[str],
+    embedding_node_property: str,
+    include_embeddings: bool = False,
+    content_property: Optional[str] = None,
+    metadata_properties: Optional[List[str]] = None,
+) -> str:
+    """
+    Retrieval query returning a node's text properties as the page content,
+    its other properties plus `similarity`, `element_id` (and `_embedding_`)
+    as metadata, and the `score` bound by the preceding search. ACL
+    properties are left out of the metadata.
+
+    With `content_property`, the page content is that property alone.
+    `metadata_properties` are text properties also returned as metadata, so
+    callers can read fields such as the title without parsing the content.
+    """
+    metadata_properties = metadata_properties or []
+    if content_property:
+        text = f"coalesce(node.`{content_property}`, '') AS text, "
+    else:
+        text = (
+            f"ltrim(reduce(str='', k IN {text_node_properties} |"
+            " str + '\\n' + k + ': ' + coalesce(node[k], ''))) AS text, "
+        )
+    nulled = [prop for prop in text_node_properties + ACL_PROPERTIES if prop not in metadata_properties]
+    if "id" not in metadata_properties and "id" not in nulled:
+        nulled.append("id")
+    return (
+        "RETURN "
+        + text
+        + "node {.*, `"
+        + embedding_node_property
+        + "`: Null, "
+        + ", ".join([f"`{prop}`: Null" for prop in nulled])
+        + ", element_id: elementId(node)"
+        + f", similarity: vector.similarity.cosine(node.`{embedding_node_property}`, $embedding)"
+        + (
+            f", _embedding_: node.`{embedding_node_property}`"
+            if include_embeddings
+            else ""
+        )
+        + "} AS metadata, score"
+    )
+
 
 class Neo4jVectorPlus(Neo4jVector):
 
+    def __init__(
+        self,
+        *args: Any,
+        fusion: str = HYBRID_FUSION,
+        vector_k: int = HYBRID_VECTOR_K,
+        keyword_k: int = HYBRID_KEYWORD_K,
+        fusion_weights: Optional[Dict[str, float]] = None,
+        **kwargs: Any,
+    ) -> None:
+        if fusion not in HYBRID_FUSIONS:
+            raise ValueError(f"Unknown hybrid fusion '{fusion}', expected one of {HYBRID_FUSIONS}")
+        super().__init__(*args, **kwargs)
+        self.fusion = fusion
+        self.vector_k = vector_k
+        self.keyword_k = keyword_k
+        self.fusion_weights = fusion_weights or HYBRID_WEIGHTS
+        # Per-arm timings and hit counts of the last fusion search
+        self.last_search_stats: Dict[str, Any] = {}
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        params: Dict[str, Any] = {},
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        if self.search_type != SearchType.FUSION:
+            return super().similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter, params=params, **kwargs
+            )
+        if filter:
+            raise ValueError("Metadata filtering can't be used with fusion search")
+        return self.fusion_search(embedding, kwargs["query"], k, params)
+
+    def search_arm(self, arm, embedding, query, k, params):
+        started = time.perf_counter()
+        results = self.query(
+            FUSION_ARM_QUERIES[arm] + self.retrieval_query,
+            params={
+                "index": self.index_name,
+                "keyword_index": self.keyword_index_name,
+                "k": k,
+                "embedding": embedding,
+                "query": remove_lucene_chars(query),
+                **params,
+            },
+        )
+        scored = [
+            (
+                Document(
+                    page_content=result["text"],
+                    metadata={k: v for k, v in result["metadata"].items() if v is not None},
+                ),
+                result["score"],
+            )
+            for result in results
+        ]
+        return scored, (time.perf_counter() - started) * 1000
+
+    def fusion_search(self, embedding, query, k, params=None):
+        """
+        Runs the vector and keyword arms as two concurrent queries, each
+        fetching its own number of candidates, and fuses them by reciprocal
+        rank ("rrf") or by weighted, max-normalized scores ("weighted").
+
+        A failing arm is logged and left out. Each document gets its rank in
+        every arm that found it as `vector_rank` / `keyword_rank`, and the
+        per-arm timings and hit counts are kept in `last_search_stats`.
+        """
+        started = time.perf_counter()
+        arm_k = {"vector": self.vector_k or k, "keyword": self.keyword_k or k}
+        futures = {
+            arm: _arm_executor.submit(self.search_arm, arm, embedding, query, arm_k[arm], params or {})
+            for arm in FUSION_ARM_QUERIES
+        }
+
+        scored_lists = {}
+        stats = {}
+        for arm, future in futures.items():
+            try:
+                scored_lists[arm], elapsed = future.result()
+                stats[arm] = {"k": arm_k[arm], "hits": len(scored_lists[arm]), "ms": round(elapsed, 1)}
+            except Exception as e:
+                logging.error(f"Error in the {arm} arm of fusion search on {self.node_label}: {str(e)}")
+                stats[arm] = {"k": arm_k[arm], "hits": 0, "error": str(e)}
+        if not scored_lists:
+            raise RuntimeError(f"Every arm of fusion search on {self.node_label} failed")
+
+        if self.fusion == "weighted":
+            fused = weighted_score_fusion(scored_lists, top_k=k, weights=self.fusion_weights)
+            score_key = "fused_score"
+        else:
+            fused = reciprocal_rank_fusion(
+                {arm: [document for document, _ in scored] for arm, scored in scored_lists.items()},
+                k=RRF_K, top_k=k, weights=self.fusion_weights,
+            )
+            score_key = "rrf_score"
+
+        ranks = {
+            arm: {document_key(document): rank for rank, (document, _) in enumerate(scored, start=1)}
+            for arm, scored in scored_lists.items()
+        }
+        for document in fused:
+            for arm, arm_ranks in ranks.items():
+                rank = arm_ranks.get(document_key(document))
+                if rank is not None:
+                    document.metadata[f"{arm}_rank"] = rank
+
+        stats["fused"] = len(fused)
+        # Documents both arms found, a hint for tuning the per-arm k
+        stats["overlap"] = sum(
+            1 for document in fused
+            if "vector_rank" in document.metadata and "keyword_rank" in document.metadata
+        )
+        stats["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_search_stats = stats
+        logging.info(f"Fusion search ({self.fusion}) on {self.node_label}: {stats}")
+
+        return [(document, document.metadata.pop(score_key)) for document in fused]
+
     @classmethod
     def from_existing_graph(
         cls: Type[Neo4jVector],
@@ -37,6 +236,7 @@ class Neo4jVectorPlus(Neo4jVector):
         index_name: str = "vector",
         search_type: SearchType = DEFAULT_SEARCH_TYPE,
         retrieval_query: str = "",
+        include_embeddings: bool = False,
         **kwargs: Any,
     ) -> Neo4jVector:
         """
@@ -46,6 +246,13 @@ class Neo4jVectorPlus(Neo4jVector):
         parameters and the existing graph. It validates the existence of
         the indices and creates new ones if they don't exist.
 
+        The default retrieval query returns the cosine similarity between
+        the query and each node as `similarity` in the metadata. Hybrid
+        scores are rescaled per search arm, so the top hit always scores
+        1.0; `similarity` stays comparable across queries. With
+        `include_embeddings`, it also returns each node's stored embedding
+        as `_embedding_`.
+
         Returns:
         Neo4jVector: An instance of Neo4jVector initialized with the provided parameters
                     and existing graph.
@@ -70,14 +277,8 @@ class Neo4jVectorPlus(Neo4jVector):
                 )
             # Prefer retrieval query from params, otherwise construct it
             if not retrieval_query:
-                retrieval_query = (
-                    f"RETURN reduce(str='', k IN {text_node_properties} |"
-                    " str + '\\n' + k + ': ' + coalesce(node[k], '')) AS text, "
-                    "node {.*, `"
-                    + embedding_node_property
-                    + "`: Null, id: Null, "
-                    + ", ".join([f"`{prop}`: Null" for prop in text_node_properties])
-                    + "} AS metadata, score"
+                retrieval_query = default_retrieval_query(
+                    text_node_properties, embedding_node_property, include_embeddings
                 )
             
             # Log connection parameters (without credentials)
@@ -122,7 +323,7 @@ class Neo4jVectorPlus(Neo4jVector):
                 )
                 
             # FTS index for Hybrid search
-            if search_type == SearchType.HYBRID:
+            if search_type in (SearchType.HYBRID, SearchType.FUSION):
                 fts_node_label = store.retrieve_existing_fts_index(text_node_properties)
                 # If the FTS index doesn't exist yet
                 if not fts_node_label:
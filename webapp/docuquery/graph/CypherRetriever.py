@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.prompts import PromptTemplate
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from docuquery.constants.app import QUERY_MODEL_NAME
+from docuquery.constants.neo4j import (
+    USERNAME,
+    PASSWORD,
+    URL,
+    CYPHER_CACHE_SIZE,
+    CYPHER_MAX_ROWS,
+    CYPHER_QUERY_TIMEOUT,
+)
+from docuquery.extensions.Neo4jGraphPlus import Neo4jGraphPlus
+from docuquery.graph.llm_provider import get_chat_model, message_usage_record
+
+_cypher_prompt = '''Task: Generate a read-only Cypher statement to query a Neo4j graph database.
+Instructions:
+Use only the provided node labels, relationship types and properties in the schema.
+Do not use any other relationship types or properties that are not provided.
+Never use CREATE, MERGE, SET, DELETE, REMOVE, DROP or LOAD CSV.
+The question contains placeholders such as $p0 and $p1. Use them as Cypher parameters exactly as written
+and never replace them with literal values. Their current values are only given so you understand the question.
+When matching text, prefer case-insensitive matching, e.g. toLower(n.name) CONTAINS toLower($p0).
+Return at most {limit} rows unless the question asks for a number of results.
+Do not include any explanations, apologies or text except the generated Cypher statement.
+
+Schema:
+{schema}
+
+Parameters:
+{params}
+
+The question is:
+{question}'''
+
+# Quoted strings, numbers, and runs of capitalised words (names, acronyms)
+LITERAL_PATTERN = re.compile(
+    r'"(?P<double>[^"]+)"'
+    r"|'(?P<single>[^']+)'"
+    r"|\b(?P<number>\d+(?:\.\d+)?)\b"
+    r"|\b(?P<name>[A-Z][\w-]*(?:\s+[A-Z][\w-]*)*)"
+)
+WRITE_CLAUSE_PATTERN = re.compile(
+    r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP|LOAD\s+CSV|FOREACH)\b", re.IGNORECASE
+)
+
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+
+def parameterize_question(question):
+    """
+    Normalizes a question into a cache key and pulls literals out as parameters.
+
+    "How many studies are there for 'Lowe Syndrome'?" and
+    "how many studies are there for 'Rett Syndrome'" share the template
+    "how many studies are there for $p0" with different parameters.
+    """
+    params = {}
+
+    def replace(match):
+        if match.group("name") is not None and match.start() == 0:
+            # Sentence-initial capital ("What", "How") is not a name
+            return match.group(0)
+        name = f"p{len(params)}"
+        if match.group("number") is not None:
+            number = match.group("number")
+            params[name] = float(number) if "." in number else int(number)
+        else:
+            params[name] = match.group("double") or match.group("single") or match.group("name")
+        return f"${name}"
+
+    template = LITERAL_PATTERN.sub(replace, question.strip())
+    template = re.sub(r"\s+", " ", template).lower().rstrip("?.! ")
+    return template, params
+
+
+def uses_parameters(cypher, params):
+    """
+    Whether the Cypher refers to every parameter and inlines none of their
+    values. Only such statements answer other questions of the same
+    template, so only they are cached: "which Study nodes" can't be
+    answered with $p0 as a label, and a statement that writes
+    'Lowe Syndrome' instead of $p0 would answer the next "Rett Syndrome"
+    question with the first one's rows.
+    """
+    for name in params:
+        if re.search(rf"\${name}(?!\w)", cypher) is None:
+            return False
+    # Values are looked for with the parameter references taken out, so
+    # $p1 doesn't count as the number 1
+    stripped = re.sub(r"\$\w+", "", cypher)
+    for value in params.values():
+        if re.search(rf"(?<![\w.]){re.escape(str(value))}(?![\w.])", stripped, re.IGNORECASE):
+            return False
+    return True
+
+
+def clean_cypher(text):
+    text = text.strip()
+    text = re.sub(r"^```(?:cypher)?", "", text).rstrip("`").strip()
+    return text.rstrip(";")
+
+
+class CypherRetriever:
+    """
+    Answers questions with Cypher generated from the cached graph schema.
+
+    Generated statements are validated with EXPLAIN, executed in a read-only
+    session with a timeout, and cached per normalized question so repeated
+    question shapes skip the LLM. Statements that inline the question's
+    literals instead of using its parameters are run but not cached.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, graph, llm, timeout=CYPHER_QUERY_TIMEOUT, max_rows=CYPHER_MAX_ROWS):
+        self.graph = graph
+        self.llm = llm
+        self.timeout = timeout
+        self.max_rows = max_rows
+
+    @classmethod
+    def get_default(cls):
+        # The graph connection and schema are loaded once per process
+        with cls._default_lock:
+            if cls._default is None:
+                graph = Neo4jGraphPlus(url=URL, username=USERNAME, password=PASSWORD)
+                llm = get_chat_model(QUERY_MODEL_NAME)
+                cls._default = cls(graph, llm)
+            return cls._default
+
+    def get_chain(self):
+        prompt = PromptTemplate(
+            input_variables=["schema", "params", "question", "limit"],
+            template=_cypher_prompt,
+        )
+        return prompt | self.llm
+
+    def generate(self, template, params, usage=None):
+        started = time.monotonic()
+        message = self.get_chain().invoke({
+            "schema": self.graph.get_schema,
+            "params": "\n".join(f"${name} = {value!r}" for name, value in params.items()) or "None",
+            "question": template,
+            "limit": self.max_rows,
+        })
+        if usage is not None:
+            usage.append(message_usage_record("cypher", self.llm, message, started))
+        return clean_cypher(message.content)
+
+    def validate(self, cypher, params, timeout=None):
+        """
+        Rejects anything that is not a single read-only statement.
+        EXPLAIN plans the query without running it.
+        """
+        import neo4j
+
+        if WRITE_CLAUSE_PATTERN.search(cypher):
+            raise ValueError(f"Generated Cypher is not read-only: {cypher}")
+
+        with self.graph._driver.session(
+            database=self.graph._database, default_access_mode=neo4j.READ_ACCESS
+        ) as session:
+            summary = session.run(
+                neo4j.Query(f"EXPLAIN {cypher}", timeout=timeout or self.timeout), params
+            ).consume()
+
+        if summary.query_type != "r":
+            raise ValueError(f"Generated Cypher has query type '{summary.query_type}': {cypher}")
+
+    def execute(self, cypher, params, timeout=None):
+        import neo4j
+
+        with self.graph._driver.session(
+            database=self.graph._database, default_access_mode=neo4j.READ_ACCESS
+        ) as session:
+            result = session.run(neo4j.Query(cypher, timeout=timeout or self.timeout), params)
+            return [record.data() for record in result.fetch(self.max_rows)]
+
+    def invoke(self, question, timeout=None, usage=None):
+        template, params = parameterize_question(question)
+
+        with _query_cache_lock:
+            cypher = _query_cache.get(template)
+            if cypher is not None:
+                _query_cache.move_to_end(template)
+
+        if cypher is None:
+            print(f"---CYPHER CACHE MISS: {template}---")
+            cypher = self.generate(template, params, usage)
+            self.validate(cypher, params, timeout)
+        else:
+            print(f"---CYPHER CACHE HIT: {template}---")
+
+        try:
+            rows = self.execute(cypher, params, timeout)
+        except Exception:
+            # Don't keep serving a template that fails on execution
+            with _query_cache_lock:
+                _query_cache.pop(template, None)
+            raise
+
+        if not uses_parameters(cypher, params):
+            print(f"---CYPHER NOT CACHED, LITERALS INLINED: {template}---")
+            return rows
+
+        with _query_cache_lock:
+            _query_cache[template] = cypher
+            _query_cache.move_to_end(template)
+            while len(_query_cache) > CYPHER_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+
+        return rows
+
+
+if __name__ == '__main__':
+    retriever = CypherRetriever.get_default()
+    print(retriever.invoke("How many studies are there for 'Lowe Syndrome'?"))
+    print(retriever.invoke("How many studies are there for 'Rett Syndrome'?"))
@@ -10,17 +10,13 @@ from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langgraph.graph import END, StateGraph
 
 sys.path.append(
     os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 )
 
-from docuquery.constants.app import DEFAULT_MODEL_NAME
-from docuquery.constants.embedding import OLLAMA_BASE_URL, EMBEDDING_MODEL_NAME
-
+from docuquery.constants.app import GENERATION_MODEL_NAME, GRADING_MODEL_NAME
 from docuquery.constants.neo4j import (
     USERNAME,
     PASSWORD,
@@ -31,6 +27,7 @@ from docuquery.constants.neo4j import (
 )
 
 from docuquery.extensions.Neo4jVectorPlus import Neo4jVectorPlus, SearchType
+from docuquery.graph.llm_provider import get_chat_model, get_embeddings
 
 
 class GraphState(TypedDict):
@@ -97,8 +94,7 @@ def generate_answer(state):
         ]
     )
 
-    llm = ChatOpenAI(temperature=0, model_name=DEFAULT_MODEL_NAME)
-    # llm = ChatOllama(model="llama3.1")
+    llm = get_chat_model(GENERATION_MODEL_NAME)
 
     rag_chain = prompt | llm | StrOutputParser()
 
@@ -166,8 +162,7 @@ def relevancy_check(state):
         input_variables=["query", "context"],
     )
 
-    llm = ChatOpenAI(temperature=0, model_name=DEFAULT_MODEL_NAME)
-    # llm = ChatOllama(model="llama3.1")
+    llm = get_chat_model(GRADING_MODEL_NAME)
 
     chain = prompt | llm | JsonOutputParser()
 
@@ -203,8 +198,7 @@ def retrieve_documents(state):
         state (dict): New key added to state, documents, that contains retrieved documents
     """
 
-    embeddings = OpenAIEmbeddings()
-    # embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+    embeddings = get_embeddings()
 
     vector_store = Neo4jVectorPlus.from_existing_graph(
         embeddings,
@@ -1,20 +1,18 @@
 import os
-import re
 import sys
-import html
+import json
+import time
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from typing_extensions import TypedDict
-from typing import List
+from typing import Annotated, List
+import operator
 
-from langchain_core.runnables import RunnableParallel
-
-from langchain.prompts import PromptTemplate
-
-from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
 from langgraph.graph import END, StateGraph
 
 sys.path.append(
@@ -23,8 +21,66 @@ sys.path.append(
 
 from docuquery.graph.neo4j_retrievers.confluence import Neo4jConfluenceRetriever
 from docuquery.graph.neo4j_retrievers.postgres import Neo4jPostgresRetriever
+from docuquery.graph.CypherRetriever import CypherRetriever
+from docuquery.graph.rank_fusion import reciprocal_rank_fusion
+from docuquery.graph.budget import capped_timeout, remaining, start_deadline
+from docuquery.graph.graders import get_local_grader
+from docuquery.graph.acl import get_principals
+from docuquery.graph.llm_provider import chat_completion
+from docuquery.graph.extractive import extractive_answer
+from docuquery.graph.faq import faq_index_ready, faq_lookup, format_faq_answer
+from docuquery.graph.sessions import context_similarity, get_session_store
+from docuquery.graph.traces import maybe_record
+
+from docuquery.constants.app import DEFAULT_TOOL, GENERATION_MODEL_NAME, GRADING_MODEL_NAME, TOOLS
+from docuquery.constants.neo4j import CYPHER_QUERY_TIMEOUT, CYPHER_RETRIEVAL_ENABLED
+from docuquery.constants.retrieval import (
+    ACL_FILTER_ENABLED,
+    FUSED_TOP_K,
+    GRADING_ACCEPT_SCORE,
+    GRADING_REJECT_SCORE,
+    RETRIEVAL_SOURCE_TIMEOUTS,
+    RRF_K,
+)
+from docuquery.constants.extractive import EXTRACTIVE_ENABLED
+from docuquery.constants.faq import FAQ_ENABLED
+from docuquery.constants.grading import GRADING_MODE
+from docuquery.constants.session import SESSION_REUSE_SIMILARITY
+from docuquery.constants.budget import (
+    FULL_GENERATION_BUDGET_SECONDS,
+    GENERATION_RESERVE_SECONDS,
+    GRADING_SECONDS_PER_DOCUMENT,
+    MIN_GENERATION_BUDGET_SECONDS,
+    MIN_GRADING_BUDGET_SECONDS,
+    SHORT_MAX_TOKENS,
+)
+
+RETRIEVAL_SOURCES = {
+    "confluence": Neo4jConfluenceRetriever,
+    "postgres": Neo4jPostgresRetriever,
+}
 
-from docuquery.constants.app import DEFAULT_MODEL_NAME
+# Shared across requests; a source that overruns its deadline keeps its
+# worker until it returns, so leave headroom for a few of those
+_retrieval_executor = ThreadPoolExecutor(max_workers=4 * len(RETRIEVAL_SOURCES))
+
+# Built once at import, so a preloading server shares it with its workers
+GRADING_PROMPT = PromptTemplate(
+    template="""You are evaluating whether a document is relevant to a user query.
+
+Document content: 
+{context}
+
+User query: {query}
+
+Your task is to determine if this document contains any information that might help answer the query.
+Even if the document only partially addresses the query or contains related information, it should be considered relevant.
+Only mark documents as not relevant if they are completely unrelated to the query topic.
+
+Please respond with "yes" if the document is even slightly relevant, and "no" only if it is completely unrelated.
+Provide your answer as a JSON with a single key "score" and value "yes" or "no" with no additional explanation.""",
+    input_variables=["query", "context"],
+)
 
 class GraphState(TypedDict):
 
@@ -33,16 +89,46 @@ class GraphState(TypedDict):
 
     Attributes:
         accessible_documents: List of documents that the user has access to
+        allow_extractive: Overrides EXTRACTIVE_ENABLED and FAQ_ENABLED for this request
+        deadline: Monotonic time by which the request must be answered
+        degradations: Shortcuts taken to stay within the request budget
+        extractive: Whether the answer was quoted from the top document or a FAQ
         final_response: LLM generated answer
+        grading_mode: Overrides GRADING_MODE for this request
+        graph_rows: Rows returned by the generated Cypher query
+        history: Earlier (query, answer) turns of the session
+        llm_usage: Tokens, latency and cost of every LLM call, by stage and model
+        model: Overrides GENERATION_MODEL_NAME for this request
+        tool: Pipeline variant from TOOLS that serves the request
+        query_embedding: Embedding of the user query, shared by all sources
         relevant_documents: List of accessible documents relevant to user query
         retrieved_documents: List of documents fetched initially after vector search
+        session_id: Conversation the request belongs to, if any
+        session_reused: Whether the session's documents answered the query
+        session_similarity: Similarity of the query to the session context
+        stage_timings: Milliseconds spent in each node and retrieval source
         user_query: User query
         username: Username
     """
     accessible_documents: List[str]
+    allow_extractive: bool
+    deadline: float
+    degradations: Annotated[List[str], operator.add]
+    extractive: bool
     final_response: str
+    grading_mode: str
+    graph_rows: List[dict]
+    history: List[tuple]
+    llm_usage: Annotated[List[dict], operator.add]
+    model: str
+    query_embedding: List[float]
     relevant_documents: List[str]
     retrieved_documents: List[str]
+    session_id: str
+    session_reused: bool
+    session_similarity: float
+    stage_timings: Annotated[List[dict], operator.add]
+    tool: str
     user_query: str
     username: str
 
@@ -56,6 +142,12 @@ def decide_to_proceed_relevancy(state):
         return "no_documents"
     return "has_documents"
 
+def decide_to_resume(state):
+    return "reuse" if state.get("session_reused") else "retrieve"
+
+def decide_to_extract(state):
+    return "extracted" if state.get("extractive") else "continue"
+
 def generate_answer(state):
     """
     Generate answer using RAG on retrieved documents
@@ -93,19 +185,9 @@ def generate_answer(state):
        - Use proper paragraph breaks with empty lines
     """
 
-    # Fix the initialization of ChatOpenAI
-    import os
-    import logging
-    
-    # Ensure OPENAI_API_KEY is set
-    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "sk-your-openai-api-key")
-    
-    # Import OpenAI directly to avoid class definition issues
-    from openai import OpenAI
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    
     # Create a direct implementation to generate answer
-    def generate_response(query, neo4j_documents):
+    def generate_response(query, neo4j_documents, graph_rows, max_tokens=None, timeout=None, usage=None,
+                          history=None):
         # Debug logging
         print(f"DEBUG: Got query: '{query}'")
         print(f"DEBUG: Documents count: {len(neo4j_documents)}")
@@ -122,7 +204,7 @@ def generate_answer(state):
                 content_preview = doc.page_content[:20] + "..." if len(doc.page_content) > 20 else doc.page_content
                 print(f"Document Content: {content_preview}")
         
-        if not docs_with_content:
+        if not docs_with_content and not graph_rows:
             print("DEBUG: No documents with valid content found")
             return "Based on the available information, I cannot provide a complete answer to this question."
         
@@ -138,34 +220,211 @@ def generate_answer(state):
             doc_text += f"Content: {doc.page_content}\n"
             formatted_docs.append(doc_text)
         
+        if graph_rows:
+            print(f"---USING {len(graph_rows)} GRAPH ROWS FOR ANSWER GENERATION---")
+            formatted_docs.append(f"Graph query results:\n{json.dumps(graph_rows, default=str)}\n")
+
         documents_text = "\n".join(formatted_docs)
         
         # Generate response
         prompt_text = prompt_template.format(query=query, neo4j_documents=documents_text)
+        if history:
+            # Lets follow-ups refer back to earlier questions and answers
+            turns = "\n".join(f"User: {turn_query}\nAssistant: {turn_answer}" for turn_query, turn_answer in history)
+            prompt_text += f"\n    Earlier in this conversation:\n{turns}\n"
         try:
-            response = client.chat.completions.create(
-                model=DEFAULT_MODEL_NAME,
-                messages=[
+            return chat_completion(
+                [
                     {"role": "system", "content": "You are an intelligent assistant that provides direct, concise answers without preamble."},
                     {"role": "user", "content": prompt_text}
                 ],
-                temperature=0
+                model=state.get("model") or GENERATION_MODEL_NAME,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stage="generation",
+                usage=usage,
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"ERROR generating response: {str(e)}")
             return "Sorry, I encountered an error while generating a response. Please try again."
 
     print("---GENERATE---")
-    neo4j_documents = state.get("relevant_documents")
+    neo4j_documents = state.get("relevant_documents") or []
     user_query = state.get("user_query")
+    graph_rows = state.get("graph_rows") or []
+
+    time_left = remaining(state)
+    if time_left < MIN_GENERATION_BUDGET_SECONDS:
+        print("---BUDGET EXHAUSTED: RETURNING DOCUMENTS ONLY---")
+        return {
+            "final_response": documents_only_answer(neo4j_documents),
+            "degradations": ["documents_only_answer"],
+        }
+
+    degradations = []
+    max_tokens = None
+    if time_left < FULL_GENERATION_BUDGET_SECONDS:
+        max_tokens = SHORT_MAX_TOKENS
+        degradations.append("short_answer")
+
+    usage = []
+    generated_response = generate_response(
+        user_query, neo4j_documents, graph_rows, max_tokens=max_tokens, timeout=time_left, usage=usage,
+        history=state.get("history"),
+    )
+    return {"final_response": generated_response, "degradations": degradations, "llm_usage": usage}
+
+def generate_direct_answer(state):
+    """
+    Answers from the model alone, without retrieval
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): New key added to state, final_response, that contains the LLM generated answer
+    """
+
+    print("---GENERATE WITHOUT RETRIEVAL---")
+    time_left = remaining(state)
+    degradations = []
+    max_tokens = None
+    if time_left < FULL_GENERATION_BUDGET_SECONDS:
+        max_tokens = SHORT_MAX_TOKENS
+        degradations.append("short_answer")
+
+    usage = []
+    try:
+        answer = chat_completion(
+            [
+                {"role": "system", "content": "You are an intelligent assistant that provides direct, concise answers without preamble."},
+                {"role": "user", "content": state.get("user_query")},
+            ],
+            model=state.get("model") or GENERATION_MODEL_NAME,
+            max_tokens=max_tokens,
+            timeout=max(time_left, MIN_GENERATION_BUDGET_SECONDS),
+            stage="generation",
+            usage=usage,
+        )
+    except Exception as e:
+        print(f"ERROR generating response: {str(e)}")
+        answer = "Sorry, I encountered an error while generating a response. Please try again."
+    return {"final_response": answer, "degradations": degradations, "llm_usage": usage}
+
+def keep_accessible_documents(state):
+    """
+    Passes the accessible documents on to generation without grading them
+    """
+    return {"relevant_documents": state.get("accessible_documents") or []}
+
+def document_title(document):
+    return document.metadata.get("title") or "Untitled"
+
+def documents_only_answer(documents):
+    """
+    Answer used when there is no budget left for LLM generation
+    """
+    if not documents:
+        return "No information available about this topic."
+    titles = "\n".join(f"- **{document_title(document)}**" for document in documents)
+    return f"These documents are the most relevant to your question:\n\n{titles}"
 
-    generated_response = generate_response(user_query, neo4j_documents)
-    return {"final_response": generated_response}
+def is_accessible(document, username):
+    shared_with_users = document.metadata.get("sharedWithUsers")
+    return not shared_with_users or username in shared_with_users
+
+def extract_answer(state):
+    """
+    Answers lookup questions with the best sentences of a clearly top
+    ranked document, skipping grading and generation
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): extractive, and when it is True the final_response and
+        the quoted document as the relevant one
+    """
+    allowed = state.get("allow_extractive")
+    if not (EXTRACTIVE_ENABLED if allowed is None else allowed):
+        return {"extractive": False}
+    username = state.get("username")
+    accessible_documents = [
+        document for document in state.get("retrieved_documents") or [] if is_accessible(document, username)
+    ]
+    extracted = extractive_answer(state.get("user_query"), accessible_documents)
+    if extracted is None:
+        return {"extractive": False}
+
+    print(f"---EXTRACTIVE ANSWER: SIMILARITY {extracted['similarity']:.3f}, "
+          f"MARGIN {extracted['margin']:.3f}, COVERAGE {extracted['coverage']:.2f}---")
+    return {
+        "extractive": True,
+        "final_response": extracted["answer"],
+        "accessible_documents": accessible_documents,
+        "relevant_documents": [extracted["document"]],
+    }
+
+def answer_from_faq(state):
+    """
+    Answers a query matching a question of the FAQ index with its stored
+    answer, skipping retrieval, grading and generation
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): extractive and the query embedding, which retrieval
+        reuses, and on a match the final_response and the FAQ page as the
+        relevant document
+    """
+    allowed = state.get("allow_extractive")
+    if not (FAQ_ENABLED if allowed is None else allowed) or not faq_index_ready():
+        return {"extractive": False}
+    try:
+        query_embedding = state.get("query_embedding") or embed_query(state.get("user_query"))
+    except Exception as e:
+        # retrieve_documents retries and reports the failure
+        logging.error(f"Error embedding query: {str(e)}")
+        return {"extractive": False}
+
+    updated_state = {"extractive": False, "query_embedding": query_embedding}
+    try:
+        principals = get_principals(state.get("username")) if ACL_FILTER_ENABLED else None
+        match = faq_lookup(query_embedding, principals)
+    except Exception as e:
+        logging.warning(f"FAQ lookup failed, retrieving: {str(e)}")
+        return updated_state
+    if match is None:
+        return updated_state
+
+    print(f"---FAQ ANSWER: SIMILARITY {match['similarity']:.3f}---")
+    document = Document(
+        page_content=f"{match['question']}\n{match['answer']}",
+        metadata={
+            "id": match["id"],
+            "title": match["title"],
+            "space_key": match["space_key"],
+            "space_name": match["space_name"],
+            "data_source": "confluence",
+            "similarity": match["similarity"],
+            "faq_question": match["question"],
+        },
+    )
+    updated_state.update({
+        "extractive": True,
+        "final_response": format_faq_answer(match),
+        "retrieved_documents": [document],
+        "accessible_documents": [document],
+        "relevant_documents": [document],
+    })
+    return updated_state
 
 def permission_check(state):
     """
     Determines whether the user has permissions to the retrieved documents.
+    Node ACLs are already enforced by the retrieval query; this catches
+    documents shared through the legacy `sharedWithUsers` metadata.
 
     Args:
         state (dict): The current graph state
@@ -180,16 +439,14 @@ def permission_check(state):
     accessible_documents = []
     updated_state = {}
     for document in retrieved_documents:
-        shared_with_users = document.metadata.get("sharedWithUsers")
-
-        if not shared_with_users or username in shared_with_users:
+        if is_accessible(document, username):
             print("---GRADE: DOCUMENT ACCESSIBLE---")
             accessible_documents.append(document)
         else:
             print("---GRADE: DOCUMENT NOT ACCESSIBLE---")
 
     updated_state["accessible_documents"] = accessible_documents
-    if not accessible_documents:
+    if not accessible_documents and not state.get("graph_rows"):
         updated_state["final_response"] = "You don't have access to the relevant documents."
 
     return updated_state
@@ -204,43 +461,18 @@ def relevancy_check(state):
     Returns:
         state (dict): Updates documents key with relevant accessible documents
     """
-    prompt = PromptTemplate(
-        template="""You are evaluating whether a document is relevant to a user query.
-
-Document content: 
-{context}
-
-User query: {query}
-
-Your task is to determine if this document contains any information that might help answer the query.
-Even if the document only partially addresses the query or contains related information, it should be considered relevant.
-Only mark documents as not relevant if they are completely unrelated to the query topic.
-
-Please respond with "yes" if the document is even slightly relevant, and "no" only if it is completely unrelated.
-Provide your answer as a JSON with a single key "score" and value "yes" or "no" with no additional explanation.""",
-        input_variables=["query", "context"],
-    )
+    usage = []
 
-    # Fix the initialization of ChatOpenAI
-    import os
-    import logging
-    
-    # Ensure OPENAI_API_KEY is set
-    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "sk-your-openai-api-key")
-    
-    # Import OpenAI directly to avoid class definition issues
-    from openai import OpenAI
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    
     # Create a simple function to mimic ChatOpenAI
     def ask_openai(prompt_text):
         try:
-            response = client.chat.completions.create(
-                model=DEFAULT_MODEL_NAME,
-                messages=[{"role": "user", "content": prompt_text}],
-                temperature=0
+            return chat_completion(
+                [{"role": "user", "content": prompt_text}],
+                model=GRADING_MODEL_NAME,
+                timeout=capped_timeout(state, GRADING_SECONDS_PER_DOCUMENT * 4),
+                stage="grading",
+                usage=usage,
             )
-            return response.choices[0].message.content
         except Exception as e:
             logging.error(f"Error in ask_openai: {str(e)}")
             # Default to yes if there's an error, to be more inclusive
@@ -250,7 +482,7 @@ Provide your answer as a JSON with a single key "score" and value "yes" or "no"
     def chain_invoke(inputs):
         context = inputs.get("context", "")
         query = inputs.get("query", "")
-        prompt_text = prompt.template.format(context=context, query=query)
+        prompt_text = GRADING_PROMPT.template.format(context=context, query=query)
         response = ask_openai(prompt_text)
         # Parse the JSON response
         import json
@@ -275,15 +507,54 @@ Provide your answer as a JSON with a single key "score" and value "yes" or "no"
     # If no documents, return early
     if not accessible_documents or len(accessible_documents) == 0:
         print("---NO ACCESSIBLE DOCUMENTS FOUND---")
+        if state.get("graph_rows"):
+            return {"relevant_documents": []}
         return {"relevant_documents": [], "final_response": "No relevant documents found."}
 
+    # Confident retrieval scores settle a document without grading it
+    accepted, ambiguous = split_by_similarity(accessible_documents)
+    print(f"---SCORES: {len(accepted)} ACCEPTED, {len(ambiguous)} TO GRADE, "
+          f"{len(accessible_documents) - len(accepted) - len(ambiguous)} REJECTED---")
+    if not ambiguous:
+        return relevancy_result(state, accepted, [])
+    accessible_documents = ambiguous
+
+    # Local graders run on CPU in milliseconds, no budget handling needed
+    grader = get_local_grader(state.get("grading_mode") or GRADING_MODE)
+    if grader is not None:
+        print(f"---GRADING LOCALLY WITH {grader.name.upper()}---")
+        verdicts = grader.grade(query, accessible_documents, state.get("query_embedding"))
+        relevant_documents = accepted + [
+            document for document, relevant in zip(accessible_documents, verdicts) if relevant
+        ]
+        return relevancy_result(state, relevant_documents, [])
+
+    # Grade only as many documents as the remaining budget allows, keeping
+    # enough back for generation; ungraded documents are kept as relevant
+    grading_budget = remaining(state) - GENERATION_RESERVE_SECONDS
+    if remaining(state) < MIN_GRADING_BUDGET_SECONDS:
+        print("---BUDGET LOW: SKIPPING RELEVANCY CHECK---")
+        return {"relevant_documents": accepted + accessible_documents, "degradations": ["grading_skipped"]}
+    gradable = max(int(grading_budget // GRADING_SECONDS_PER_DOCUMENT), 1)
+    degradations = []
+    if gradable < len(accessible_documents):
+        print(f"---BUDGET LOW: GRADING {gradable} OF {len(accessible_documents)} DOCUMENTS---")
+        degradations.append("grading_truncated")
+
     # Keep track of relevant documents
-    relevant_documents = []
+    relevant_documents = accepted + list(accessible_documents[gradable:])
     
     # Print query for debugging
     print(f"---EVALUATING RELEVANCE FOR QUERY: {query}---")
     
-    for i, document in enumerate(accessible_documents):
+    for i, document in enumerate(accessible_documents[:gradable]):
+        if remaining(state) - GENERATION_RESERVE_SECONDS < GRADING_SECONDS_PER_DOCUMENT:
+            print("---BUDGET LOW: KEEPING REMAINING DOCUMENTS UNGRADED---")
+            relevant_documents.extend(accessible_documents[i:gradable])
+            if "grading_truncated" not in degradations:
+                degradations.append("grading_truncated")
+            break
+
         # Extract document info for logging
         doc_id = document.metadata.get('id', f'doc_{i}')
         doc_title = document.metadata.get('title', 'Untitled')
@@ -295,8 +566,9 @@ Provide your answer as a JSON with a single key "score" and value "yes" or "no"
         
         # Perform relevance check
         try:
+            metadata = {k: v for k, v in document.metadata.items() if k != "_embedding_"}
             score = chain({
-                "context": f'{document.page_content} \n\n{str(document.metadata)}',
+                "context": f'{document.page_content} \n\n{str(metadata)}',
                 "query": query,
             })
             
@@ -310,11 +582,32 @@ Provide your answer as a JSON with a single key "score" and value "yes" or "no"
             print(f"---ERROR IN RELEVANCY CHECK: {str(e)}, INCLUDING DOCUMENT---")
             relevant_documents.append(document)
 
+    return {**relevancy_result(state, relevant_documents, degradations), "llm_usage": usage}
+
+def split_by_similarity(documents):
+    """
+    Splits documents into those confidently relevant by retrieval score and
+    those that still need grading; documents below the floor are dropped.
+    Documents without a score always need grading.
+    """
+    accepted = []
+    ambiguous = []
+    for document in documents:
+        similarity = document.metadata.get("similarity")
+        if similarity is None:
+            ambiguous.append(document)
+        elif similarity >= GRADING_ACCEPT_SCORE:
+            accepted.append(document)
+        elif similarity >= GRADING_REJECT_SCORE:
+            ambiguous.append(document)
+    return accepted, ambiguous
+
+def relevancy_result(state, relevant_documents, degradations):
     # Update state with relevant documents
-    updated_state = {"relevant_documents": relevant_documents}
+    updated_state = {"relevant_documents": relevant_documents, "degradations": degradations}
     
     # If no relevant documents were found, set a clear message
-    if not relevant_documents:
+    if not relevant_documents and not state.get("graph_rows"):
         print("---NO RELEVANT DOCUMENTS FOUND---")
         updated_state["final_response"] = "No information available about this topic."
     else:
@@ -322,9 +615,67 @@ Provide your answer as a JSON with a single key "score" and value "yes" or "no"
 
     return updated_state
 
+def retrieve_from_source(source, query, query_embedding, include_embeddings=False, principals=None):
+    retriever = RETRIEVAL_SOURCES[source]()
+    documents = retriever.search_by_vector(
+        query_embedding, query, include_embeddings=include_embeddings, principals=principals
+    )
+    for doc in documents:
+        # Add data_source to metadata instead of page_content
+        doc.metadata['data_source'] = source
+    return documents
+
+def embed_query(query):
+    return Neo4jConfluenceRetriever().get_embeddings().embed_query(query)
+
+def embed_queries(queries):
+    # One embeddings request for a whole batch
+    return Neo4jConfluenceRetriever().get_embeddings().embed_documents(queries)
+
+def resume_session(state):
+    """
+    Reuses the graded documents of the request's session when the query is
+    close enough to the session's earlier queries, skipping retrieval and
+    grading
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): The session's history and, when it is reused, its
+        documents and graph rows as relevant_documents and graph_rows
+    """
+    session_id = state.get("session_id")
+    if not session_id:
+        return {"session_reused": False}
+    session = get_session_store().get(session_id, state.get("username"))
+    if session is None:
+        print("---SESSION: NEW---")
+        return {"session_reused": False}
+
+    updated_state = {"history": session["turns"], "session_reused": False}
+    try:
+        query_embedding = state.get("query_embedding") or embed_query(state.get("user_query"))
+    except Exception as e:
+        # retrieve_documents retries and reports the failure
+        logging.error(f"Error embedding query: {str(e)}")
+        return updated_state
+    similarity = context_similarity(session, query_embedding)
+    updated_state.update({"query_embedding": query_embedding, "session_similarity": similarity})
+    if similarity is not None and similarity >= SESSION_REUSE_SIMILARITY:
+        print(f"---SESSION: REUSING {len(session['documents'])} DOCUMENTS ({similarity:.2f})---")
+        updated_state.update({
+            "relevant_documents": session["documents"],
+            "graph_rows": session["graph_rows"],
+            "session_reused": True,
+        })
+    else:
+        print("---SESSION: RETRIEVING AGAIN---")
+    return updated_state
+
 def retrieve_documents(state):
     """
-    Retrieve documents from vectorstore
+    Retrieve documents from every source concurrently and fuse the rankings
 
     Args:
         state (dict): The current graph state
@@ -335,60 +686,264 @@ def retrieve_documents(state):
 
     print("---NEO4J RETRIEVE---")
     query = state.get("user_query")
+    include_embeddings = (state.get("grading_mode") or GRADING_MODE) == "embedding"
 
+    # Embed once and share the vector with every source
+    timings = []
     try:
-        # Try to connect to Neo4j and retrieve documents
-        neo4j_cr = Neo4jConfluenceRetriever()
-        confluence_document_retriever = neo4j_cr.get_document_retriever()
-        
-        # Use only the confluence retriever
-        results = {'confluence': confluence_document_retriever.invoke(query), 'postgres': []}
-        
-        # No Postgres documents to process
-        
-        for doc in results['confluence']:
-            # Add data_source to metadata instead of page_content
-            doc.metadata['data_source'] = 'confluence'
-    
-        retrieved_documents = results['confluence']
-        
-        return {"retrieved_documents": retrieved_documents}
-    
+        query_embedding = state.get("query_embedding")
+        if not query_embedding:
+            embedding_started = time.monotonic()
+            query_embedding = embed_query(query)
+            timings.append(stage_timing("retrieve_documents.embedding", embedding_started))
     except Exception as e:
-        # Log the error for debugging
-        import logging
-        logging.error(f"Error retrieving documents from Neo4j: {str(e)}")
-        print(f"ERROR: Failed to retrieve documents: {str(e)}")
-        
-        # Return an empty result with error message
+        logging.error(f"Error embedding query: {str(e)}")
         return {
-            "retrieved_documents": [], 
-            "final_response": "Sorry, I'm having trouble connecting to the document database. Please check the Neo4j connection."
+            "retrieved_documents": [],
+            "final_response": "Sorry, I'm having trouble connecting to the document database. Please check the Neo4j connection.",
         }
 
+    # Documents the user can't read are filtered out inside the search
+    principals = get_principals(state.get("username")) if ACL_FILTER_ENABLED else None
+
+    started = time.monotonic()
+    timeouts = {
+        source: capped_timeout(state, timeout)
+        for source, timeout in RETRIEVAL_SOURCE_TIMEOUTS.items()
+    }
+    futures = {
+        source: _retrieval_executor.submit(
+            retrieve_from_source, source, query, query_embedding, include_embeddings, principals
+        )
+        for source in RETRIEVAL_SOURCES
+    }
+    finished = {}
+    for source, future in futures.items():
+        future.add_done_callback(lambda _, source=source: finished.setdefault(source, time.monotonic()))
+
+    # Sources run side by side, so each one only waits out what is left of
+    # its own deadline and the slowest source bounds the total latency
+    results = {}
+    degradations = []
+    for source, future in futures.items():
+        time_left = timeouts[source] - (time.monotonic() - started)
+        try:
+            results[source] = future.result(timeout=max(time_left, 0))
+            print(f"---{source.upper()}: {len(results[source])} DOCUMENTS---")
+        except FutureTimeoutError:
+            logging.warning(f"Retrieval from {source} exceeded {timeouts[source]:.1f}s, skipping")
+            degradations.append(f"{source}_retrieval_timeout")
+        except Exception as e:
+            logging.error(f"Error retrieving documents from {source}: {str(e)}")
+            degradations.append(f"{source}_retrieval_failed")
+        timings.append(stage_timing(f"retrieve_documents.{source}", started, finished.get(source)))
+
+    if not results:
+        print("ERROR: Failed to retrieve documents from every source")
+        return {
+            "retrieved_documents": [],
+            "final_response": "Sorry, I'm having trouble connecting to the document database. Please check the Neo4j connection.",
+            "degradations": degradations,
+            "stage_timings": timings,
+        }
+
+    retrieved_documents = reciprocal_rank_fusion(results, k=RRF_K, top_k=FUSED_TOP_K)
+    return {
+        "retrieved_documents": retrieved_documents,
+        "query_embedding": query_embedding,
+        "degradations": degradations,
+        "stage_timings": timings,
+    }
+
+def retrieve_graph_rows(state):
+    """
+    Retrieve rows from the graph with generated Cypher
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): New key added to state, graph_rows, that contains the query results
+    """
+
+    print("---CYPHER RETRIEVE---")
+    query = state.get("user_query")
+
+    rows = []
+    usage = []
+    if remaining(state) < MIN_GRADING_BUDGET_SECONDS:
+        print("---BUDGET LOW: SKIPPING CYPHER RETRIEVAL---")
+        return {"graph_rows": rows, "degradations": ["cypher_retrieval_skipped"]}
+    try:
+        rows = CypherRetriever.get_default().invoke(
+            query, timeout=capped_timeout(state, CYPHER_QUERY_TIMEOUT), usage=usage
+        )
+    except Exception as error:
+        # The Cypher path is supplementary, vector retrieval still answers
+        print(f"Error retrieving data with generated Cypher: {str(error)}")
+    return {"graph_rows": rows, "llm_usage": usage}
+
+def stage_timing(stage, started, finished=None):
+    return {"stage": stage, "ms": round(((finished or time.monotonic()) - started) * 1000, 1)}
+
+def timed(node):
+    """
+    Wraps a graph node so its duration is added to `stage_timings`, after
+    any finer timings the node reports itself.
+    """
+    @functools.wraps(node)
+    def run(state):
+        started = time.monotonic()
+        update = node(state)
+        timing = stage_timing(node.__name__, started)
+        return {**update, "stage_timings": update.get("stage_timings", []) + [timing]}
+    return run
+
 class DocuQuery:
-    def __init__(self):
-        self.graph = DocuQuery.get_graph()
+    _graphs = {}
+    _graphs_lock = threading.Lock()
+
+    def __init__(self, tool=DEFAULT_TOOL):
+        self.tool = tool
+        self.graph = DocuQuery.get_graph(tool)
 
     def invoke(self, data):
-        return self.graph.invoke({
+        """
+        Answers `data["query"]` and, unless `data["trace"]` is False, keeps a
+        trace of the request when it is slow, fails, or is sampled.
+        """
+        started = time.monotonic()
+        try:
+            result = self.run(data)
+        except Exception as error:
+            if data.get("trace", True):
+                maybe_record(data, self.tool, None, (time.monotonic() - started) * 1000, error)
+            raise
+        result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if data.get("trace", True):
+            maybe_record(data, self.tool, result, result["elapsed_ms"])
+        return result
+
+    def run(self, data):
+        username = "JaneSmith"
+        session_id = data.get("session_id")
+        result = self.graph.invoke({
             "user_query": data.get("query"),
-            "username": "JaneSmith",
+            "username": username,
+            "allow_extractive": data.get("extractive"),
+            "deadline": start_deadline(data.get("budget")),
+            "degradations": [],
+            "grading_mode": data.get("grading_mode"),
+            "llm_usage": [],
+            "model": data.get("model"),
+            "query_embedding": data.get("query_embedding"),
+            "session_id": session_id,
+            "stage_timings": [],
+            "tool": self.tool,
         })
+        # Only turns that reached grading (or reused the session) are kept;
+        # a failed retrieval leaves the session as it was
+        if session_id and result.get("query_embedding") is not None and "relevant_documents" in result:
+            get_session_store().save_turn(
+                session_id,
+                username,
+                data.get("query"),
+                result.get("final_response"),
+                query_embedding=result["query_embedding"],
+                documents=None if result.get("session_reused") else result["relevant_documents"],
+                graph_rows=result.get("graph_rows"),
+            )
+        return result
+
+    @staticmethod
+    def get_graph(tool=DEFAULT_TOOL):
+        """
+        Compiled graph of a TOOLS variant, built once per process:
+
+            fusion_vector  fused retrieval, permission and relevancy checks, generation
+            basic_vector   fused retrieval and permission check, generation without grading
+            graph_cypher   generated Cypher only, then generation
+            chatgpt        generation straight from the query
+
+        The vector variants start by checking the request's session, and
+        answer close follow-ups from its documents without retrieving. After
+        retrieval they quote a clearly top ranked document for lookup
+        questions instead of grading and generating (extract_answer). With
+        FAQ_ENABLED, a query matching a question split out of a FAQ page is
+        answered before retrieval (answer_from_faq).
+        """
+        builders = {
+            "fusion_vector": DocuQuery.build_fusion_vector_graph,
+            "basic_vector": DocuQuery.build_basic_vector_graph,
+            "graph_cypher": DocuQuery.build_graph_cypher_graph,
+            "chatgpt": DocuQuery.build_chatgpt_graph,
+        }
+        if tool not in builders:
+            raise ValueError(f"Unknown tool '{tool}', expected one of {[name for name, _ in TOOLS]}")
+        with DocuQuery._graphs_lock:
+            if tool not in DocuQuery._graphs:
+                DocuQuery._graphs[tool] = builders[tool]()
+            return DocuQuery._graphs[tool]
+
+    @staticmethod
+    def add_retrieval_edges(workflow):
+        # Session reuse, then with FAQ_ENABLED the FAQ index, then retrieval
+        retrieve = "answer_from_faq" if FAQ_ENABLED else "retrieve_documents"
+        workflow.add_conditional_edges(
+            "resume_session",
+            decide_to_resume,
+            {
+                "reuse": "generate_answer",
+                "retrieve": retrieve,
+            }
+        )
+        if FAQ_ENABLED:
+            workflow.add_node("answer_from_faq", timed(answer_from_faq))
+            workflow.add_conditional_edges(
+                "answer_from_faq",
+                decide_to_extract,
+                {
+                    "extracted": END,
+                    "continue": "retrieve_documents",
+                }
+            )
 
     @staticmethod
-    def get_graph():
+    def build_fusion_vector_graph():
         workflow = StateGraph(GraphState)
 
         # Define the nodes
-        workflow.add_node("generate_answer", generate_answer)
-        workflow.add_node("permission_check", permission_check)
-        workflow.add_node("relevancy_check", relevancy_check)
-        workflow.add_node("retrieve_documents", retrieve_documents)
+        workflow.add_node("extract_answer", timed(extract_answer))
+        workflow.add_node("generate_answer", timed(generate_answer))
+        workflow.add_node("permission_check", timed(permission_check))
+        workflow.add_node("relevancy_check", timed(relevancy_check))
+        workflow.add_node("resume_session", timed(resume_session))
+        workflow.add_node("retrieve_documents", timed(retrieve_documents))
 
         # Build graph
-        workflow.set_entry_point("retrieve_documents")
-        workflow.add_edge("retrieve_documents", "permission_check")
+        workflow.set_entry_point("resume_session")
+        DocuQuery.add_retrieval_edges(workflow)
+        workflow.add_edge("retrieve_documents", "extract_answer")
+        if CYPHER_RETRIEVAL_ENABLED:
+            workflow.add_node("retrieve_graph_rows", timed(retrieve_graph_rows))
+            workflow.add_conditional_edges(
+                "extract_answer",
+                decide_to_extract,
+                {
+                    "extracted": END,
+                    "continue": "retrieve_graph_rows",
+                }
+            )
+            workflow.add_edge("retrieve_graph_rows", "permission_check")
+        else:
+            workflow.add_conditional_edges(
+                "extract_answer",
+                decide_to_extract,
+                {
+                    "extracted": END,
+                    "continue": "permission_check",
+                }
+            )
 
         workflow.add_conditional_edges(
             "permission_check",
@@ -412,29 +967,63 @@ class DocuQuery:
         return workflow.compile()
 
     @staticmethod
-    def parse_document_content(page_content):
-        properties = {}
-        
-        # Remove any trailing data_source field if it exists
-        content_lines = []
-        data_source = None
-        
-        for line in page_content.strip().split('\n'):
-            if line.strip().startswith('data_source:'):
-                continue
-            content_lines.append(line)
-                
-        # Parse the content    
-        for line in content_lines:
-            key_value = line.split(':', 1)
-            if len(key_value) == 2:
-                key = key_value[0].strip()
-                value = key_value[1].strip()
-                if value and key not in ['data_source']:
-                    # Decode HTML entities like &rsquo; and &nbsp;
-                    properties[key] = html.unescape(value)
-
-        return properties
+    def build_basic_vector_graph():
+        workflow = StateGraph(GraphState)
+
+        workflow.add_node("resume_session", timed(resume_session))
+        workflow.add_node("retrieve_documents", timed(retrieve_documents))
+        workflow.add_node("extract_answer", timed(extract_answer))
+        workflow.add_node("permission_check", timed(permission_check))
+        workflow.add_node("keep_accessible_documents", timed(keep_accessible_documents))
+        workflow.add_node("generate_answer", timed(generate_answer))
+
+        workflow.set_entry_point("resume_session")
+        DocuQuery.add_retrieval_edges(workflow)
+        workflow.add_edge("retrieve_documents", "extract_answer")
+        workflow.add_conditional_edges(
+            "extract_answer",
+            decide_to_extract,
+            {
+                "extracted": END,
+                "continue": "permission_check",
+            }
+        )
+        workflow.add_conditional_edges(
+            "permission_check",
+            decide_to_proceed_permission,
+            {
+                "no_documents": END,
+                "has_documents": "keep_accessible_documents",
+            }
+        )
+        workflow.add_edge("keep_accessible_documents", "generate_answer")
+        workflow.add_edge("generate_answer", END)
+
+        return workflow.compile()
+
+    @staticmethod
+    def build_graph_cypher_graph():
+        workflow = StateGraph(GraphState)
+
+        workflow.add_node("retrieve_graph_rows", timed(retrieve_graph_rows))
+        workflow.add_node("generate_answer", timed(generate_answer))
+
+        workflow.set_entry_point("retrieve_graph_rows")
+        workflow.add_edge("retrieve_graph_rows", "generate_answer")
+        workflow.add_edge("generate_answer", END)
+
+        return workflow.compile()
+
+    @staticmethod
+    def build_chatgpt_graph():
+        workflow = StateGraph(GraphState)
+
+        workflow.add_node("generate_direct_answer", timed(generate_direct_answer))
+
+        workflow.set_entry_point("generate_direct_answer")
+        workflow.add_edge("generate_direct_answer", END)
+
+        return workflow.compile()
 
 
 if __name__ == '__main__':
@@ -443,11 +1032,6 @@ if __name__ == '__main__':
         "query": "tell me about Encephalomyopathy?",
         "username": "JaneSmith"
     })
-    parsed_document = []
     for document in response.get("relevant_documents"):
-        data = DocuQuery.parse_document_content(document.page_content)
-        print(data)
-
-        parsed_document.append({**data, **document.metadata})
-    # print(parsed_document)
+        print(document.metadata)
 
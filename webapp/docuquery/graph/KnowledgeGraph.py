@@ -1,22 +1,38 @@
 import os
 import sys
+import json
+import time
+import asyncio
+import hashlib
 import logging
+import sqlite3
 
 from langchain_community.document_loaders import ConfluenceLoader
 from langchain_community.graphs import Neo4jGraph
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
 from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_openai import ChatOpenAI
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 sys.path.append(
     os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 )
 
-from docuquery.constants.app import DEFAULT_MODEL_NAME
 from docuquery.constants.neo4j import (
     USERNAME,
     PASSWORD,
     URL,
 )
+from docuquery.constants.knowledge_graph import (
+    KG_CACHE_PATH,
+    KG_CHUNK_OVERLAP_TOKENS,
+    KG_CHUNK_TOKENS,
+    KG_CONCURRENCY,
+    KG_EXTRACTOR_VERSION,
+    KG_WRITE_BATCH_SIZE,
+)
+from docuquery.extensions.Neo4jGraphPlus import BASE_ENTITY_LABEL
+from docuquery.graph.llm_provider import get_chat_model
 
 import nest_asyncio
 nest_asyncio.apply()
@@ -29,6 +45,190 @@ RDCRN_CONFLUENCE_URL = os.environ.get("RDCRN_CONFLUENCE_URL")
 logging.info(f"RDCRN_CONFLUENCE_SPACE: {RDCRN_CONFLUENCE_SPACE}")
 logging.info(f"RDCRN_CONFLUENCE_URL: {RDCRN_CONFLUENCE_URL}")
 
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    hash TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    graph TEXT NOT NULL
+);
+"""
+
+
+def connect_cache(path=KG_CACHE_PATH):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(CACHE_SCHEMA)
+    return connection
+
+
+def content_hash(text, model_name):
+    digest = hashlib.sha256()
+    for part in (KG_EXTRACTOR_VERSION, model_name or "", text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def split_pages(documents, model_name):
+    """
+    Token-bounded chunks of the loaded pages. A chunk's content hash keys
+    the extraction cache; its id, which also names its Document node in
+    Neo4j, adds the page id, so equal chunks of two pages stay apart.
+    """
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=KG_CHUNK_TOKENS,
+        chunk_overlap=KG_CHUNK_OVERLAP_TOKENS,
+    )
+    chunks = []
+    for document in documents:
+        page_id = document.metadata.get("id")
+        for index, text in enumerate(splitter.split_text(document.page_content)):
+            digest = content_hash(text, model_name)
+            metadata = {key: value for key, value in document.metadata.items() if key != "id"}
+            metadata.update(id=f"{page_id}:{digest[:32]}", page_id=page_id, chunk=index, content_hash=digest)
+            chunks.append(Document(page_content=text, metadata=metadata))
+    return chunks
+
+
+def cached_extractions(cache, chunks):
+    """
+    Graph documents of the chunks extracted by an earlier run.
+    """
+    hashes = list({chunk.metadata["content_hash"] for chunk in chunks})
+    stored = {}
+    for start in range(0, len(hashes), 500):
+        part = hashes[start:start + 500]
+        rows = cache.execute(
+            f"SELECT hash, graph FROM extractions WHERE hash IN ({','.join('?' * len(part))})", part
+        )
+        stored.update(dict(rows.fetchall()))
+    return {
+        chunk.metadata["id"]: GraphDocument.model_validate({**json.loads(stored[chunk.metadata["content_hash"]]), "source": chunk})
+        for chunk in chunks
+        if chunk.metadata["content_hash"] in stored
+    }
+
+
+def cache_extraction(cache, chunk, graph_document):
+    cache.execute(
+        "INSERT OR REPLACE INTO extractions (hash, created_at, graph) VALUES (?, ?, ?)",
+        (chunk.metadata["content_hash"], time.time(), json.dumps(graph_document.model_dump(exclude={"source"}))),
+    )
+    cache.commit()
+
+
+def create_chunk_indexes(graph):
+    graph.query("CREATE INDEX document_id IF NOT EXISTS FOR (d:Document) ON (d.id)")
+    graph.query("CREATE INDEX document_page_id IF NOT EXISTS FOR (d:Document) ON (d.page_id)")
+
+
+def written_chunks(graph, chunk_ids):
+    """
+    Ids of the chunks whose whole batch was written by an earlier run.
+    """
+    rows = graph.query(
+        "MATCH (d:Document) WHERE d.id IN $ids AND d.kg_complete RETURN d.id AS id",
+        {"ids": chunk_ids},
+    )
+    return {row["id"] for row in rows}
+
+
+def write_batch(graph, graph_documents):
+    graph.add_graph_documents(
+        graph_documents,
+        baseEntityLabel=True,
+        include_source=True
+    )
+    # Marked only once its nodes and relationships are in, so a chunk cut
+    # off by a crash is written again
+    graph.query(
+        "MATCH (d:Document) WHERE d.id IN $ids SET d.kg_complete = true",
+        {"ids": [graph_document.source.metadata["id"] for graph_document in graph_documents]},
+    )
+
+
+def remove_stale_chunks(graph, page_ids, chunk_ids):
+    """
+    Deletes the chunks of re-loaded pages that no longer match their
+    content, then the entities no chunk mentions anymore.
+    """
+    graph.query(
+        "MATCH (d:Document) WHERE d.page_id IN $page_ids AND NOT d.id IN $ids DETACH DELETE d",
+        {"page_ids": page_ids, "ids": chunk_ids},
+    )
+    graph.query(f"MATCH (e:`{BASE_ENTITY_LABEL}`) WHERE NOT (e)<-[:MENTIONS]-(:Document) DETACH DELETE e")
+
+
+async def extract_chunks(transformer, chunks, cache, failures):
+    """
+    Extracts the chunks with at most KG_CONCURRENCY LLM calls in flight,
+    caching and yielding each graph document as soon as it is done. Failed
+    chunks are logged and appended to `failures`; the next run retries them.
+    """
+    semaphore = asyncio.Semaphore(KG_CONCURRENCY)
+
+    async def extract(chunk):
+        async with semaphore:
+            try:
+                graph_documents = await transformer.aconvert_to_graph_documents([chunk])
+                return chunk, graph_documents[0], None
+            except Exception as e:
+                return chunk, None, e
+
+    for task in asyncio.as_completed([extract(chunk) for chunk in chunks]):
+        chunk, graph_document, error = await task
+        if error is not None:
+            logging.error(f"Error extracting chunk {chunk.metadata['chunk']} of {chunk.metadata.get('title')}: {str(error)}")
+            failures.append(chunk.metadata["id"])
+            continue
+        cache_extraction(cache, chunk, graph_document)
+        yield graph_document
+
+
+async def build_graph(graph, transformer, chunks, cache):
+    """
+    Writes the graph documents of every chunk not yet in Neo4j, in batches
+    of KG_WRITE_BATCH_SIZE: cached extractions first, then new ones as they
+    arrive, so a crash only loses the batch in progress.
+
+    Returns:
+        (counts, failures): dict of chunks skipped as already written,
+        taken from the cache, extracted, written and failed, and the ids of
+        the failed chunks
+    """
+    written = written_chunks(graph, [chunk.metadata["id"] for chunk in chunks])
+    pending = [chunk for chunk in chunks if chunk.metadata["id"] not in written]
+    cached = cached_extractions(cache, pending)
+    to_extract = [chunk for chunk in pending if chunk.metadata["id"] not in cached]
+    counts = {"skipped": len(written), "cached": len(cached), "extracted": 0, "written": 0, "failed": 0}
+    print(f"---{len(chunks)} CHUNKS: {len(written)} WRITTEN, {len(cached)} CACHED, {len(to_extract)} TO EXTRACT---")
+
+    batch = []
+
+    async def flush():
+        # Off the event loop, so extractions keep going while Neo4j writes
+        await asyncio.to_thread(write_batch, graph, list(batch))
+        counts["written"] += len(batch)
+        print(f"---WROTE {counts['written']}/{len(pending)} CHUNKS---")
+        batch.clear()
+
+    for graph_document in cached.values():
+        batch.append(graph_document)
+        if len(batch) >= KG_WRITE_BATCH_SIZE:
+            await flush()
+
+    failures = []
+    async for graph_document in extract_chunks(transformer, to_extract, cache, failures):
+        counts["extracted"] += 1
+        batch.append(graph_document)
+        if len(batch) >= KG_WRITE_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    counts["failed"] = len(failures)
+    return counts, failures
+
+
 def main():
     url = RDCRN_CONFLUENCE_URL
     space_key = RDCRN_CONFLUENCE_SPACE
@@ -41,16 +241,30 @@ def main():
     documents = loader.load()
     documents = list(filter(lambda x: x.page_content, documents))
 
-    llm = ChatOpenAI(temperature=0, model_name=DEFAULT_MODEL_NAME)
+    llm = get_chat_model()
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    chunks = split_pages(documents, model_name)
     llm_transformer = LLMGraphTransformer(llm=llm)
-    graph_documents = llm_transformer.convert_to_graph_documents(documents)
 
     graph = Neo4jGraph(url=URL, username=USERNAME, password=PASSWORD)
-    graph.add_graph_documents(
-        graph_documents,
-        baseEntityLabel=True,
-        include_source=True
+    create_chunk_indexes(graph)
+    cache = connect_cache()
+    try:
+        counts, failures = asyncio.run(build_graph(graph, llm_transformer, chunks, cache))
+    finally:
+        cache.close()
+
+    # Only once the new chunks are in, and only for the pages just loaded
+    # whose chunks all were; the others keep their old chunks until a run
+    # extracts them
+    failed = set(failures)
+    incomplete = {chunk.metadata["page_id"] for chunk in chunks if chunk.metadata["id"] in failed}
+    remove_stale_chunks(
+        graph,
+        list({chunk.metadata["page_id"] for chunk in chunks} - incomplete),
+        [chunk.metadata["id"] for chunk in chunks],
     )
+    print(f"Summary: {len(documents)} pages, {len(chunks)} chunks, {json.dumps(counts)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
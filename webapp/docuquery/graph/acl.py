@@ -0,0 +1,284 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from docuquery.constants.neo4j import DATABASE
+from docuquery.constants.retrieval import ACL_CACHE_SECONDS, ACL_CACHE_SIZE
+
+# Node properties written at ingestion; left out of document metadata
+ACL_PROPERTIES = ["acl_restricted", "acl_principals"]
+
+_principals = OrderedDict()
+_principals_lock = threading.Lock()
+
+
+def user_principal(key):
+    return f"user:{key}"
+
+
+def group_principal(name):
+    return f"group:{name}"
+
+
+def acl_predicate(variable="node"):
+    """
+    Cypher condition that `variable` is readable by one of `$principals`.
+    Nodes ingested without ACLs are public.
+    """
+    return (
+        f"(NOT coalesce({variable}.acl_restricted, false) "
+        f"OR any(principal IN coalesce({variable}.acl_principals, []) WHERE principal IN $principals))"
+    )
+
+
+def user_key(user):
+    # Cloud sites identify users by accountId, Server / Data Center by username
+    return user.get("accountId") or user.get("username") or user.get("userKey")
+
+
+def page_restrictions(content):
+    """
+    Read restrictions set directly on a page, from a v1 content response
+    expanded with restrictions.read.restrictions.user and .group.
+
+    Returns:
+        (principals, users, groups): the allowed principals, or None when
+        the page itself is unrestricted, the restricted users' profiles and
+        the restricted group names
+    """
+    read = ((content or {}).get("restrictions") or {}).get("read") or {}
+    restrictions = read.get("restrictions") or {}
+    users = [user for user in (restrictions.get("user") or {}).get("results", []) if user_key(user)]
+    groups = [group.get("name") for group in (restrictions.get("group") or {}).get("results", []) if group.get("name")]
+    if not users and not groups:
+        return None, [], []
+    principals = {user_principal(user_key(user)) for user in users} | {group_principal(name) for name in groups}
+    return principals, users, groups
+
+
+def effective_acls(pages):
+    """
+    Combines each page's restrictions with those of its ancestors.
+    Confluence only shows a page to users allowed at every restricted level,
+    so the effective list is the intersection of the levels' lists; a user
+    allowed through a group on one level and by name on another is left out,
+    never let in. An ancestor missing from `pages` has unknown restrictions
+    and lets nobody in, so a restricted parent that failed to load never
+    exposes its children.
+
+    Args:
+        pages: page id -> (principals or None, ancestor page ids)
+
+    Returns:
+        page id -> (restricted, sorted principals)
+    """
+    acls = {}
+    for page_id, (principals, ancestors) in pages.items():
+        levels = [pages[ancestor][0] if ancestor in pages else set() for ancestor in ancestors]
+        levels = [level for level in levels + [principals] if level is not None]
+        if not levels:
+            acls[page_id] = (False, [])
+            continue
+        allowed = set(levels[0])
+        for level in levels[1:]:
+            allowed &= level
+        acls[page_id] = (True, sorted(allowed))
+    return acls
+
+
+def fetch_page_restrictions(client, page_id):
+    """
+    A page's read restrictions and ancestors (v1 content API), or None when
+    they could not be read. `client` has the Confluence base_url,
+    access_token and request headers.
+    """
+    import requests
+    if not client.base_url or not client.access_token:
+        return None
+    url = f"{client.base_url}/rest/api/content/{page_id}"
+    params = {'expand': 'restrictions.read.restrictions.user,restrictions.read.restrictions.group,ancestors'}
+    try:
+        response = requests.get(url, headers=client.headers, params=params)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"Error getting Confluence page restrictions: {str(e)}")
+        return None
+
+
+def fetch_group_members(client, group_name):
+    """
+    All members of a Confluence group (v1 API); those read before an error.
+    """
+    import requests
+    if not client.base_url or not client.access_token:
+        return []
+    url = f"{client.base_url}/rest/api/group/member"
+    members = []
+    try:
+        while True:
+            params = {'name': group_name, 'start': len(members), 'limit': 200}
+            response = requests.get(url, headers=client.headers, params=params)
+            response.raise_for_status()
+            results = response.json().get('results', [])
+            members.extend(results)
+            if len(results) < 200:
+                return members
+    except Exception as e:
+        print(f"Error getting members of Confluence group {group_name}: {str(e)}")
+        return members
+
+
+class PageAcls:
+    """
+    Read restrictions of the pages of an ingestion run, collected page by
+    page and stored once every page and its ancestors are known. Shared by
+    both populate_neo4j.py scripts.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.pages = {}
+        self.users = []
+        self.groups = set()
+
+    def add(self, page_id):
+        """
+        Reads a page's own restrictions and its ancestors' ids. Called
+        whether or not the page's node is created: its restrictions still
+        apply to its children.
+        """
+        content = fetch_page_restrictions(self.client, page_id)
+        if content is None:
+            # Unknown restrictions: hide the page rather than expose it
+            print(f"  WARNING: Could not read restrictions of page {page_id}, nobody will see it")
+            self.pages[page_id] = (set(), [])
+            return
+        principals, users, groups = page_restrictions(content)
+        self.pages[page_id] = (principals, [ancestor.get('id') for ancestor in content.get('ancestors', [])])
+        self.users.extend(users)
+        self.groups.update(groups)
+
+    def store(self, session, label="Confluence"):
+        """
+        Writes the effective restrictions and the memberships of the groups
+        they name (store_acls).
+        """
+        acls = effective_acls(self.pages)
+        unknown = sum(
+            1 for _, ancestors in self.pages.values() if any(ancestor not in self.pages for ancestor in ancestors)
+        )
+        if unknown:
+            print(f"WARNING: {unknown} pages have an ancestor with unknown restrictions, nobody will see them")
+        memberships = {name: fetch_group_members(self.client, name) for name in sorted(self.groups)}
+        store_acls(session, label, acls, self.users, memberships)
+        restricted = sum(1 for is_restricted, _ in acls.values() if is_restricted)
+        print(f"Stored read restrictions: {restricted} of {len(acls)} pages restricted, {len(memberships)} groups")
+
+
+def create_acl_indexes(session):
+    session.run("CREATE INDEX acl_user_key IF NOT EXISTS FOR (u:AclUser) ON (u.key)")
+    session.run("CREATE INDEX acl_user_username IF NOT EXISTS FOR (u:AclUser) ON (u.username)")
+    session.run("CREATE INDEX acl_group_name IF NOT EXISTS FOR (g:AclGroup) ON (g.name)")
+
+
+def store_acls(session, label, acls, users, memberships):
+    """
+    Writes effective ACLs onto the `label` nodes and the users and group
+    memberships that get_principals expands at query time.
+
+    Args:
+        acls: node id -> (restricted, principals), as from effective_acls
+        users: Confluence user profiles seen in restrictions or groups
+        memberships: group name -> member profiles
+    """
+    session.run(
+        f"UNWIND $rows AS row MATCH (n:`{label}` {{id: row.id}}) "
+        "SET n.acl_restricted = row.restricted, n.acl_principals = row.principals",
+        rows=[
+            {"id": page_id, "restricted": restricted, "principals": principals}
+            for page_id, (restricted, principals) in acls.items()
+        ],
+    )
+
+    profiles = {user_key(user): user for user in users if user_key(user)}
+    for members in memberships.values():
+        profiles.update({user_key(user): user for user in members if user_key(user)})
+    session.run(
+        "UNWIND $users AS user MERGE (u:AclUser {key: user.key}) "
+        "SET u.username = user.username, u.public_name = user.public_name, "
+        "u.display_name = user.display_name, u.email = user.email",
+        users=[
+            {
+                "key": key,
+                "username": user.get("username"),
+                "public_name": user.get("publicName"),
+                "display_name": user.get("displayName"),
+                "email": user.get("email"),
+            }
+            for key, user in profiles.items()
+        ],
+    )
+    session.run(
+        "UNWIND $memberships AS membership MERGE (g:AclGroup {name: membership.group}) "
+        "WITH g, membership MATCH (u:AclUser {key: membership.user}) MERGE (u)-[:MEMBER_OF]->(g)",
+        memberships=[
+            {"group": name, "user": user_key(user)}
+            for name, members in memberships.items()
+            for user in members
+            if user_key(user)
+        ],
+    )
+
+
+def expand_principals(username, driver):
+    """
+    The user's own principal plus those of the matching Confluence users and
+    the groups they belong to.
+    """
+    principals = {user_principal(username)}
+    with driver.session(database=DATABASE) as session:
+        record = session.run(
+            "MATCH (u:AclUser) WHERE u.key = $username OR u.username = $username "
+            "OR u.public_name = $username OR u.email = $username "
+            "OPTIONAL MATCH (u)-[:MEMBER_OF]->(g:AclGroup) "
+            "RETURN collect(DISTINCT u.key) AS users, collect(DISTINCT g.name) AS groups",
+            username=username,
+        ).single()
+    if record is not None:
+        principals |= {user_principal(key) for key in record["users"]}
+        principals |= {group_principal(name) for name in record["groups"]}
+    return sorted(principals)
+
+
+def get_principals(username, driver=None):
+    """
+    Cached `expand_principals`. Anonymous requests only see public documents.
+    A failed expansion falls back to the user principal and is not cached.
+    """
+    if not username:
+        return []
+
+    now = time.monotonic()
+    with _principals_lock:
+        cached = _principals.get(username)
+        if cached is not None and now - cached[1] < ACL_CACHE_SECONDS:
+            _principals.move_to_end(username)
+            return cached[0]
+
+    try:
+        if driver is None:
+            from docuquery.graph.vector_mirror import get_driver
+            driver = get_driver()
+        principals = expand_principals(username, driver)
+    except Exception as e:
+        logging.error(f"Error expanding the groups of {username}: {str(e)}")
+        return [user_principal(username)]
+
+    with _principals_lock:
+        _principals[username] = (principals, now)
+        _principals.move_to_end(username)
+        while len(_principals) > ACL_CACHE_SIZE:
+            _principals.popitem(last=False)
+    return principals
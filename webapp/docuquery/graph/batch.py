@@ -0,0 +1,64 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from docuquery.constants.app import DEFAULT_TOOL
+from docuquery.constants.batch import BATCH_CONCURRENCY
+from docuquery.graph.DocuQueryMultiRetriever import DocuQuery, embed_queries
+from docuquery.graph.graders import normalize_query
+
+
+def run_batch(queries, tool=DEFAULT_TOOL, budget=None, model=None, concurrency=BATCH_CONCURRENCY, stats=None,
+              extractive=None):
+    """
+    Runs the search pipeline for a list of queries, yielding results as each
+    search finishes.
+
+    Queries that only differ in case or spacing are searched once, which
+    also grades each (query, document) pair once: a pair can only repeat
+    between searches of the same query. The distinct queries are embedded in
+    a single request and their searches run `concurrency` at a time. Each
+    search gets its own `budget` from when it starts.
+
+    Args:
+        stats: Dict that gets the number of queries and distinct queries
+        extractive: Overrides EXTRACTIVE_ENABLED for every search
+
+    Yields:
+        (indexes into `queries`, pipeline result or None, exception or None)
+    """
+    groups = OrderedDict()
+    for index, query in enumerate(queries):
+        groups.setdefault(normalize_query(query), []).append(index)
+    indexes = list(groups.values())
+
+    try:
+        embeddings = embed_queries([queries[group[0]] for group in indexes])
+    except Exception as e:
+        # Each search embeds its own query instead
+        logging.error(f"Error embedding a batch of {len(indexes)} queries: {str(e)}")
+        embeddings = [None] * len(indexes)
+
+    if stats is not None:
+        stats.update({"queries": len(queries), "distinct": len(indexes)})
+    docuquery = DocuQuery(tool)
+    executor = ThreadPoolExecutor(max_workers=max(min(concurrency, len(indexes)), 1))
+    try:
+        futures = {
+            executor.submit(docuquery.invoke, {
+                "query": queries[group[0]],
+                "budget": budget,
+                "model": model,
+                "extractive": extractive,
+                "query_embedding": embedding,
+            }): group
+            for group, embedding in zip(indexes, embeddings)
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+    finally:
+        # A client that hangs up mid-batch leaves the queued searches unrun
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+import math
+import time
+
+from docuquery.constants.budget import MAX_REQUEST_BUDGET_SECONDS, REQUEST_BUDGET_SECONDS
+
+
+def start_deadline(budget=None):
+    """
+    Returns the monotonic deadline of a request that starts now.
+    The budget falls back to REQUEST_BUDGET_SECONDS and is clamped to
+    MAX_REQUEST_BUDGET_SECONDS.
+
+    Raises:
+        ValueError: When the budget is NaN or infinite
+    """
+    budget = REQUEST_BUDGET_SECONDS if budget is None else float(budget)
+    if not math.isfinite(budget):
+        raise ValueError("budget must be a number of seconds")
+    budget = min(max(budget, 0.0), MAX_REQUEST_BUDGET_SECONDS)
+    return time.monotonic() + budget
+
+
+def remaining(state):
+    """
+    Seconds left before the request deadline, infinite when none was set.
+    """
+    deadline = state.get("deadline")
+    if deadline is None:
+        return float("inf")
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def capped_timeout(state, timeout):
+    """
+    The given timeout, shortened to what is left of the request budget.
+    """
+    return min(timeout, remaining(state))
@@ -0,0 +1,121 @@
+import re
+
+from docuquery.constants.extractive import (
+    CONFLUENCE_PAGE_URL,
+    EXTRACTIVE_MAX_CHARS,
+    EXTRACTIVE_MAX_SENTENCES,
+    EXTRACTIVE_MIN_COVERAGE,
+    EXTRACTIVE_MIN_MARGIN,
+    EXTRACTIVE_MIN_SIMILARITY,
+    EXTRACTIVE_SOURCES,
+)
+from docuquery.graph.graders import tokenize
+
+# Ends of sentences, and line breaks, which separate list items and headings
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+# Shorter lines are headings or fragments, which don't answer anything
+MIN_SENTENCE_WORDS = 4
+
+
+def split_sentences(text):
+    """
+    Sentences of `text`, split at sentence ends and line breaks.
+    """
+    return [sentence for sentence in (part.strip() for part in SENTENCE_BREAK.split(text or "")) if sentence]
+
+
+def best_sentences(text, query, count=EXTRACTIVE_MAX_SENTENCES, max_chars=EXTRACTIVE_MAX_CHARS):
+    """
+    Sentences of `text` covering the most distinct query terms, then the
+    most occurrences, in document order and at most `max_chars` long.
+
+    Returns:
+        (index, sentence, terms) tuples, where terms are the query terms the
+        sentence contains
+    """
+    terms = set(tokenize(query))
+    scored = []
+    for index, sentence in enumerate(split_sentences(text)):
+        if len(sentence.split()) < MIN_SENTENCE_WORDS:
+            continue
+        tokens = tokenize(sentence)
+        matched = terms.intersection(tokens)
+        if matched:
+            occurrences = sum(1 for token in tokens if token in terms)
+            scored.append((len(matched), occurrences, -index, sentence, matched))
+
+    chosen = []
+    length = 0
+    for _, _, index, sentence, matched in sorted(scored, reverse=True):
+        if len(chosen) == count:
+            break
+        if length + len(sentence) > max_chars:
+            continue
+        chosen.append((-index, sentence, matched))
+        length += len(sentence) + 1
+    return sorted(chosen)
+
+
+def page_url(metadata):
+    if metadata.get("data_source") == "confluence" and metadata.get("id") and metadata.get("space_key"):
+        return CONFLUENCE_PAGE_URL.format(space_key=metadata["space_key"], id=metadata["id"])
+    return None
+
+
+def format_answer(sentences, metadata):
+    # Sentences that were not next to each other in the page are elided
+    parts = []
+    previous = None
+    for index, sentence, _ in sentences:
+        if previous is not None:
+            parts.append(" " if index == previous + 1 else " … ")
+        parts.append(sentence)
+        previous = index
+    title = metadata.get("title") or "Untitled"
+    url = page_url(metadata)
+    source = f"[{title}]({url})" if url else f"**{title}**"
+    return f"{''.join(parts)}\n\nSource: {source}"
+
+
+def extractive_answer(query, documents, min_similarity=EXTRACTIVE_MIN_SIMILARITY,
+                      min_margin=EXTRACTIVE_MIN_MARGIN, min_coverage=EXTRACTIVE_MIN_COVERAGE):
+    """
+    Answers from the best sentences of the top document, when its similarity
+    and its lead over the next document pass the thresholds and the
+    sentences plus its title cover enough of the query terms.
+
+    Returns:
+        Dict of answer, document, similarity, margin and coverage, or None
+        when the query needs the full pipeline
+    """
+    ranked = sorted(
+        (document for document in documents if document.metadata.get("similarity") is not None),
+        key=lambda document: document.metadata["similarity"],
+        reverse=True,
+    )
+    if not ranked or ranked[0].metadata.get("data_source") not in EXTRACTIVE_SOURCES:
+        return None
+    top = ranked[0]
+    similarity = top.metadata["similarity"]
+    margin = similarity - (ranked[1].metadata["similarity"] if len(ranked) > 1 else 0.0)
+    if similarity < min_similarity or margin < min_margin:
+        return None
+
+    terms = set(tokenize(query))
+    sentences = best_sentences(top.page_content, query)
+    if not terms or not sentences:
+        return None
+    covered = set(tokenize(top.metadata.get("title") or "")) & terms
+    for _, _, matched in sentences:
+        covered |= matched
+    coverage = len(covered) / len(terms)
+    if coverage < min_coverage:
+        return None
+
+    return {
+        "answer": format_answer(sentences, top.metadata),
+        "document": top,
+        "similarity": similarity,
+        "margin": round(margin, 4),
+        "coverage": round(coverage, 2),
+    }
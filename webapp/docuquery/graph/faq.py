@@ -0,0 +1,278 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from docuquery.constants.faq import (
+    FAQ_CANDIDATES,
+    FAQ_EXTRACTOR_VERSION,
+    FAQ_INDEX_NAME,
+    FAQ_LOOKUP_TIMEOUT,
+    FAQ_MAX_ANSWER_CHARS,
+    FAQ_MIN_PAIRS,
+    FAQ_MIN_SIMILARITY,
+)
+from docuquery.constants.neo4j import DATABASE
+from docuquery.graph.acl import acl_predicate
+from docuquery.graph.extractive import page_url
+
+HEADINGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+BLOCKS = HEADINGS + ["p", "li", "td", "pre"]
+QUESTION_START = re.compile(
+    r"^(how|what|why|where|when|who|which|can|could|do|does|is|are|should|will)\b", re.IGNORECASE
+)
+FAQ_TITLE = re.compile(r"\b(faqs?|frequently asked|questions|how to|how do i)\b", re.IGNORECASE)
+
+
+def storage_html(page):
+    """
+    Storage format body of a page from the v2 API, or the v1 content API.
+    """
+    if 'storage' in (page.get('body') or {}):
+        return page['body']['storage'].get('value') or ''
+    return (((page.get('content') or {}).get('body') or {}).get('storage') or {}).get('value') or ''
+
+
+def is_question(text):
+    # "How to export a study" headings count, one word labels don't
+    text = text.strip()
+    return text.endswith("?") or (QUESTION_START.match(text) is not None and len(text.split()) >= 3)
+
+
+def truncate(text, max_chars=FAQ_MAX_ANSWER_CHARS):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def block_text(element):
+    return " ".join(element.get_text(separator=" ", strip=True).split())
+
+
+def extract_qa_pairs(html):
+    """
+    Question and answer pairs of a page's storage format body: expand
+    macros titled with a question, and question headings or paragraphs
+    ending in "?" followed by the blocks up to the next question or heading.
+
+    Returns:
+        (question, answer) tuples, those of expand macros first
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html or "", "html.parser")
+
+    pairs = []
+    for macro in soup.find_all("ac:structured-macro", attrs={"ac:name": "expand"}):
+        title = macro.find("ac:parameter", attrs={"ac:name": "title"})
+        body = macro.find("ac:rich-text-body")
+        question = block_text(title) if title else ""
+        answer = block_text(body) if body else ""
+        if is_question(question) and answer:
+            pairs.append((question, truncate(answer)))
+        macro.decompose()
+
+    question, answer = None, []
+    for block in soup.find_all(BLOCKS):
+        # Blocks nesting others, like list items holding paragraphs, are
+        # read through their children
+        if block.find(BLOCKS) is not None:
+            continue
+        text = block_text(block)
+        if not text:
+            continue
+        is_heading = block.name in HEADINGS
+        if (is_heading and is_question(text)) or (block.name == "p" and text.endswith("?")):
+            if question and answer:
+                pairs.append((question, truncate(" ".join(answer))))
+            question, answer = text, []
+        elif is_heading:
+            if question and answer:
+                pairs.append((question, truncate(" ".join(answer))))
+            question, answer = None, []
+        elif question:
+            answer.append(text)
+    if question and answer:
+        pairs.append((question, truncate(" ".join(answer))))
+    return pairs
+
+
+def is_faq_page(title, pairs):
+    return bool(pairs) and (FAQ_TITLE.search(title or "") is not None or len(pairs) >= FAQ_MIN_PAIRS)
+
+
+def content_hash(title, html):
+    digest = hashlib.sha256()
+    for part in (FAQ_EXTRACTOR_VERSION, title or "", html or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def create_faq_indexes(session, dimensions=1536):
+    session.run(f"""
+    CREATE VECTOR INDEX {FAQ_INDEX_NAME} IF NOT EXISTS
+    FOR (q:FaqQuestion)
+    ON (q.embedding)
+    OPTIONS {{indexConfig: {{
+        `vector.dimensions`: {dimensions},
+        `vector.similarity_function`: 'cosine'
+    }}}}
+    """)
+    session.run("CREATE INDEX faq_page_id IF NOT EXISTS FOR (p:FaqPage) ON (p.id)")
+    session.run("CREATE INDEX faq_question_page_id IF NOT EXISTS FOR (q:FaqQuestion) ON (q.page_id)")
+    # faq_lookup joins every hit to its page to check the page's ACL
+    session.run("CREATE INDEX confluence_id IF NOT EXISTS FOR (n:Confluence) ON (n.id)")
+
+
+def delete_faq_pages(session, page_ids):
+    session.run(
+        "MATCH (q:FaqQuestion) WHERE q.page_id IN $ids DETACH DELETE q",
+        ids=page_ids,
+    )
+    session.run("MATCH (p:FaqPage) WHERE p.id IN $ids DETACH DELETE p", ids=page_ids)
+
+
+def sync_faq_pages(session, pages, embed):
+    """
+    Brings the FaqPage and FaqQuestion nodes up to date with the ingested
+    pages. Only pages whose content hash changed are split and embedded
+    again; FAQ pages no longer ingested, or no longer FAQs, are removed.
+    The nodes outlive clear_existing_data, which is what keeps this
+    incremental.
+
+    Args:
+        pages: page id -> (title, space key, storage format html) of every
+            page ingested in this run
+        embed: Function from a list of texts to their embeddings
+
+    Returns:
+        Dict of pages and questions written, and pages unchanged and removed
+    """
+    stored = {
+        record["id"]: record["content_hash"]
+        for record in session.run("MATCH (p:FaqPage) RETURN p.id AS id, p.content_hash AS content_hash")
+    }
+    counts = {"pages": 0, "questions": 0, "unchanged": 0, "removed": 0}
+    removed = [page_id for page_id in stored if page_id not in pages]
+
+    for page_id, (title, space_key, html) in pages.items():
+        digest = content_hash(title, html)
+        if stored.get(page_id) == digest:
+            counts["unchanged"] += 1
+            continue
+        pairs = extract_qa_pairs(html)
+        if not is_faq_page(title, pairs):
+            if page_id in stored:
+                removed.append(page_id)
+            continue
+        try:
+            embeddings = embed([question for question, _ in pairs])
+        except Exception as e:
+            # Keeps the page's old questions; its hash is unchanged, so the
+            # next run tries again
+            print(f"  Error embedding the questions of {title}: {str(e)}")
+            continue
+
+        delete_faq_pages(session, [page_id])
+        session.run(
+            "CREATE (p:FaqPage {id: $id, title: $title, space_key: $space_key, content_hash: $content_hash}) "
+            "WITH p UNWIND $questions AS row "
+            "CREATE (q:FaqQuestion {page_id: $id, position: row.position, question: row.question, "
+            "answer: row.answer, embedding: row.embedding}) "
+            "CREATE (p)-[:HAS_QUESTION]->(q)",
+            id=page_id,
+            title=title,
+            space_key=space_key,
+            content_hash=digest,
+            questions=[
+                {"position": position, "question": question, "answer": answer, "embedding": embedding}
+                for position, ((question, answer), embedding) in enumerate(zip(pairs, embeddings))
+            ],
+        )
+        counts["pages"] += 1
+        counts["questions"] += len(pairs)
+
+    if removed:
+        delete_faq_pages(session, removed)
+    counts["removed"] = len(removed)
+    return counts
+
+
+_index_ready = None
+_index_ready_pid = None
+_index_ready_lock = threading.Lock()
+
+
+def faq_index_ready(driver=None):
+    """
+    Whether the FAQ index exists and is online, asked once per process:
+    without it every lookup would fail, so answer_from_faq is skipped.
+    A graph that gets the index later needs the workers restarted.
+    """
+    global _index_ready, _index_ready_pid
+    with _index_ready_lock:
+        if _index_ready is not None and _index_ready_pid == os.getpid():
+            return _index_ready
+        if driver is None:
+            from docuquery.graph.vector_mirror import get_driver
+            driver = get_driver()
+        try:
+            with driver.session(database=DATABASE) as session:
+                record = session.run(
+                    "SHOW INDEXES YIELD name, state WHERE name = $name RETURN state", name=FAQ_INDEX_NAME
+                ).single()
+        except Exception as e:
+            # Not remembered, so the next request asks again
+            logging.warning(f"Could not check the FAQ index: {str(e)}")
+            return False
+        _index_ready = record is not None and record["state"] == "ONLINE"
+        _index_ready_pid = os.getpid()
+        if not _index_ready:
+            logging.warning(f"FAQ index {FAQ_INDEX_NAME} is missing or not online, FAQ lookups are skipped")
+        return _index_ready
+
+
+def faq_lookup(query_embedding, principals=None, driver=None,
+               min_similarity=FAQ_MIN_SIMILARITY, timeout=FAQ_LOOKUP_TIMEOUT):
+    """
+    The stored question closest to the query, when it is at least
+    `min_similarity` and its page is readable by one of `principals`
+    (any page when None).
+
+    Returns:
+        Dict of question, answer, similarity and the page's id, title,
+        space_key and space_name, or None
+    """
+    import neo4j
+    if driver is None:
+        from docuquery.graph.vector_mirror import get_driver
+        driver = get_driver()
+
+    cypher = (
+        "CALL db.index.vector.queryNodes($index, $candidates, $embedding) YIELD node AS question, score "
+        "WHERE score >= $min_similarity "
+        "MATCH (page:Confluence {id: question.page_id}) "
+        + (f"WHERE {acl_predicate('page')} " if principals is not None else "")
+        + "RETURN question.question AS question, question.answer AS answer, score AS similarity, "
+        "page.id AS id, page.title AS title, page.space_key AS space_key, page.space_name AS space_name "
+        "ORDER BY score DESC LIMIT 1"
+    )
+    with driver.session(database=DATABASE) as session:
+        record = session.run(
+            neo4j.Query(cypher, timeout=timeout),
+            index=FAQ_INDEX_NAME,
+            candidates=FAQ_CANDIDATES,
+            embedding=list(query_embedding),
+            min_similarity=min_similarity,
+            principals=principals,
+        ).single()
+    return dict(record) if record is not None else None
+
+
+def format_faq_answer(match):
+    metadata = {"data_source": "confluence", "id": match.get("id"), "space_key": match.get("space_key")}
+    title = match.get("title") or "Untitled"
+    url = page_url(metadata)
+    source = f"[{title}]({url})" if url else f"**{title}**"
+    return f"**{match['question']}**\n\n{match['answer']}\n\nSource: {source}"
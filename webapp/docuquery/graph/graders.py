@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+from docuquery.constants.grading import BM25_THRESHOLD, EMBEDDING_THRESHOLD
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from how i in is it me my of on or
+the this to what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+class BM25Grader:
+    """
+    Lexical grader scoring query terms against each document with BM25.
+
+    Term statistics come from the documents being graded, not the whole
+    corpus, so with only a handful of documents IDF just weights rare query
+    terms over ones most of the retrieved documents share. Scores are divided
+    by the best score a document could reach for the query, which puts them
+    in 0-1 so a single threshold works across queries.
+    """
+    name = "bm25"
+
+    def __init__(self, threshold=BM25_THRESHOLD, k1=1.2, b=0.75):
+        self.threshold = threshold
+        self.k1 = k1
+        self.b = b
+
+    def scores(self, query, documents, query_embedding=None):
+        query_terms = set(tokenize(query))
+        if not query_terms or not documents:
+            return [0.0] * len(documents)
+
+        # Confluence titles come back as metadata rather than in the content
+        term_counts = [
+            Counter(tokenize(f"{document.metadata.get('title') or ''} {document.page_content}"))
+            for document in documents
+        ]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = (sum(lengths) / len(lengths)) or 1.0
+
+        idf = {}
+        for term in query_terms:
+            containing = sum(1 for counts in term_counts if term in counts)
+            idf[term] = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+        best_possible = sum(idf.values()) * (self.k1 + 1)
+
+        scores = []
+        for counts, length in zip(term_counts, lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            score = sum(
+                idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm)
+                for term in query_terms
+                if term in counts
+            )
+            scores.append(score / best_possible)
+        return scores
+
+    def grade(self, query, documents, query_embedding=None):
+        return [score >= self.threshold for score in self.scores(query, documents)]
+
+
+class EmbeddingGrader:
+    """
+    Grades documents by cosine similarity between the query embedding and the
+    embedding stored on each node (`_embedding_` in the metadata). Documents
+    without a stored embedding are kept, as the LLM grader does on errors.
+    """
+    name = "embedding"
+
+    def __init__(self, threshold=EMBEDDING_THRESHOLD):
+        self.threshold = threshold
+
+    def scores(self, query, documents, query_embedding=None):
+        if query_embedding is None:
+            return [None] * len(documents)
+
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+
+        scores = [None] * len(documents)
+        embedded = [
+            (i, document.metadata["_embedding_"])
+            for i, document in enumerate(documents)
+            if document.metadata.get("_embedding_") is not None
+        ]
+        if embedded:
+            matrix = np.asarray([embedding for _, embedding in embedded], dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+            for (i, _), score in zip(embedded, matrix @ query_vector):
+                scores[i] = float(score)
+        return scores
+
+    def grade(self, query, documents, query_embedding=None):
+        return [
+            score is None or score >= self.threshold
+            for score in self.scores(query, documents, query_embedding)
+        ]
+
+
+LOCAL_GRADERS = {
+    BM25Grader.name: BM25Grader,
+    EmbeddingGrader.name: EmbeddingGrader,
+}
+
+
+def get_local_grader(mode):
+    """
+    Returns the CPU grader for a grading mode, or None for "llm".
+    """
+    grader = LOCAL_GRADERS.get(mode)
+    return grader() if grader else None
@@ -0,0 +1,458 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from docuquery.constants.app import DEFAULT_MODEL_NAME, MODEL_PRICES
+from docuquery.constants.embedding import OLLAMA_BASE_URL, EMBEDDING_MODEL_NAME
+from docuquery.constants.llm import (
+    EMBEDDING_PROVIDER,
+    LLM_HEDGE_BUDGET,
+    LLM_HEDGE_BURST,
+    LLM_HEDGE_DELAY_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_STAGES,
+    LLM_HEDGE_WINDOW,
+    LLM_KEEPALIVE_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_PROVIDER,
+    LLM_PROVIDERS,
+    LLM_TIMEOUT,
+    OLLAMA_CHAT_MODEL,
+)
+
+# Clients are built once per worker process and shared by every request and
+# pipeline stage, so connection setup and TLS handshakes are paid once per
+# pooled connection instead of once per call
+_clients = {}
+_clients_lock = threading.RLock()
+_clients_pid = None
+
+
+def _cached(key, factory):
+    global _clients_pid
+    with _clients_lock:
+        # Connections must not be shared with a forked parent
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def _check_provider(provider):
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{provider}', expected one of {LLM_PROVIDERS}")
+
+
+def get_http_client():
+    """
+    Keep-alive connection pool shared by the OpenAI clients of this process.
+    """
+    def build():
+        import httpx
+        return httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+            timeout=LLM_TIMEOUT,
+        )
+    return _cached("http", build)
+
+
+def get_openai_client():
+    def build():
+        from openai import OpenAI
+        return OpenAI(http_client=get_http_client(), timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES)
+    return _cached("openai", build)
+
+
+def get_executor():
+    # Runs the calls chat_completion waits on, hedges included
+    return _cached("executor", lambda: ThreadPoolExecutor(max_workers=LLM_MAX_CONNECTIONS))
+
+
+class HedgePolicy:
+    """
+    Recent latencies and hedge budget of the chat completions of a process.
+
+    Every call adds LLM_HEDGE_BUDGET credits, up to LLM_HEDGE_BURST, and a
+    hedge spends one, so at most that share of calls is ever duplicated.
+    """
+
+    def __init__(self, budget=LLM_HEDGE_BUDGET, burst=LLM_HEDGE_BURST, quantile=LLM_HEDGE_QUANTILE,
+                 window=LLM_HEDGE_WINDOW, min_samples=LLM_HEDGE_MIN_SAMPLES,
+                 default_delay=LLM_HEDGE_DELAY_SECONDS, min_delay=LLM_HEDGE_MIN_DELAY_SECONDS):
+        self.budget = budget
+        self.burst = burst
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.latencies = {}
+        self.credits = 0.0
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def delay(self, key):
+        """
+        Seconds to wait for a call of `key` before hedging it.
+        """
+        with self.lock:
+            samples = sorted(self.latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return max(samples[int(self.quantile * (len(samples) - 1))], self.min_delay)
+
+    def observe(self, key, seconds):
+        with self.lock:
+            self.latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def start_call(self):
+        with self.lock:
+            self.counts["calls"] += 1
+            self.credits = min(self.credits + self.budget, self.burst)
+
+    def allow_hedge(self):
+        with self.lock:
+            if self.credits < 1:
+                self.counts["hedges_denied"] += 1
+                return False
+            self.credits -= 1
+            self.counts["hedges"] += 1
+            return True
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        """
+        Counts since the process started: calls, hedges sent and denied by
+        the budget, which attempt answered hedged calls, and timeouts, plus
+        the current hedge delay of each model and stage.
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            keys = list(self.latencies)
+        calls = counts.get("calls", 0)
+        hedges = counts.get("hedges", 0)
+        return {
+            **counts,
+            "hedge_rate": round(hedges / calls, 4) if calls else None,
+            "hedge_win_rate": round(counts.get("hedge_wins", 0) / hedges, 4) if hedges else None,
+            "delays": {f"{model}/{stage}": round(self.delay((model, stage)), 3) for model, stage in keys},
+        }
+
+
+_hedging = HedgePolicy()
+
+
+def hedge_stats():
+    return _hedging.stats()
+
+
+def call_with_deadline(request, key, timeout, hedge=False, policy=None):
+    """
+    Runs `request()` and waits at most `timeout` seconds for it, however
+    long the client's own retries would take.
+
+    With `hedge`, once the call has run longer than the policy's delay for
+    `key` and the budget allows, the same request is sent again and the
+    first successful response is returned. The other attempt is left to
+    finish in the background.
+
+    Returns:
+        (response, whether a duplicate was sent)
+
+    Raises:
+        TimeoutError when no attempt answered in time, without calling when
+        `timeout` is not positive, or the error of the last attempt to fail
+    """
+    policy = policy or _hedging
+    if timeout <= 0:
+        # The request budget is spent; don't pay for a call nobody waits on
+        policy.count("timeouts")
+        raise TimeoutError("LLM call has no time left")
+    deadline = time.monotonic() + timeout
+    policy.start_call()
+
+    def attempt():
+        started = time.monotonic()
+        response = request()
+        policy.observe(key, time.monotonic() - started)
+        return response
+
+    primary = get_executor().submit(attempt)
+    attempts = [primary]
+    if hedge:
+        done, _ = wait(attempts, timeout=min(policy.delay(key), timeout))
+        if not done and deadline > time.monotonic() and policy.allow_hedge():
+            attempts.append(get_executor().submit(attempt))
+    hedged = len(attempts) > 1
+
+    pending = set(attempts)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if hedged:
+                    policy.count("primary_wins" if future is primary else "hedge_wins")
+                return future.result(), hedged
+            error = future.exception()
+    if error is not None and not pending:
+        raise error
+    policy.count("timeouts")
+    raise TimeoutError(f"LLM call took longer than {timeout:.1f}s")
+
+
+def ollama_model(model_name=None):
+    """
+    Ollama model to call for `model_name`, OLLAMA_CHAT_MODEL if not given.
+    OpenAI models can't be served by Ollama and are rejected.
+    """
+    if model_name in MODEL_PRICES:
+        raise ValueError(f"Model '{model_name}' is an OpenAI model, which the Ollama provider can't serve")
+    return model_name or OLLAMA_CHAT_MODEL
+
+
+def get_chat_model(model_name=None, temperature=0, provider=None, timeout=None):
+    """
+    Shared LangChain chat model for chains (`prompt | llm | parser`).
+
+    Args:
+        model_name: Model of the provider, DEFAULT_MODEL_NAME or
+            OLLAMA_CHAT_MODEL if not given
+        temperature: Sampling temperature
+        provider: "openai" or "ollama", LLM_PROVIDER if not given
+        timeout: Seconds per request, LLM_TIMEOUT if not given; rounded up
+            to whole seconds, at least one, so few clients are built
+
+    Returns:
+        ChatOpenAI on the shared pool, or ChatOllama at OLLAMA_BASE_URL
+    """
+    provider = provider or LLM_PROVIDER
+    _check_provider(provider)
+    timeout = max(math.ceil(LLM_TIMEOUT if timeout is None else timeout), 1)
+    if provider == "ollama":
+        model_name = ollama_model(model_name)
+
+        def build():
+            from langchain_ollama import ChatOllama
+            return ChatOllama(
+                model=model_name,
+                base_url=OLLAMA_BASE_URL,
+                temperature=temperature,
+                client_kwargs={"timeout": timeout},
+            )
+        return _cached(("chat", provider, model_name, temperature, timeout), build)
+
+    model_name = model_name or DEFAULT_MODEL_NAME
+
+    def build():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model_name=model_name,
+            temperature=temperature,
+            http_client=get_http_client(),
+            timeout=timeout,
+            max_retries=LLM_MAX_RETRIES,
+        )
+    return _cached(("chat", provider, model_name, temperature, timeout), build)
+
+
+def get_embeddings(provider=None):
+    """
+    Shared embeddings client. The provider has to match the one the vector
+    indexes were built with, so it is configured apart from LLM_PROVIDER.
+    """
+    provider = provider or EMBEDDING_PROVIDER
+    _check_provider(provider)
+    if provider == "ollama":
+        def build():
+            from langchain_ollama import OllamaEmbeddings
+            return OllamaEmbeddings(model=EMBEDDING_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+        return _cached(("embeddings", provider), build)
+
+    def build():
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            http_client=get_http_client(),
+            timeout=LLM_TIMEOUT,
+            max_retries=LLM_MAX_RETRIES,
+        )
+    return _cached(("embeddings", provider), build)
+
+
+def model_name(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+
+def usage_record(stage, model, prompt_tokens, completion_tokens, started, failed=False):
+    """
+    Tokens, latency and cost of one LLM call, as collected in `llm_usage`.
+    """
+    prices = MODEL_PRICES.get(model)
+    cost = None
+    if prices:
+        cost = round((prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6, 6)
+    record = {
+        "stage": stage,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "cost_usd": cost,
+    }
+    if failed:
+        record["failed"] = True
+    return record
+
+
+def message_usage_record(stage, llm, message, started):
+    # LangChain chat models report tokens on the returned AIMessage
+    tokens = getattr(message, "usage_metadata", None) or {}
+    return usage_record(
+        stage, model_name(llm), tokens.get("input_tokens", 0), tokens.get("output_tokens", 0), started,
+        failed=message is None,
+    )
+
+
+def summarize_usage(records):
+    """
+    Totals of `usage_record`s per stage and model, and for the request.
+
+    Returns:
+        {"stages": {stage: {model: totals}}, "total": totals}, where totals
+        has calls, failed, prompt_tokens, completion_tokens, latency_ms and
+        cost_usd (None when a model has no price)
+    """
+    def add(totals, record):
+        totals["calls"] += 1
+        totals["failed"] += 1 if record.get("failed") else 0
+        totals["prompt_tokens"] += record["prompt_tokens"]
+        totals["completion_tokens"] += record["completion_tokens"]
+        totals["latency_ms"] = round(totals["latency_ms"] + record["latency_ms"], 1)
+        if totals["cost_usd"] is not None:
+            totals["cost_usd"] = (
+                round(totals["cost_usd"] + record["cost_usd"], 6) if record["cost_usd"] is not None else None
+            )
+
+    def empty():
+        return {"calls": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0, "cost_usd": 0.0}
+
+    stages = {}
+    total = empty()
+    for record in records:
+        add(stages.setdefault(record["stage"], {}).setdefault(record["model"], empty()), record)
+        add(total, record)
+    return {"stages": stages, "total": total}
+
+
+def chat_completion(messages, model=None, temperature=0, max_tokens=None, timeout=None, provider=None,
+                    stage=None, usage=None):
+    """
+    Single chat completion on the shared clients.
+
+    Args:
+        messages: OpenAI style list of {"role", "content"} dicts
+        model: Model of the provider, DEFAULT_MODEL_NAME or OLLAMA_CHAT_MODEL
+            if not given
+        temperature: Sampling temperature
+        max_tokens: Cap on generated tokens
+        timeout: Seconds for this call, LLM_TIMEOUT if not given; a hard
+            deadline for either provider (call_with_deadline)
+        provider: "openai" or "ollama", LLM_PROVIDER if not given
+        stage: Pipeline stage the call is accounted to; calls of
+            LLM_HEDGE_STAGES to OpenAI are hedged (call_with_deadline)
+        usage: List that gets a `usage_record` of the call, failed or not,
+            and one of a hedge with the answered call's token counts
+
+    Returns:
+        The generated text
+    """
+    provider = provider or LLM_PROVIDER
+    _check_provider(provider)
+    started = time.monotonic()
+    if timeout is None:
+        timeout = LLM_TIMEOUT
+    if provider == "ollama":
+        llm = get_chat_model(model, temperature=temperature, provider=provider, timeout=timeout)
+        if max_tokens:
+            # A shallow copy keeps the shared client and its connections
+            llm = llm.model_copy(update={"num_predict": max_tokens})
+        message = None
+        try:
+            # Not hedged: a duplicate would only queue on the same local server
+            message, _ = call_with_deadline(
+                lambda: llm.invoke([(item["role"], item["content"]) for item in messages]),
+                (model_name(llm), stage),
+                timeout,
+            )
+            return message.content
+        finally:
+            if usage is not None:
+                usage.append(message_usage_record(stage, llm, message, started))
+
+    model = model or DEFAULT_MODEL_NAME
+
+    def request():
+        return get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+
+    response = None
+    hedged = False
+    try:
+        response, hedged = call_with_deadline(
+            request, (model, stage), timeout, hedge=LLM_HEDGE_ENABLED and stage in LLM_HEDGE_STAGES
+        )
+        return response.choices[0].message.content
+    finally:
+        if usage is not None:
+            tokens = response.usage if response is not None else None
+            prompt_tokens = tokens.prompt_tokens if tokens else 0
+            completion_tokens = tokens.completion_tokens if tokens else 0
+            usage.append(usage_record(
+                stage, model, prompt_tokens, completion_tokens, started, failed=response is None,
+            ))
+            if hedged and response is not None:
+                # The unanswered attempt is billed as well and its tokens
+                # are never seen, so it is counted like the answered one
+                record = usage_record(stage, model, prompt_tokens, completion_tokens, started)
+                record["hedge"] = True
+                usage.append(record)
+
+
+def warm_up(timeout=5.0):
+    """
+    Builds the shared clients and opens a first pooled connection, so the
+    first request of a worker does not pay for it. Failures are logged only.
+    """
+    try:
+        get_chat_model()
+        get_embeddings()
+        if LLM_PROVIDER == "openai":
+            get_openai_client().with_options(timeout=timeout, max_retries=0).models.list()
+        print(f"---LLM CLIENTS WARM ({LLM_PROVIDER})---")
+    except Exception as e:
+        logging.warning(f"LLM client warm-up failed: {str(e)}")
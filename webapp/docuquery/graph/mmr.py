@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def mmr_select(query_embedding, candidate_embeddings, k, lambda_mult=0.5):
+    """
+    Maximal marginal relevance selection over fetched candidates.
+
+    Each greedy step is one batched (n x d) @ (d,) product against the last
+    selected document, folded into a running "closest selected document"
+    vector, so selection costs O(k * n * d) instead of the O(n^2 * d) of a
+    full pairwise similarity matrix.
+
+    Args:
+        query_embedding: Query vector of shape (d,)
+        candidate_embeddings: Candidate vectors of shape (n, d), best first
+        k (int): Number of candidates to select
+        lambda_mult (float): 1.0 ranks by relevance only, 0.0 by diversity only
+
+    Returns:
+        List of selected candidate indices, in selection order
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates) or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True).clip(min=1e-12)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = candidates @ query
+
+    selected = [int(np.argmax(relevance))]
+    closest = candidates @ candidates[selected[0]]
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * closest
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(closest, candidates @ candidates[best], out=closest)
+
+    return selected
@@ -1,54 +1,288 @@
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_core.documents import Document
 import logging
+import os
+import threading
+from types import SimpleNamespace
 
 from docuquery.constants.neo4j import (
-    USERNAME,
-    PASSWORD,
-    URL,
     EMBEDDING_NODE_PROPERTY,
+    DATABASE,
 )
-from docuquery.constants.embedding import OLLAMA_BASE_URL, EMBEDDING_MODEL_NAME
-from docuquery.extensions.Neo4jVectorPlus import Neo4jVectorPlus, SearchType
+from docuquery.constants.llm import EMBEDDING_PROVIDER
+from docuquery.constants.retrieval import (
+    ACL_OVERFETCH,
+    FETCH_K,
+    HYBRID_KEYWORD_K,
+    HYBRID_VECTOR_K,
+    HYBRID_FUSION,
+    MMR_ENABLED,
+    MMR_LAMBDA,
+    SCORE_THRESHOLD,
+    TOP_K,
+    VECTOR_MIRROR_ENABLED,
+    VECTOR_MIRROR_MIN_RESOLVED,
+)
+from docuquery.extensions.Neo4jVectorPlus import Neo4jVectorPlus, SearchType, default_retrieval_query
+from docuquery.graph.acl import acl_predicate
+from docuquery.graph.llm_provider import get_embeddings
+from docuquery.graph.mmr import mmr_select
+from docuquery.graph.rank_fusion import document_key
+from docuquery.graph.vector_mirror import get_driver, get_mirror
+
+# Vector stores by (label, index, include_embeddings, acl_filter, fusion).
+# Building one checks the connection and the server version, embeds a probe
+# text and looks up both indexes, so it happens once per process
+_stores = {}
+_stores_lock = threading.Lock()
+_stores_pid = None
 
 
+def _cached_store(key, factory):
+    global _stores_pid
+    with _stores_lock:
+        # Stores hold the driver, which must not be shared with a forked parent
+        if _stores_pid != os.getpid():
+            _stores.clear()
+            _stores_pid = os.getpid()
+        if key not in _stores:
+            _stores[key] = factory()
+        return _stores[key]
+
 
 class Neo4jBaseRetriever:
-    def __init__(self, embedding='openai'):
+    def __init__(self, embedding=EMBEDDING_PROVIDER):
         self.index_name = ''
         self.keyword_index_name = ''
         self.embedding_node_label = ''
         self.embedding = embedding
         self.text_embeddable_columns = []
+        # Text property returned alone as the page content, and text
+        # properties also returned as structured metadata
+        self.content_property = None
+        self.metadata_properties = []
+        self.fusion = HYBRID_FUSION
+        self.use_mirror = VECTOR_MIRROR_ENABLED
 
-    def get_document_retriever(self):
-        if self.embedding == 'openai':
-            embeddings = OpenAIEmbeddings()
-        else:
-            embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+    def get_embeddings(self):
+        return get_embeddings(self.embedding)
 
-        try:
-            logging.info(f"Creating vector store with node label: {self.get_embedding_node_label()}, index: {self.get_index_name()}")
-            vector_store = Neo4jVectorPlus.from_existing_graph(
-                embeddings,
-                url=URL,
-                username=USERNAME,
-                password=PASSWORD,
-                index_name=self.get_index_name(),
-                keyword_index_name=self.get_keyword_index_name(),
-                node_label=self.get_embedding_node_label(),
-                text_node_properties=self.text_embeddable_columns,
-                embedding_node_property=EMBEDDING_NODE_PROPERTY,
-                search_type=SearchType.HYBRID,
-                create_embeddings=False,
+    def retrieval_query(self, include_embeddings=False):
+        return default_retrieval_query(
+            self.text_embeddable_columns,
+            EMBEDDING_NODE_PROPERTY,
+            include_embeddings,
+            content_property=self.content_property,
+            metadata_properties=self.metadata_properties,
+        )
+
+    def get_vector_store(self, include_embeddings=False, acl_filter=False):
+        """
+        Vector store of this label, built once per process and on the
+        shared driver (vector_mirror.get_driver).
+
+        With `acl_filter`, the retrieval query drops nodes none of
+        `$principals` may read, and each fusion arm fetches ACL_OVERFETCH
+        times as many candidates to make up for them.
+        """
+        key = (
+            self.get_embedding_node_label(),
+            self.get_index_name(),
+            include_embeddings,
+            acl_filter,
+            self.fusion,
+        )
+        return _cached_store(key, lambda: self.build_vector_store(include_embeddings, acl_filter))
+
+    def build_vector_store(self, include_embeddings=False, acl_filter=False):
+        logging.info(f"Creating vector store with node label: {self.get_embedding_node_label()}, index: {self.get_index_name()}")
+        retrieval_query = self.retrieval_query(include_embeddings)
+        overfetch = 1
+        if acl_filter:
+            retrieval_query = f"WITH node, score WHERE {acl_predicate()} " + retrieval_query
+            overfetch = ACL_OVERFETCH
+        return Neo4jVectorPlus.from_existing_graph(
+            self.get_embeddings(),
+            # Neo4jVector only reads the driver and database of `graph`, and
+            # otherwise opens a driver of its own that is never closed
+            graph=SimpleNamespace(_driver=get_driver(), _database=DATABASE),
+            index_name=self.get_index_name(),
+            keyword_index_name=self.get_keyword_index_name(),
+            node_label=self.get_embedding_node_label(),
+            text_node_properties=self.text_embeddable_columns,
+            embedding_node_property=EMBEDDING_NODE_PROPERTY,
+            search_type=SearchType.HYBRID if self.fusion == "union" else SearchType.FUSION,
+            fusion=self.fusion,
+            create_embeddings=False,
+            retrieval_query=retrieval_query,
+            vector_k=HYBRID_VECTOR_K * overfetch,
+            keyword_k=HYBRID_KEYWORD_K * overfetch,
+        )
+
+    def search_by_vector(self, query_embedding, query, k=TOP_K, fetch_k=FETCH_K,
+                         score_threshold=SCORE_THRESHOLD, include_embeddings=False,
+                         lambda_mult=MMR_LAMBDA if MMR_ENABLED else None, principals=None):
+        """
+        Hybrid search with an already computed query embedding, so that
+        several sources can share a single embedding call.
+
+        Fetches `fetch_k` candidates, drops those whose query similarity is
+        below `score_threshold` and returns the best `k`. The hybrid score is
+        kept as `score` and the cosine similarity as `similarity` in each
+        document's metadata. Unless `lambda_mult` is None, the `k` documents
+        are picked by maximal marginal relevance, using the embeddings
+        returned with the candidates in the same query.
+
+        With `use_mirror` and an export of this label, candidates
+        come from the in-process mirror instead (vector only, no keyword arm),
+        unless the export has gone stale.
+
+        Unless `principals` is None, only nodes one of them may read are
+        candidates: the search fetches ACL_OVERFETCH times as many and filters
+        them in the query, and if fewer than `fetch_k` survive, an exact
+        search over the readable nodes fills up the rest.
+        """
+        use_mmr = lambda_mult is not None
+        acl_filter = principals is not None
+        candidate_k = fetch_k * ACL_OVERFETCH if acl_filter else fetch_k
+        mirror = get_mirror(self.get_embedding_node_label()) if self.use_mirror else None
+        results = None
+        if mirror is not None and mirror.dimensions == len(query_embedding):
+            results = self.search_mirror(
+                mirror, query_embedding, candidate_k, include_embeddings=include_embeddings or use_mmr,
+                principals=principals,
+            )
+        if results is None:
+            vector_store = self.get_vector_store(
+                include_embeddings=include_embeddings or use_mmr, acl_filter=acl_filter
+            )
+            results = vector_store.similarity_search_with_score_by_vector(
+                query_embedding, k=candidate_k, query=query,
+                params={"principals": principals} if acl_filter else {},
+            )
+        results = results[:fetch_k]
+        if acl_filter and len(results) < fetch_k:
+            seen = {document_key(document) for document, _ in results}
+            results += [
+                (document, score)
+                for document, score in self.search_exact(
+                    query_embedding, fetch_k, principals, include_embeddings=include_embeddings or use_mmr
+                )
+                if document_key(document) not in seen
+            ][:fetch_k - len(results)]
+
+        documents = []
+        for document, score in results:
+            document.metadata["score"] = score
+            similarity = document.metadata.get("similarity")
+            if similarity is not None and similarity < score_threshold:
+                continue
+            documents.append(document)
+
+        # Keyword-only hits on nodes without an embedding can't take part in MMR
+        if use_mmr and len(documents) > k and all(
+            document.metadata.get("_embedding_") is not None for document in documents
+        ):
+            selected = mmr_select(
+                query_embedding,
+                [document.metadata["_embedding_"] for document in documents],
+                k,
+                lambda_mult,
+            )
+            documents = [documents[i] for i in selected]
+        documents = documents[:k]
+
+        if use_mmr and not include_embeddings:
+            for document in documents:
+                document.metadata.pop("_embedding_", None)
+        return documents
+
+    def search_mirror(self, mirror, query_embedding, fetch_k, include_embeddings=False, principals=None):
+        """
+        Top `fetch_k` candidates from the in-process vector mirror. Neo4j is
+        only asked for the properties of the hits, looked up by element id,
+        and drops those none of `principals` may read unless it is None.
+
+        Returns:
+            (document, similarity) pairs, or None when fewer than
+            VECTOR_MIRROR_MIN_RESOLVED of the hits still exist in Neo4j, as
+            while ingestion has recreated the nodes but not yet re-exported
+        """
+        hits = mirror.search(query_embedding, fetch_k)
+        if not hits:
+            return []
+
+        rows = {}
+        with get_driver().session(database=DATABASE) as session:
+            result = session.run(
+                "UNWIND $hits AS hit "
+                f"MATCH (node:`{self.get_embedding_node_label()}`) WHERE elementId(node) = hit.id "
+                + "WITH node, hit.score AS score, hit.id AS element_id, "
+                + (f"{acl_predicate()} AS readable " if principals is not None else "true AS readable ")
+                + self.retrieval_query()
+                + ", element_id, readable",
+                hits=[{"id": element_id, "score": similarity} for _, element_id, similarity in hits],
+                embedding=list(query_embedding),
+                principals=principals,
             )
+            for record in result:
+                rows[record["element_id"]] = record
+
+        if len(rows) < VECTOR_MIRROR_MIN_RESOLVED * len(hits):
+            logging.warning(
+                f"Only {len(rows)} of {len(hits)} vector mirror hits for {self.get_embedding_node_label()} "
+                "still exist, searching Neo4j instead"
+            )
+            return None
+
+        # Nodes deleted since the export are skipped
+        results = []
+        for row, element_id, similarity in hits:
+            record = rows.get(element_id)
+            if record is None or not record["readable"]:
+                continue
+            metadata = {k: v for k, v in record["metadata"].items() if v is not None}
+            if include_embeddings:
+                metadata["_embedding_"] = mirror.embeddings(row)
+            results.append((Document(page_content=record["text"], metadata=metadata), similarity))
+        return results
+
+    def search_exact(self, query_embedding, k, principals, include_embeddings=False):
+        """
+        Exact cosine search over only the nodes one of `principals` may read.
+        Scans every readable embedding, so it only backs up the index search.
+        """
+        with get_driver().session(database=DATABASE) as session:
+            result = session.run(
+                f"MATCH (node:`{self.get_embedding_node_label()}`) "
+                f"WHERE node.`{EMBEDDING_NODE_PROPERTY}` IS NOT NULL AND {acl_predicate()} "
+                f"WITH node, vector.similarity.cosine(node.`{EMBEDDING_NODE_PROPERTY}`, $embedding) AS score "
+                "ORDER BY score DESC LIMIT $k "
+                + self.retrieval_query(include_embeddings),
+                k=k,
+                embedding=list(query_embedding),
+                principals=principals,
+            )
+            return [
+                (
+                    Document(
+                        page_content=record["text"],
+                        metadata={key: value for key, value in record["metadata"].items() if value is not None},
+                    ),
+                    record["score"],
+                )
+                for record in result
+            ]
+
+    def get_document_retriever(self):
+        try:
+            vector_store = self.get_vector_store()
             
-            # Configure the retriever for better results
+            # Plain "similarity" search ignores score_threshold
             retriever = vector_store.as_retriever(
+                search_type="similarity_score_threshold",
                 search_kwargs={
-                    "k": 5,  # Increase number of results
-                    "score_threshold": 0.5,  # Set a relevance threshold
-                    "fetch_k": 10  # Fetch more candidates for filtering
+                    "k": TOP_K,
+                    "score_threshold": SCORE_THRESHOLD,
                 }
             )
             
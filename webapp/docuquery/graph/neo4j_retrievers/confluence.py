@@ -66,6 +66,8 @@ class Neo4jConfluenceRetriever(Neo4jBaseRetriever):
         self.embedding_node_label = EMBEDDING_NODE_LABEL
         self.embedding = self.embedding
         self.text_embeddable_columns = get_text_embeddable_columns()
+        self.content_property = "text"
+        self.metadata_properties = ["id", "title", "space_name", "space_key"]
         
         # Initialize Confluence client
         try:
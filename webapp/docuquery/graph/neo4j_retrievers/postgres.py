@@ -124,3 +124,4 @@ class Neo4jPostgresRetriever(Neo4jBaseRetriever):
         self.embedding_node_label = EMBEDDING_NODE_LABEL
         self.embedding = self.embedding
         self.text_embeddable_columns = get_text_embeddable_columns()
+        self.metadata_properties = ["id", "title"]
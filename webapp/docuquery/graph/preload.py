@@ -0,0 +1,46 @@
+import logging
+import time
+
+from docuquery.constants.app import TOOLS
+from docuquery.constants.llm import EMBEDDING_PROVIDER
+
+
+def warm_tokenizer():
+    """
+    Loads the tiktoken encoding OpenAIEmbeddings counts tokens with. The
+    encoding is cached by tiktoken for the life of the process.
+    """
+    if EMBEDDING_PROVIDER != "openai":
+        return
+    import tiktoken
+    from langchain_openai import OpenAIEmbeddings
+    fields = OpenAIEmbeddings.model_fields
+    tiktoken.encoding_for_model(fields["tiktoken_model_name"].default or fields["model"].default)
+
+
+def preload():
+    """
+    Imports the search pipeline and builds everything in it that holds no
+    connections: compiled graphs, prompt templates, the tokenizer and the
+    memory-mapped vector mirrors. Run in the gunicorn master before it
+    forks, workers share all of it copy-on-write. LLM and Neo4j clients
+    are created per worker after the fork (llm_provider.warm_up).
+    Failures are logged only; workers then load the rest on first use.
+    """
+    started = time.monotonic()
+    try:
+        from docuquery.graph.DocuQueryMultiRetriever import RETRIEVAL_SOURCES, DocuQuery
+        from docuquery.graph.vector_mirror import get_mirror
+        import docuquery.graph.batch  # noqa: F401
+        import docuquery.graph.snippets  # noqa: F401
+
+        for tool, _ in TOOLS:
+            DocuQuery.get_graph(tool)
+        for retriever in RETRIEVAL_SOURCES.values():
+            retriever = retriever()
+            if retriever.use_mirror:
+                get_mirror(retriever.get_embedding_node_label())
+        warm_tokenizer()
+        print(f"---PRELOADED IN {time.monotonic() - started:.1f}s---")
+    except Exception as e:
+        logging.warning(f"Preloading the search pipeline failed: {str(e)}")
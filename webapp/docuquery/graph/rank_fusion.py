@@ -0,0 +1,90 @@
+def document_key(document):
+    """
+    Identity of a document across result lists. Row ids of different
+    Postgres tables can collide, so the node's element id comes first.
+    """
+    metadata = document.metadata
+    return (
+        metadata.get("data_source"),
+        metadata.get("element_id") or metadata.get("id") or document.page_content,
+    )
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60, top_k=None, weights=None):
+    """
+    Merges ranked document lists with reciprocal rank fusion.
+
+    Each document scores sum(weight / (k + rank)) over the lists it appears
+    in, so agreement between lists matters more than raw scores, which are
+    not comparable between sources.
+
+    Args:
+        ranked_lists (dict): Source name to list of documents, best first
+        k (int): Smoothing constant, larger values flatten the rank curve
+        top_k (int): Number of documents to return, all when None
+        weights (dict): Optional per-source weight, defaults to 1.0
+
+    Returns:
+        List of documents ordered by fused score, with `rrf_score` set in
+        their metadata
+    """
+    weights = weights or {}
+    scores = {}
+    documents = {}
+    for source, ranked in ranked_lists.items():
+        weight = weights.get(source, 1.0)
+        for rank, document in enumerate(ranked, start=1):
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            documents.setdefault(key, document)
+
+    fused = sorted(scores, key=scores.get, reverse=True)
+    if top_k is not None:
+        fused = fused[:top_k]
+
+    results = []
+    for key in fused:
+        document = documents[key]
+        document.metadata["rrf_score"] = scores[key]
+        results.append(document)
+    return results
+
+
+def weighted_score_fusion(scored_lists, top_k=None, weights=None):
+    """
+    Merges scored document lists by a weighted sum of their scores, each
+    list's scores divided by its best score first.
+
+    Unlike reciprocal rank fusion this keeps how far apart the scores are,
+    which suits lists from the same corpus such as vector and keyword search.
+
+    Args:
+        scored_lists (dict): List name to list of (document, score), best first
+        top_k (int): Number of documents to return, all when None
+        weights (dict): Optional per-list weight, defaults to 1.0
+
+    Returns:
+        List of documents ordered by fused score, with `fused_score` set in
+        their metadata
+    """
+    weights = weights or {}
+    scores = {}
+    documents = {}
+    for name, scored in scored_lists.items():
+        weight = weights.get(name, 1.0)
+        best = max((score for _, score in scored), default=0) or 1.0
+        for document, score in scored:
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + weight * score / best
+            documents.setdefault(key, document)
+
+    fused = sorted(scores, key=scores.get, reverse=True)
+    if top_k is not None:
+        fused = fused[:top_k]
+
+    results = []
+    for key in fused:
+        document = documents[key]
+        document.metadata["fused_score"] = scores[key]
+        results.append(document)
+    return results
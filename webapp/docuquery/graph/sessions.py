@@ -0,0 +1,207 @@
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from docuquery.constants.session import (
+    SESSION_DB_PATH,
+    SESSION_MAX_DOCUMENTS,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_TURNS,
+    SESSION_TTL_SECONDS,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    updated_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_used_at ON sessions (used_at);
+"""
+
+
+def connect(path=SESSION_DB_PATH):
+    # Transactions are begun explicitly, so a turn's read and write hold
+    # the write lock together
+    connection = sqlite3.connect(path, timeout=1.0, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SessionStore:
+    """
+    Conversations by session id, in a SQLite file every worker process
+    shares, so a follow-up finds its session whichever worker serves it:
+    the graded documents and graph rows of the last retrieval, the
+    embeddings of the queries they answered, and the last turns for
+    generation.
+
+    Bounded by SESSION_MAX_SESSIONS, least recently used first, and by
+    SESSION_TTL_SECONDS of inactivity. A session belongs to the user who
+    started it; documents were filtered by that user's ACLs, so another
+    user presenting the same id gets no session and can neither read nor
+    change it. Only the TTL and the size bound evict a session.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, max_sessions=SESSION_MAX_SESSIONS, ttl=SESSION_TTL_SECONDS):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._connection = None
+        self._connection_pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # SQLite connections must not be shared with a forked parent
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = connect(self.path)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, session_id, username):
+        """
+        The user's live session, or None. Sessions never fail a request:
+        errors of the store are logged and count as no session.
+        """
+        try:
+            return self._get(session_id, username)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read session: {str(e)}")
+            return None
+
+    def _get(self, session_id, username):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT username, updated_at, data FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored_username, updated_at, data = row
+            if now - updated_at >= self.ttl:
+                connection.execute("DELETE FROM sessions WHERE id = ? AND updated_at = ?", (session_id, updated_at))
+                return None
+            if stored_username != username:
+                return None
+            connection.execute("UPDATE sessions SET used_at = ? WHERE id = ?", (now, session_id))
+        return decode_session(stored_username, updated_at, data)
+
+    def save_turn(self, session_id, username, query, answer, query_embedding=None, documents=None,
+                  graph_rows=None):
+        """
+        Records a turn. With `documents`, the turn retrieved afresh: they
+        replace the session's documents and graph rows, and its query
+        embedding starts a new context. Otherwise the turn reused them and
+        its embedding joins the context. Errors of the store are logged
+        and the turn is not recorded.
+        """
+        try:
+            self._save_turn(session_id, username, query, answer, query_embedding, documents, graph_rows)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not save session turn: {str(e)}")
+
+    def _save_turn(self, session_id, username, query, answer, query_embedding, documents, graph_rows):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT username, updated_at, data FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                session = decode_session(*row) if row is not None else None
+                if session is not None and now - session["updated"] >= self.ttl:
+                    session = None
+                if session is not None and session["username"] != username:
+                    # Session ids come from clients; another user's stays as it is
+                    connection.execute("ROLLBACK")
+                    return
+                if session is None:
+                    session = {"username": username, "anchors": [], "documents": [], "graph_rows": [], "turns": []}
+                if documents is not None:
+                    session["documents"] = list(documents[:SESSION_MAX_DOCUMENTS])
+                    session["graph_rows"] = list(graph_rows or [])
+                    session["anchors"] = []
+                if query_embedding is not None:
+                    session["anchors"] = (session["anchors"] + [normalized(query_embedding)])[-SESSION_MAX_TURNS:]
+                session["turns"] = (session["turns"] + [(query, answer)])[-SESSION_MAX_TURNS:]
+                connection.execute(
+                    "INSERT OR REPLACE INTO sessions (id, username, updated_at, used_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, username, now, now, encode_session(session)),
+                )
+                connection.execute("DELETE FROM sessions WHERE updated_at <= ?", (now - self.ttl,))
+                connection.execute(
+                    "DELETE FROM sessions WHERE id IN "
+                    "(SELECT id FROM sessions ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT count(*) FROM sessions").fetchone()[0]
+
+
+def encode_session(session):
+    return json.dumps({
+        "anchors": [base64.b64encode(anchor.astype(np.float32).tobytes()).decode() for anchor in session["anchors"]],
+        # Reused documents only go to generation, which needs no embeddings
+        "documents": [
+            {
+                "page_content": document.page_content,
+                "metadata": {key: value for key, value in document.metadata.items() if key != "_embedding_"},
+            }
+            for document in session["documents"]
+        ],
+        "graph_rows": session["graph_rows"],
+        "turns": session["turns"],
+    }, default=str)
+
+
+def decode_session(username, updated_at, data):
+    data = json.loads(data)
+    return {
+        "username": username,
+        "updated": updated_at,
+        "anchors": [np.frombuffer(base64.b64decode(anchor), dtype=np.float32) for anchor in data["anchors"]],
+        "documents": [Document(**document) for document in data["documents"]],
+        "graph_rows": data["graph_rows"],
+        "turns": [tuple(turn) for turn in data["turns"]],
+    }
+
+
+def normalized(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def context_similarity(session, query_embedding):
+    """
+    Highest cosine similarity between the query and the session's queries
+    since its documents were retrieved, or None without any.
+    """
+    if not session or not session["anchors"] or not session["documents"]:
+        return None
+    return float(np.max(np.stack(session["anchors"]) @ normalized(query_embedding)))
+
+
+_store = SessionStore()
+
+
+def get_session_store():
+    return _store
@@ -0,0 +1,97 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from docuquery.constants.response import SNIPPET_CHARS, SNIPPET_COUNT
+from docuquery.graph.graders import tokenize
+
+
+def _terms_pattern(terms):
+    # Whole tokens as graders.tokenize splits them; matching the original text
+    # case-insensitively keeps the offsets valid for it, and leaves the scan
+    # over long pages to the regex engine
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(f"(?<![a-z0-9])(?:{alternatives})(?![a-z0-9])", re.IGNORECASE)
+
+
+def _word_boundaries(text, start, end):
+    # Moves the window inwards so it neither starts nor ends mid-word
+    if start > 0 and not text[start - 1].isspace():
+        space = text.find(" ", start, end)
+        start = space + 1 if space != -1 else start
+    if end < len(text) and not text[end].isspace():
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def best_snippets(text, query, count=SNIPPET_COUNT, width=SNIPPET_CHARS):
+    """
+    Passages of `text` that best match the query terms, in document order.
+
+    Windows of `width` characters are anchored a third of the way before each
+    term occurrence and scored by the distinct query terms they cover, then
+    by their number of occurrences; the best non-overlapping ones are kept.
+    A text without any query term gives its opening passage.
+
+    Returns:
+        List of {"text", "start", "end", "matches"}, where start and end are
+        offsets into `text` and matches are [start, end] offsets of the query
+        terms within the snippet
+    """
+    if not text:
+        return []
+    terms = set(tokenize(query or ""))
+    matches = []
+    if terms:
+        matches = [
+            (match.start(), match.end(), match.group().lower())
+            for match in _terms_pattern(terms).finditer(text)
+        ]
+    starts = [start for start, _, _ in matches]
+    ends = [end for _, end, _ in matches]
+
+    # Windows only move forward, so the terms they cover are kept up to date
+    # as matches enter and leave instead of being recounted for each window
+    windows = []
+    covered = Counter()
+    first = last = 0
+    lead = width // 3
+    for start, _, _ in matches:
+        window_start = max(0, min(start - lead, len(text) - width))
+        window_end = window_start + width
+        while last < len(matches) and ends[last] <= window_end:
+            covered[matches[last][2]] += 1
+            last += 1
+        while first < last and starts[first] < window_start:
+            covered[matches[first][2]] -= 1
+            if not covered[matches[first][2]]:
+                del covered[matches[first][2]]
+            first += 1
+        windows.append(((len(covered), last - first), window_start, window_end))
+    windows.sort(key=lambda window: (-window[0][0], -window[0][1], window[1]))
+
+    chosen = []
+    for _, window_start, window_end in windows:
+        if len(chosen) == count:
+            break
+        if all(window_end <= start or window_start >= end for start, end in chosen):
+            chosen.append((window_start, window_end))
+    if not chosen:
+        chosen = [(0, width)]
+
+    snippets = []
+    for window_start, window_end in sorted(chosen):
+        start, end = _word_boundaries(text, window_start, min(window_end, len(text)))
+        first, last = bisect_left(starts, start), bisect_right(ends, end)
+        snippets.append({
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "matches": [[match_start - start, match_end - start] for match_start, match_end, _ in matches[first:last]],
+        })
+    return snippets
@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from docuquery.constants.traces import (
+    TRACE_DB_PATH,
+    TRACE_ENABLED,
+    TRACE_MAX_ROWS,
+    TRACE_PRUNE_EVERY,
+    TRACE_RETENTION_DAYS,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_SECONDS,
+)
+from docuquery.graph.llm_provider import summarize_usage
+from docuquery.graph.rank_fusion import document_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_traces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    reason TEXT NOT NULL,
+    query TEXT NOT NULL,
+    tool TEXT,
+    model TEXT,
+    budget REAL,
+    grading_mode TEXT,
+    duration_ms REAL NOT NULL,
+    error TEXT,
+    stages TEXT NOT NULL,
+    documents TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    degradations TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_traces_created_at ON search_traces (created_at);
+CREATE INDEX IF NOT EXISTS search_traces_duration_ms ON search_traces (duration_ms);
+"""
+JSON_COLUMNS = ["stages", "documents", "usage", "degradations"]
+# Longest query text stored, so one trace can't grow the table unboundedly
+MAX_QUERY_CHARS = 2000
+
+_connection = None
+_connection_pid = None
+_connection_lock = threading.Lock()
+_writes = 0
+
+
+def connect(path=TRACE_DB_PATH):
+    connection = sqlite3.connect(path, timeout=1.0, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    # Writers from several workers don't block readers, and a commit
+    # doesn't wait for fsync
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def trace_reason(duration_ms, error=None, random_value=None):
+    """
+    Why a request is traced: "error", "slow", "sample", or None to skip it.
+    """
+    if error is not None:
+        return "error"
+    if duration_ms >= TRACE_SLOW_SECONDS * 1000:
+        return "slow"
+    if (random.random() if random_value is None else random_value) < TRACE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def document_traces(result):
+    """
+    Each retrieved document's id, source and scores, whether it was
+    accessible, and its grading verdict: True or False, or None when the
+    request never got to grading it.
+    """
+    accessible = result.get("accessible_documents")
+    relevant = result.get("relevant_documents")
+    accessible_keys = {document_key(document) for document in accessible or []}
+    relevant_keys = {document_key(document) for document in relevant or []}
+    traces = []
+    for document in result.get("retrieved_documents") or []:
+        metadata = document.metadata
+        key = document_key(document)
+        traces.append({
+            "id": metadata.get("id") or metadata.get("element_id"),
+            "source": metadata.get("data_source"),
+            "title": metadata.get("title"),
+            "score": metadata.get("score"),
+            "similarity": metadata.get("similarity"),
+            "vector_rank": metadata.get("vector_rank"),
+            "keyword_rank": metadata.get("keyword_rank"),
+            "accessible": key in accessible_keys if accessible is not None else None,
+            "relevant": key in relevant_keys if relevant is not None and key in accessible_keys else None,
+        })
+    return traces
+
+
+def build_trace(data, tool, result, duration_ms, reason, error=None):
+    result = result or {}
+    return {
+        "created_at": time.time(),
+        "reason": reason,
+        "query": (data.get("query") or "")[:MAX_QUERY_CHARS],
+        "tool": tool,
+        "model": data.get("model"),
+        "budget": data.get("budget"),
+        "grading_mode": data.get("grading_mode"),
+        "duration_ms": round(duration_ms, 1),
+        "error": str(error) if error is not None else None,
+        "stages": result.get("stage_timings") or [],
+        "documents": document_traces(result),
+        "usage": summarize_usage(result.get("llm_usage") or []),
+        "degradations": result.get("degradations") or [],
+    }
+
+
+def maybe_record(data, tool, result, duration_ms, error=None):
+    """
+    Stores the trace of a finished request if it is slow, failed, or
+    sampled. Tracing never fails the request; errors are logged only.
+    """
+    if not TRACE_ENABLED:
+        return
+    reason = trace_reason(duration_ms, error)
+    if reason is None:
+        return
+    try:
+        record_trace(build_trace(data, tool, result, duration_ms, reason, error))
+    except Exception as e:
+        logging.warning(f"Could not record search trace: {str(e)}")
+
+
+def record_trace(trace):
+    global _connection, _connection_pid, _writes
+    with _connection_lock:
+        # SQLite connections must not be shared with a forked parent
+        if _connection is None or _connection_pid != os.getpid():
+            _connection = connect()
+            _connection_pid = os.getpid()
+        row = {key: json.dumps(trace[key], default=str) if key in JSON_COLUMNS else trace[key] for key in trace}
+        with _connection:
+            _connection.execute(
+                f"INSERT INTO search_traces ({', '.join(row)}) VALUES ({', '.join(':' + key for key in row)})",
+                row,
+            )
+        _writes += 1
+        if _writes % TRACE_PRUNE_EVERY == 0:
+            prune(_connection)
+
+
+def prune(connection, retention_days=TRACE_RETENTION_DAYS, max_rows=TRACE_MAX_ROWS):
+    with connection:
+        connection.execute(
+            "DELETE FROM search_traces WHERE created_at < ?", (time.time() - retention_days * 86400,)
+        )
+        connection.execute(
+            "DELETE FROM search_traces WHERE id <= "
+            "(SELECT id FROM search_traces ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (max_rows,),
+        )
+
+
+def load_traces(path=TRACE_DB_PATH, since=None, min_duration_ms=None, reason=None, limit=None):
+    """
+    Stored traces, slowest first, with their JSON columns decoded.
+
+    Args:
+        since: Unix time of the oldest trace to load
+        min_duration_ms: Only traces at least this slow
+        reason: Only traces stored for this reason
+        limit: At most this many traces
+    """
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if min_duration_ms is not None:
+        conditions.append("duration_ms >= ?")
+        params.append(min_duration_ms)
+    if reason is not None:
+        conditions.append("reason = ?")
+        params.append(reason)
+    sql = "SELECT * FROM search_traces"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY duration_ms DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    connection = connect(path)
+    try:
+        traces = []
+        for row in connection.execute(sql, params):
+            trace = dict(row)
+            for key in JSON_COLUMNS:
+                trace[key] = json.loads(trace[key])
+            traces.append(trace)
+        return traces
+    finally:
+        connection.close()
@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from docuquery.constants.neo4j import USERNAME, PASSWORD, URL, EMBEDDING_NODE_PROPERTY
+from docuquery.constants.retrieval import (
+    VECTOR_MIRROR_CHECK_INTERVAL,
+    VECTOR_MIRROR_DIR,
+    VECTOR_MIRROR_DTYPE,
+    VECTOR_MIRROR_LABELS,
+    VECTOR_MIRROR_NPROBE,
+    VECTOR_MIRROR_PARTITIONS,
+)
+
+# Rows converted per block when the mirror is stored as float16, so a query
+# never materializes a float32 copy of the whole matrix
+SCORE_CHUNK_ROWS = 4096
+EXPORT_BATCH_SIZE = 10000
+KMEANS_SAMPLE_SIZE = 50000
+KMEANS_ITERATIONS = 10
+
+_driver = None
+_driver_lock = threading.Lock()
+_driver_pid = None
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_driver():
+    """
+    Driver shared by everything in a process that talks to Neo4j; its
+    connection pool must not be shared with a forked parent.
+    """
+    global _driver, _driver_pid
+    with _driver_lock:
+        if _driver is None or _driver_pid != os.getpid():
+            _driver_pid = os.getpid()
+            from neo4j import GraphDatabase
+            _driver = GraphDatabase.driver(URL, auth=(USERNAME, PASSWORD))
+        return _driver
+
+
+def manifest_path(label, directory=VECTOR_MIRROR_DIR):
+    return os.path.join(directory, f"{label}.json")
+
+
+def to_similarity(dot):
+    # Same 0-1 scale as Neo4j's vector.similarity.cosine and queryNodes
+    return (1 + dot) / 2
+
+
+def score_vectors(vectors, query):
+    if vectors.dtype == np.float32:
+        return vectors @ query
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_CHUNK_ROWS):
+        block = vectors[start:start + SCORE_CHUNK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+
+def build_partitions(vectors, partitions, iterations=KMEANS_ITERATIONS, sample_size=KMEANS_SAMPLE_SIZE):
+    """
+    Spherical k-means over a sample of the (unit) vectors.
+
+    Returns:
+        (centroids, assignments): unit centroids of shape (partitions, d)
+        and the partition of every vector
+    """
+    rng = np.random.default_rng(0)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), partitions, replace=False)].copy()
+
+    for _ in range(iterations):
+        nearest = np.argmax(sample @ centroids.T, axis=1)
+        for partition in range(partitions):
+            members = sample[nearest == partition]
+            if len(members):
+                centroids[partition] = members.sum(axis=0)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True).clip(min=1e-12)
+
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCORE_CHUNK_ROWS):
+        block = np.asarray(vectors[start:start + SCORE_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return centroids, assignments
+
+
+def export_mirror(label, directory=VECTOR_MIRROR_DIR, dtype=VECTOR_MIRROR_DTYPE,
+                  partitions=VECTOR_MIRROR_PARTITIONS, embedding_node_property=EMBEDDING_NODE_PROPERTY,
+                  driver=None):
+    """
+    Exports the embeddings and element ids of every `label` node to a new
+    versioned directory of .npy files, then swaps the manifest pointing at it.
+
+    The manifest is replaced atomically, so workers either keep the previous
+    export or load the complete new one. The previous export is kept for
+    workers that still have it mapped; older ones are removed.
+
+    Returns:
+        The new manifest, or None when no node has an embedding
+    """
+    driver = driver or get_driver()
+    os.makedirs(directory, exist_ok=True)
+
+    embedded = f"MATCH (n:`{label}`) WHERE n.`{embedding_node_property}` IS NOT NULL "
+    with driver.session() as session:
+        count = session.run(embedded + "RETURN count(n) AS count").single()["count"]
+        dimensions = session.run(
+            embedded + f"RETURN size(n.`{embedding_node_property}`) AS dimensions LIMIT 1"
+        ).single()
+    if not count or dimensions is None:
+        print(f"No {label} embeddings to export")
+        return None
+
+    version = str(time.time_ns())
+    dimensions = dimensions["dimensions"]
+    target = os.path.join(directory, f"{label}.{version}")
+    os.makedirs(target)
+    unsorted_path = os.path.join(target, "unsorted.npy")
+    unsorted = np.lib.format.open_memmap(unsorted_path, mode="w+", dtype=np.float32, shape=(count, dimensions))
+    ids = []
+
+    # Nodes created after the count are left for the next export
+    with driver.session() as session:
+        result = session.run(
+            embedded + f"RETURN elementId(n) AS id, n.`{embedding_node_property}` AS embedding LIMIT $count",
+            count=count,
+        )
+        batch = []
+        for record in result:
+            ids.append(record["id"])
+            batch.append(record["embedding"])
+            if len(batch) == EXPORT_BATCH_SIZE:
+                unsorted[len(ids) - len(batch):len(ids)] = batch
+                batch = []
+        if batch:
+            unsorted[len(ids) - len(batch):len(ids)] = batch
+
+    manifest = write_mirror(label, version, ids, unsorted[:len(ids)], directory, dtype, partitions)
+    del unsorted
+    os.remove(unsorted_path)
+    return manifest
+
+
+def write_mirror(label, version, ids, vectors, directory=VECTOR_MIRROR_DIR, dtype=VECTOR_MIRROR_DTYPE,
+                 partitions=VECTOR_MIRROR_PARTITIONS):
+    """
+    Normalizes `vectors` in place, writes them with their ids (and IVF
+    partitions) to the `version` directory, and points the manifest at it.
+    """
+    target = os.path.join(directory, f"{label}.{version}")
+    os.makedirs(target, exist_ok=True)
+    count, dimensions = vectors.shape
+    for start in range(0, count, SCORE_CHUNK_ROWS):
+        block = vectors[start:start + SCORE_CHUNK_ROWS]
+        block /= np.linalg.norm(block, axis=1, keepdims=True).clip(min=1e-12)
+
+    # Store vectors grouped by partition, so a probe reads one contiguous slice
+    partitions = min(partitions, count)
+    order = np.arange(count)
+    if partitions > 1:
+        centroids, assignments = build_partitions(vectors, partitions)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(partitions + 1))
+        np.save(os.path.join(target, "centroids.npy"), centroids)
+        np.save(os.path.join(target, "offsets.npy"), offsets)
+    else:
+        partitions = 0
+
+    stored = np.lib.format.open_memmap(
+        os.path.join(target, "vectors.npy"), mode="w+", dtype=np.dtype(dtype), shape=(count, dimensions)
+    )
+    for start in range(0, count, SCORE_CHUNK_ROWS):
+        stored[start:start + SCORE_CHUNK_ROWS] = vectors[order[start:start + SCORE_CHUNK_ROWS]]
+    stored.flush()
+    np.save(os.path.join(target, "ids.npy"), np.asarray(ids)[order])
+    del stored
+
+    previous = read_manifest(label, directory)
+    manifest = {
+        "label": label,
+        "version": version,
+        "count": int(count),
+        "dimensions": int(dimensions),
+        "dtype": np.dtype(dtype).name,
+        "partitions": partitions,
+        "exported_at": time.time(),
+    }
+    temporary = manifest_path(label, directory) + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(manifest, file)
+    os.replace(temporary, manifest_path(label, directory))
+
+    # Also clears directories left behind by failed exports
+    keep = {version, previous and previous["version"]}
+    for name in os.listdir(directory):
+        stem, _, suffix = name.rpartition(".")
+        if stem == label and suffix.isdigit() and suffix not in keep:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    print(f"Exported {count} {label} embeddings ({dimensions}d {manifest['dtype']}, {partitions} partitions)")
+    return manifest
+
+
+def export_all(directory=VECTOR_MIRROR_DIR, driver=None):
+    for label in VECTOR_MIRROR_LABELS:
+        try:
+            export_mirror(label, directory, driver=driver)
+        except Exception as e:
+            logging.error(f"Error exporting the {label} vector mirror: {str(e)}")
+
+
+def read_manifest(label, directory=VECTOR_MIRROR_DIR):
+    try:
+        with open(manifest_path(label, directory)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+class VectorMirror:
+    """
+    Read-only view of one export. The .npy files are memory-mapped, so all
+    worker processes share a single copy through the page cache.
+    """
+
+    def __init__(self, manifest, directory=VECTOR_MIRROR_DIR):
+        self.manifest = manifest
+        self.label = manifest["label"]
+        self.dimensions = manifest["dimensions"]
+        path = os.path.join(directory, f"{self.label}.{manifest['version']}")
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.centroids = None
+        self.offsets = None
+        if manifest["partitions"]:
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.offsets = np.load(os.path.join(path, "offsets.npy"))
+
+    def search(self, query_embedding, k, nprobe=VECTOR_MIRROR_NPROBE):
+        """
+        Top-k cosine search, exhaustive or over the `nprobe` closest partitions.
+
+        Returns:
+            List of (row, element id, similarity) tuples, best first
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.centroids is None:
+            rows = None
+            scores = score_vectors(self.vectors, query)
+        else:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([
+                np.arange(self.offsets[p], self.offsets[p + 1]) for p in probes
+            ])
+            scores = np.concatenate([
+                score_vectors(self.vectors[self.offsets[p]:self.offsets[p + 1]], query) for p in probes
+            ])
+
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top_rows = rows[top] if rows is not None else top
+        return [
+            (int(row), str(self.ids[row]), float(to_similarity(score)))
+            for row, score in zip(top_rows, scores[top])
+        ]
+
+    def embeddings(self, rows):
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+
+def get_mirror(label, directory=VECTOR_MIRROR_DIR):
+    """
+    Returns the latest export of `label`, or None if there is none.
+
+    The manifest is re-read at most every VECTOR_MIRROR_CHECK_INTERVAL
+    seconds, and a newer version is mapped in place of the old one.
+    """
+    now = time.monotonic()
+    with _mirrors_lock:
+        mirror, checked = _mirrors.get(label, (None, None))
+        if checked is not None and now - checked < VECTOR_MIRROR_CHECK_INTERVAL:
+            return mirror
+
+        manifest = read_manifest(label, directory)
+        if manifest is None:
+            mirror = None
+        elif mirror is None or mirror.manifest["version"] != manifest["version"]:
+            try:
+                mirror = VectorMirror(manifest, directory)
+                print(f"---VECTOR MIRROR: {label} {manifest['count']} VECTORS---")
+            except OSError as e:
+                logging.error(f"Error loading the {label} vector mirror: {str(e)}")
+        _mirrors[label] = (mirror, now)
+        return mirror
+
+
+if __name__ == '__main__':
+    export_all()
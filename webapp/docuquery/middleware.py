@@ -0,0 +1,48 @@
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from docuquery.constants.response import BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+# Streams whose lines must reach the client as they are written; gzip's
+# compress_sequence holds output back until its buffer fills
+UNBUFFERED_STREAM_TYPES = ("application/x-ndjson",)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses with brotli for clients that accept it and Brotli
+    is installed, and with gzip otherwise. Streamed responses are left to
+    gzip, except NDJSON streams, which are sent uncompressed.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming and response.get("Content-Type", "").startswith(UNBUFFERED_STREAM_TYPES):
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or len(response.content) < 200
+            or response.has_header("Content-Encoding")
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
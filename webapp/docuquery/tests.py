@@ -1,3 +1,814 @@
-from django.test import TestCase
+import itertools
+import json
+import math
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+from langchain_core.documents import Document
+
+from docuquery.constants.budget import MAX_REQUEST_BUDGET_SECONDS, REQUEST_BUDGET_SECONDS
+from docuquery.extensions.Neo4jGraphPlus import split_meta_data
+from docuquery.extensions.Neo4jVectorPlus import Neo4jVectorPlus
+from docuquery.graph import CypherRetriever as cypher_retriever
+from docuquery.graph.CypherRetriever import CypherRetriever, parameterize_question, uses_parameters
+from docuquery.graph import faq
+from docuquery.graph.acl import PageAcls, effective_acls, page_restrictions
+from docuquery.graph.budget import capped_timeout, remaining, start_deadline
+from docuquery.graph.extractive import extractive_answer
+from docuquery.graph.graders import BM25Grader, EmbeddingGrader
+from docuquery.graph.faq import extract_qa_pairs, faq_index_ready, is_faq_page
+from docuquery.graph.llm_provider import HedgePolicy, call_with_deadline
+from docuquery.graph.mmr import mmr_select
+from docuquery.graph.rank_fusion import reciprocal_rank_fusion, weighted_score_fusion
+from docuquery.graph.sessions import SessionStore, context_similarity
+from docuquery.graph.snippets import best_snippets
+from docuquery.views import build_response, search_options
+
+
+class SplitMetaDataTests(SimpleTestCase):
+    # Rows as apoc.meta.data() yields them for a small graph
+    rows = [
+        {"label": "Page", "other": [], "elementType": "node", "type": "STRING", "property": "title"},
+        {"label": "Page", "other": [], "elementType": "node", "type": "INTEGER", "property": "version"},
+        {"label": "Page", "other": ["Space"], "elementType": "node", "type": "RELATIONSHIP", "property": "IN_SPACE"},
+        {"label": "Page", "other": ["Embeddable"], "elementType": "node", "type": "RELATIONSHIP", "property": "HAS_CHUNK"},
+        {"label": "Space", "other": [], "elementType": "node", "type": "STRING", "property": "name"},
+        {"label": "IN_SPACE", "other": [], "elementType": "relationship", "type": "DATE_TIME", "property": "since"},
+        {"label": "Embeddable", "other": [], "elementType": "node", "type": "LIST", "property": "embedding"},
+        {"label": "__Entity__", "other": ["Page"], "elementType": "node", "type": "RELATIONSHIP", "property": "MENTIONED_IN"},
+        {"label": "_Bloom_HAS_SCENE_", "other": [], "elementType": "relationship", "type": "STRING", "property": "id"},
+    ]
+
+    def test_splits_rows_into_schema_sections(self):
+        node_properties, rel_properties, relationships = split_meta_data(self.rows)
+        self.assertEqual(node_properties, [
+            {"labels": "Page", "properties": [
+                {"property": "title", "type": "STRING"},
+                {"property": "version", "type": "INTEGER"},
+            ]},
+            {"labels": "Space", "properties": [{"property": "name", "type": "STRING"}]},
+        ])
+        self.assertEqual(rel_properties, [
+            {"type": "IN_SPACE", "properties": [{"property": "since", "type": "DATE_TIME"}]},
+        ])
+        self.assertEqual(relationships, [{"start": "Page", "type": "IN_SPACE", "end": "Space"}])
+
+    def test_empty_result(self):
+        self.assertEqual(split_meta_data([]), ([], [], []))
+
+
+class ParameterizeQuestionTests(SimpleTestCase):
+    def test_quoted_names_share_a_template(self):
+        lowe, lowe_params = parameterize_question("How many studies are there for 'Lowe Syndrome'?")
+        rett, rett_params = parameterize_question("how many studies are there for 'Rett Syndrome'")
+        self.assertEqual(lowe, "how many studies are there for $p0")
+        self.assertEqual(lowe, rett)
+        self.assertEqual(lowe_params, {"p0": "Lowe Syndrome"})
+        self.assertEqual(rett_params, {"p0": "Rett Syndrome"})
+
+    def test_numbers_and_capitalised_names(self):
+        template, params = parameterize_question("List 5 studies of Rett Syndrome started after 2019.5")
+        self.assertEqual(template, "list $p0 studies of $p1 started after $p2")
+        self.assertEqual(params, {"p0": 5, "p1": "Rett Syndrome", "p2": 2019.5})
+
+    def test_sentence_initial_capital_is_not_a_name(self):
+        template, params = parameterize_question("Which studies use RDCRN data?")
+        self.assertEqual(template, "which studies use $p0 data")
+        self.assertEqual(params, {"p0": "RDCRN"})
+
+
+class UsesParametersTests(SimpleTestCase):
+    def test_parameterized_statement(self):
+        cypher = "MATCH (s:Study) WHERE toLower(s.disease) CONTAINS toLower($p0) RETURN s LIMIT $p1"
+        self.assertTrue(uses_parameters(cypher, {"p0": "Lowe Syndrome", "p1": 5}))
+
+    def test_inlined_string(self):
+        cypher = "MATCH (s:Study) WHERE toLower(s.disease) CONTAINS toLower('lowe syndrome') RETURN s"
+        self.assertFalse(uses_parameters(cypher, {"p0": "Lowe Syndrome"}))
+
+    def test_parameter_used_and_inlined(self):
+        cypher = "MATCH (s:Study {disease: 'Lowe Syndrome'}) WHERE s.name <> $p0 RETURN s"
+        self.assertFalse(uses_parameters(cypher, {"p0": "Lowe Syndrome"}))
+
+    def test_label_taken_as_a_parameter(self):
+        _, params = parameterize_question("which Study nodes have no datasets")
+        self.assertFalse(uses_parameters("MATCH (s:Study) WHERE NOT (s)--(:Dataset) RETURN s", params))
+
+    def test_inlined_number(self):
+        self.assertFalse(uses_parameters("MATCH (s:Study) RETURN s LIMIT 5", {"p0": 5}))
+
+    def test_parameter_reference_is_not_a_number(self):
+        self.assertTrue(uses_parameters("MATCH (s:Study) WHERE s.year = $p1 RETURN s LIMIT $p0", {"p0": 1, "p1": 2020}))
+
+    def test_unused_parameter(self):
+        self.assertFalse(uses_parameters("MATCH (s:Study) RETURN count(s)", {"p0": "Lowe Syndrome"}))
+
+
+class StubCypherRetriever(CypherRetriever):
+    def __init__(self, cypher):
+        super().__init__(graph=None, llm=None)
+        self.cypher = cypher
+        self.generated = 0
+
+    def generate(self, template, params, usage=None):
+        self.generated += 1
+        return self.cypher
+
+    def validate(self, cypher, params, timeout=None):
+        pass
+
+    def execute(self, cypher, params, timeout=None):
+        return [{"cypher": cypher, "params": params}]
+
+
+class CypherCacheTests(SimpleTestCase):
+    def setUp(self):
+        cypher_retriever._query_cache.clear()
+        self.addCleanup(cypher_retriever._query_cache.clear)
+
+    def test_parameterized_statement_is_reused(self):
+        retriever = StubCypherRetriever("MATCH (s:Study) WHERE s.disease = $p0 RETURN count(s)")
+        retriever.invoke("How many studies are there for 'Lowe Syndrome'?")
+        rows = retriever.invoke("How many studies are there for 'Rett Syndrome'?")
+        self.assertEqual(retriever.generated, 1)
+        self.assertEqual(rows[0]["params"], {"p0": "Rett Syndrome"})
+
+    def test_inlined_statement_is_not_cached(self):
+        retriever = StubCypherRetriever("MATCH (s:Study) WHERE s.disease = 'Lowe Syndrome' RETURN count(s)")
+        retriever.invoke("How many studies are there for 'Lowe Syndrome'?")
+        self.assertEqual(dict(cypher_retriever._query_cache), {})
+        retriever.invoke("How many studies are there for 'Rett Syndrome'?")
+        self.assertEqual(retriever.generated, 2)
+
+
+def timed_request(*latencies):
+    """
+    Request answering its nth call after the nth latency, with the call's index.
+    """
+    calls = itertools.count()
+
+    def request():
+        index = next(calls)
+        time.sleep(latencies[index])
+        return index
+    return request
+
+
+class HedgePolicyTests(SimpleTestCase):
+    def test_delay_is_the_latency_quantile_once_sampled(self):
+        policy = HedgePolicy(quantile=0.9, min_samples=4, default_delay=3.0, min_delay=0.3)
+        key = ("gpt-4o", "generation")
+        for seconds in (1.0, 2.0, 3.0):
+            policy.observe(key, seconds)
+        self.assertEqual(policy.delay(key), 3.0)
+        policy.observe(key, 4.0)
+        self.assertEqual(policy.delay(key), 3.0)
+        for _ in range(4):
+            policy.observe(("gpt-4o-mini", "grading"), 0.1)
+        self.assertEqual(policy.delay(("gpt-4o-mini", "grading")), 0.3)
+
+    def test_budget_limits_hedges(self):
+        policy = HedgePolicy(budget=0.5, burst=1)
+        policy.start_call()
+        self.assertFalse(policy.allow_hedge())
+        policy.start_call()
+        self.assertTrue(policy.allow_hedge())
+        self.assertFalse(policy.allow_hedge())
+        self.assertEqual(policy.stats()["hedges"], 1)
+        self.assertEqual(policy.stats()["hedges_denied"], 2)
+
+
+class CallWithDeadlineTests(SimpleTestCase):
+    key = ("gpt-4o", "generation")
+
+    def test_slow_call_is_hedged(self):
+        policy = HedgePolicy(budget=1, burst=1, default_delay=0.05)
+        response, hedged = call_with_deadline(timed_request(1.0, 0.0), self.key, 2.0, hedge=True, policy=policy)
+        self.assertEqual((response, hedged), (1, True))
+        self.assertEqual(policy.stats()["hedge_wins"], 1)
+
+    def test_no_hedge_without_budget(self):
+        policy = HedgePolicy(budget=0, burst=1, default_delay=0.05)
+        response, hedged = call_with_deadline(timed_request(0.2, 0.0), self.key, 2.0, hedge=True, policy=policy)
+        self.assertEqual((response, hedged), (0, False))
+        self.assertEqual(policy.stats()["hedges_denied"], 1)
+
+    def test_fast_call_is_not_hedged(self):
+        policy = HedgePolicy(budget=1, burst=1, default_delay=0.5)
+        response, hedged = call_with_deadline(timed_request(0.0, 0.0), self.key, 2.0, hedge=True, policy=policy)
+        self.assertEqual((response, hedged), (0, False))
+        self.assertNotIn("hedges", policy.stats())
+
+    def test_timeout(self):
+        policy = HedgePolicy()
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            call_with_deadline(timed_request(1.0), self.key, 0.1, policy=policy)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(policy.stats()["timeouts"], 1)
+
+    def test_spent_budget_makes_no_call(self):
+        policy = HedgePolicy()
+        with self.assertRaises(TimeoutError):
+            call_with_deadline(lambda: self.fail("called"), self.key, 0, policy=policy)
+        self.assertEqual(policy.stats()["timeouts"], 1)
+
+    def test_error_is_raised(self):
+        def request():
+            raise ValueError("bad request")
+        with self.assertRaisesMessage(ValueError, "bad request"):
+            call_with_deadline(request, self.key, 1.0, policy=HedgePolicy())
+
+
+def confluence_page(text, similarity, title="Data Access", page_id="42", data_source="confluence"):
+    return Document(page_content=text, metadata={
+        "data_source": data_source, "id": page_id, "space_key": "RDCRN", "title": title, "similarity": similarity,
+    })
+
+
+EXPORT_PAGE = (
+    "Data Export\n"
+    "Researchers export study data from the portal as CSV files.\n"
+    "The export button is on the study overview page.\n"
+    "Exports larger than one gigabyte are emailed as a download link."
+)
+
+
+class BM25GraderTests(SimpleTestCase):
+    query = "How do I request access to genomic data?"
+    relevant = Document(
+        page_content="To request genomic data access, submit the data access form to the committee.",
+        metadata={"title": "Requesting genomic data access"},
+    )
+    irrelevant = Document(
+        page_content="The cafeteria menu changes weekly and parking permits renew in spring.",
+        metadata={"title": "Campus notes"},
+    )
+    passing_mention = Document(
+        page_content="Our lab moved to a new building; the genomic sequencing core is on floor two.",
+        metadata={"title": "Lab news"},
+    )
+
+    def test_splits_relevant_from_irrelevant(self):
+        grader = BM25Grader()
+        documents = [self.relevant, self.irrelevant, self.passing_mention]
+        self.assertEqual(grader.grade(self.query, documents), [True, False, False])
+
+    def test_scores_are_normalized(self):
+        scores = BM25Grader().scores(self.query, [self.relevant, self.irrelevant, self.passing_mention])
+        self.assertTrue(all(0.0 <= score <= 1.0 for score in scores))
+        self.assertEqual(scores[1], 0.0)
+        self.assertGreater(scores[2], 0.0)
+
+    def test_title_counts_as_content(self):
+        titled = Document(page_content="See the form linked below.", metadata={"title": "Genomic data access"})
+        self.assertEqual(BM25Grader().grade(self.query, [titled, self.irrelevant]), [True, False])
+
+    def test_query_of_stopwords_keeps_nothing(self):
+        self.assertEqual(BM25Grader().grade("how do I", [self.relevant]), [False])
+
+
+class EmbeddingGraderTests(SimpleTestCase):
+    def test_splits_on_cosine_similarity(self):
+        documents = [
+            Document(page_content="close", metadata={"_embedding_": [0.9, 0.1]}),
+            Document(page_content="far", metadata={"_embedding_": [0.0, 1.0]}),
+            Document(page_content="unembedded", metadata={}),
+        ]
+        self.assertEqual(EmbeddingGrader(threshold=0.75).grade("q", documents, [1.0, 0.0]), [True, False, True])
+
+
+class ExtractiveAnswerTests(SimpleTestCase):
+    query = "How do researchers export study data?"
+
+    def test_clear_top_hit_is_quoted(self):
+        documents = [confluence_page(EXPORT_PAGE, 0.97), confluence_page("Unrelated.", 0.90, page_id="7")]
+        result = extractive_answer(self.query, documents)
+        self.assertIsNotNone(result)
+        self.assertTrue(result["answer"].startswith("Researchers export study data from the portal as CSV files."))
+        self.assertIn("(https://rdcrn.atlassian.net/wiki/spaces/RDCRN/pages/42)", result["answer"])
+        self.assertEqual(result["document"].metadata["id"], "42")
+        self.assertEqual(result["margin"], 0.07)
+        self.assertEqual(result["coverage"], 1.0)
+
+    def test_low_similarity(self):
+        self.assertIsNone(extractive_answer(self.query, [confluence_page(EXPORT_PAGE, 0.90)]))
+
+    def test_close_runner_up(self):
+        documents = [confluence_page(EXPORT_PAGE, 0.97), confluence_page(EXPORT_PAGE, 0.96, page_id="7")]
+        self.assertIsNone(extractive_answer(self.query, documents))
+
+    def test_low_coverage(self):
+        query = "Which consent forms cover genomic sequencing of minors?"
+        self.assertIsNone(extractive_answer(query, [confluence_page(EXPORT_PAGE, 0.97)]))
+
+    def test_other_sources_are_not_quoted(self):
+        documents = [confluence_page(EXPORT_PAGE, 0.99, data_source="postgres")]
+        self.assertIsNone(extractive_answer(self.query, documents))
+
+    def test_documents_without_similarity(self):
+        self.assertIsNone(extractive_answer(self.query, [confluence_page(EXPORT_PAGE, None)]))
+
+
+FAQ_HTML = """
+<h1>Portal FAQ</h1>
+<ac:structured-macro ac:name="expand">
+  <ac:parameter ac:name="title">How do I reset my password?</ac:parameter>
+  <ac:rich-text-body><p>Use the <strong>Forgot password</strong> link on the login page.</p></ac:rich-text-body>
+</ac:structured-macro>
+<h2>How to export a study</h2>
+<p>Open the study overview.</p>
+<ul><li><p>Click Export.</p></li><li>Pick CSV or JSON.</li></ul>
+<h2>Contacts</h2>
+<p>Email the help desk.</p>
+<p>Who approves data requests?</p>
+<p>The data access committee.</p>
+<h3>Why?</h3>
+<p>One word headings are questions too when they end in a question mark.</p>
+<h3>Unanswered question?</h3>
+"""
+
+
+class ExtractQaPairsTests(SimpleTestCase):
+    def test_pairs(self):
+        self.assertEqual(extract_qa_pairs(FAQ_HTML), [
+            ("How do I reset my password?", "Use the Forgot password link on the login page."),
+            ("How to export a study", "Open the study overview. Click Export. Pick CSV or JSON."),
+            ("Who approves data requests?", "The data access committee."),
+            ("Why?", "One word headings are questions too when they end in a question mark."),
+        ])
+
+    def test_labels_are_not_questions(self):
+        html = "<h2>Export</h2><p>Open the study overview.</p><h2>How to</h2><p>Click Export.</p>"
+        self.assertEqual(extract_qa_pairs(html), [])
+
+    def test_long_answers_are_truncated_at_a_word(self):
+        html = "<h2>What is the retention policy?</h2><p>" + "Records are kept for years. " * 100 + "</p>"
+        (_, answer), = extract_qa_pairs(html)
+        self.assertLessEqual(len(answer), faq.FAQ_MAX_ANSWER_CHARS + 2)
+        self.assertTrue(answer.endswith(" …"))
+        self.assertFalse(answer[:-2].endswith(" "))
+
+    def test_faq_pages(self):
+        pair = [("How do I reset my password?", "Use the link.")]
+        self.assertTrue(is_faq_page("Portal FAQ", pair))
+        self.assertFalse(is_faq_page("Release notes", pair))
+        self.assertTrue(is_faq_page("Release notes", pair * faq.FAQ_MIN_PAIRS))
+        self.assertFalse(is_faq_page("Portal FAQ", []))
+
+
+class StubDriver:
+    def __init__(self, state=None, error=None):
+        self.state = state
+        self.error = error
+        self.queries = 0
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.queries += 1
+        if self.error:
+            raise self.error
+        return self
+
+    def single(self):
+        return None if self.state is None else {"state": self.state}
+
+
+class FaqIndexReadyTests(SimpleTestCase):
+    def setUp(self):
+        faq._index_ready = None
+        self.addCleanup(setattr, faq, "_index_ready", None)
+
+    def test_online_index(self):
+        driver = StubDriver("ONLINE")
+        self.assertTrue(faq_index_ready(driver))
+        self.assertTrue(faq_index_ready(driver))
+        self.assertEqual(driver.queries, 1)
+
+    def test_missing_index_is_remembered(self):
+        driver = StubDriver()
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(faq_index_ready(driver))
+        self.assertFalse(faq_index_ready(driver))
+        self.assertEqual(driver.queries, 1)
+
+    def test_populating_index(self):
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(faq_index_ready(StubDriver("POPULATING")))
+
+    def test_failed_check_is_asked_again(self):
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(faq_index_ready(StubDriver(error=OSError("connection refused"))))
+        self.assertTrue(faq_index_ready(StubDriver("ONLINE")))
+
+
+class SessionStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sessions.sqlite3")
+
+    def store(self, **kwargs):
+        return SessionStore(path=self.path, **kwargs)
+
+    def save(self, store, session_id, username="alice", query="how do I export data", documents=None):
+        store.save_turn(
+            session_id, username, query, "From the study page.",
+            query_embedding=[1.0, 0.0, 0.0],
+            documents=documents if documents is not None else [Document(page_content="Export", metadata={"id": "42"})],
+        )
+        # Sessions are ordered by the time they were last used
+        time.sleep(0.01)
+
+    def test_turns_are_shared_between_workers(self):
+        self.save(self.store(), "s1", documents=[
+            Document(page_content="Export", metadata={"id": "42", "_embedding_": [0.1, 0.2]}),
+        ])
+        session = self.store().get("s1", "alice")
+        self.assertEqual(session["turns"], [("how do I export data", "From the study page.")])
+        self.assertEqual(session["documents"], [Document(page_content="Export", metadata={"id": "42"})])
+        self.assertAlmostEqual(context_similarity(session, [2.0, 0.0, 0.0]), 1.0, places=6)
+        self.assertAlmostEqual(context_similarity(session, [0.0, 1.0, 0.0]), 0.0, places=6)
+
+    def test_reused_turn_keeps_documents(self):
+        store = self.store()
+        self.save(store, "s1")
+        store.save_turn("s1", "alice", "and as JSON?", "Yes.", query_embedding=[0.0, 1.0, 0.0])
+        session = store.get("s1", "alice")
+        self.assertEqual(len(session["anchors"]), 2)
+        self.assertEqual(session["documents"][0].metadata["id"], "42")
+        self.assertEqual(len(session["turns"]), 2)
+
+    def test_expired_session(self):
+        store = self.store(ttl=0.05)
+        self.save(store, "s1")
+        time.sleep(0.06)
+        self.assertIsNone(store.get("s1", "alice"))
+        self.assertEqual(len(store), 0)
+        self.save(store, "s1", query="new conversation")
+        self.assertEqual([query for query, _ in store.get("s1", "alice")["turns"]], ["new conversation"])
+
+    def test_least_recently_used_is_evicted(self):
+        store = self.store(max_sessions=2)
+        self.save(store, "s1")
+        self.save(store, "s2")
+        store.get("s1", "alice")
+        time.sleep(0.01)
+        self.save(store, "s3")
+        self.assertEqual(len(store), 2)
+        self.assertIsNotNone(store.get("s1", "alice"))
+        self.assertIsNone(store.get("s2", "alice"))
+        self.assertIsNotNone(store.get("s3", "alice"))
+
+    def test_other_users_session(self):
+        store = self.store()
+        self.save(store, "s1")
+        self.assertIsNone(store.get("s1", "mallory"))
+        self.save(store, "s1", username="mallory", query="what is in it")
+        session = store.get("s1", "alice")
+        self.assertEqual([query for query, _ in session["turns"]], ["how do I export data"])
+        self.assertIsNone(store.get("s1", "mallory"))
+
+    def test_expired_session_of_another_user_is_replaced(self):
+        store = self.store(ttl=0.05)
+        self.save(store, "s1")
+        time.sleep(0.06)
+        self.save(store, "s1", username="bob")
+        self.assertIsNone(store.get("s1", "alice"))
+        self.assertIsNotNone(store.get("s1", "bob"))
+
+    def test_store_errors_are_not_raised(self):
+        store = SessionStore(path=os.path.join(self.path, "missing", "sessions.sqlite3"))
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(store.get("s1", "alice"))
+        with self.assertLogs(level="WARNING"):
+            self.save(store, "s1")
+
+
+class EffectiveAclsTests(SimpleTestCase):
+    def test_unrestricted_pages_are_public(self):
+        self.assertEqual(effective_acls({"1": (None, []), "2": (None, ["1"])}), {
+            "1": (False, []),
+            "2": (False, []),
+        })
+
+    def test_restrictions_are_inherited_and_intersected(self):
+        acls = effective_acls({
+            "1": ({"user:alice", "user:bob", "group:staff"}, []),
+            "2": (None, ["1"]),
+            "3": ({"user:bob", "group:staff", "user:carol"}, ["1", "2"]),
+        })
+        self.assertEqual(acls["2"], (True, ["group:staff", "user:alice", "user:bob"]))
+        self.assertEqual(acls["3"], (True, ["group:staff", "user:bob"]))
+
+    def test_unknown_ancestor_lets_nobody_in(self):
+        self.assertEqual(effective_acls({"2": (None, ["1"]), "3": ({"user:bob"}, ["1", "2"])}), {
+            "2": (True, []),
+            "3": (True, []),
+        })
+
+    def test_unreadable_restrictions_hide_the_page_and_its_children(self):
+        acls = effective_acls({"1": (set(), []), "2": (None, ["1"])})
+        self.assertEqual(acls, {"1": (True, []), "2": (True, [])})
+
+
+class PageAclsTests(SimpleTestCase):
+    client = SimpleNamespace(base_url="https://example.atlassian.net/wiki", access_token="token", headers={})
+
+    def test_page_restrictions(self):
+        content = {"restrictions": {"read": {"restrictions": {
+            "user": {"results": [{"accountId": "a1", "displayName": "Alice"}, {"displayName": "No key"}]},
+            "group": {"results": [{"name": "staff"}]},
+        }}}}
+        principals, users, groups = page_restrictions(content)
+        self.assertEqual(principals, {"user:a1", "group:staff"})
+        self.assertEqual([user["accountId"] for user in users], ["a1"])
+        self.assertEqual(groups, ["staff"])
+        self.assertEqual(page_restrictions({"restrictions": {"read": {}}}), (None, [], []))
+
+    def test_pages_are_collected(self):
+        responses = {
+            "1": {"restrictions": {"read": {"restrictions": {"group": {"results": [{"name": "staff"}]}}}},
+                  "ancestors": []},
+            "2": {"ancestors": [{"id": "1"}]},
+            "3": None,
+        }
+        acls = PageAcls(self.client)
+        with mock.patch("docuquery.graph.acl.fetch_page_restrictions", lambda client, page_id: responses[page_id]):
+            for page_id in responses:
+                acls.add(page_id)
+        self.assertEqual(acls.pages, {"1": ({"group:staff"}, []), "2": (None, ["1"]), "3": (set(), [])})
+        self.assertEqual(acls.groups, {"staff"})
+        self.assertEqual(effective_acls(acls.pages)["2"], (True, ["group:staff"]))
+
+    def test_nothing_is_fetched_without_credentials(self):
+        acls = PageAcls(SimpleNamespace(base_url=None, access_token=None, headers={}))
+        acls.add("1")
+        self.assertEqual(acls.pages, {"1": (set(), [])})
+
+
+def node(node_id, source="confluence", element_id=None):
+    metadata = {"id": node_id, "data_source": source}
+    if element_id is not None:
+        metadata["element_id"] = element_id
+    return Document(page_content=f"{source} {node_id}", metadata=metadata)
+
+
+def ids(documents):
+    return [document.metadata["id"] for document in documents]
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_agreement_outranks_a_single_top_rank(self):
+        fused = reciprocal_rank_fusion({
+            "confluence": [node("a"), node("b"), node("c")],
+            "keyword": [node("b"), node("c"), node("d")],
+        }, k=60)
+        self.assertEqual(ids(fused), ["b", "c", "a", "d"])
+        self.assertAlmostEqual(fused[0].metadata["rrf_score"], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(fused[2].metadata["rrf_score"], 1 / 61)
+
+    def test_duplicates_are_merged_by_id(self):
+        first = node("a")
+        fused = reciprocal_rank_fusion({"vector": [first], "keyword": [node("a")]})
+        self.assertEqual(len(fused), 1)
+        self.assertIs(fused[0], first)
+
+    def test_equal_ids_of_other_sources_stay_apart(self):
+        fused = reciprocal_rank_fusion({
+            "confluence": [node("1", "confluence")],
+            "postgres": [node("1", "postgres", element_id="4:x:1"), node("1", "postgres", element_id="4:x:2")],
+        })
+        self.assertEqual(len(fused), 3)
+
+    def test_weights_and_top_k(self):
+        ranked = {"confluence": [node("a"), node("b")], "postgres": [node("c", "postgres")]}
+        self.assertEqual(ids(reciprocal_rank_fusion(ranked, top_k=2)), ["a", "c"])
+        fused = reciprocal_rank_fusion(ranked, weights={"confluence": 0.5}, top_k=2)
+        self.assertEqual(ids(fused), ["c", "a"])
+
+
+class WeightedScoreFusionTests(SimpleTestCase):
+    def test_scores_are_normalized_per_list_and_summed(self):
+        fused = weighted_score_fusion({
+            "vector": [(node("a"), 0.9), (node("b"), 0.45)],
+            "keyword": [(node("b"), 12.0), (node("c"), 3.0)],
+        })
+        self.assertEqual(ids(fused), ["b", "a", "c"])
+        self.assertAlmostEqual(fused[0].metadata["fused_score"], 1.5)
+        self.assertAlmostEqual(fused[1].metadata["fused_score"], 1.0)
+        self.assertAlmostEqual(fused[2].metadata["fused_score"], 0.25)
+
+    def test_score_gaps_are_kept(self):
+        # Rank fusion would put b right behind a; weighted fusion keeps it far off
+        fused = weighted_score_fusion({"vector": [(node("a"), 0.9), (node("b"), 0.09)]})
+        self.assertAlmostEqual(fused[1].metadata["fused_score"], 0.1)
+
+    def test_weights_and_top_k(self):
+        scored = {"vector": [(node("a"), 0.9)], "keyword": [(node("b"), 5.0)]}
+        fused = weighted_score_fusion(scored, weights={"vector": 0.7, "keyword": 0.3}, top_k=1)
+        self.assertEqual(ids(fused), ["a"])
+        self.assertAlmostEqual(fused[0].metadata["fused_score"], 0.7)
+
+    def test_duplicates_are_merged_and_empty_lists_ignored(self):
+        fused = weighted_score_fusion({"vector": [(node("a"), 0.8)], "keyword": [(node("a"), 0.0)], "other": []})
+        self.assertEqual(ids(fused), ["a"])
+        self.assertAlmostEqual(fused[0].metadata["fused_score"], 1.0)
+
+
+class StubFusionStore(Neo4jVectorPlus):
+    def __init__(self, arms, fusion):
+        # No Neo4j connection: the arms answer from `arms`
+        self.arms = arms
+        self.fusion = fusion
+        self.vector_k = 3
+        self.keyword_k = 3
+        self.fusion_weights = {"vector": 1.0, "keyword": 1.0}
+        self.node_label = "Confluence"
+
+    def search_arm(self, arm, embedding, query, k, params):
+        if isinstance(self.arms[arm], Exception):
+            raise self.arms[arm]
+        return [(node(node_id), score) for node_id, score in self.arms[arm]], 1.0
+
+
+class FusionSearchTests(SimpleTestCase):
+    arms = {"vector": [("a", 0.9), ("b", 0.8)], "keyword": [("b", 7.0), ("c", 2.0)]}
+
+    def test_rrf(self):
+        results = StubFusionStore(self.arms, "rrf").fusion_search([0.1], "query", 3)
+        self.assertEqual([document.metadata["id"] for document, _ in results], ["b", "a", "c"])
+        b = results[0][0].metadata
+        self.assertEqual((b["vector_rank"], b["keyword_rank"]), (2, 1))
+        self.assertNotIn("rrf_score", b)
+
+    def test_weighted(self):
+        store = StubFusionStore(self.arms, "weighted")
+        results = store.fusion_search([0.1], "query", 2)
+        self.assertEqual([document.metadata["id"] for document, _ in results], ["b", "a"])
+        self.assertAlmostEqual(results[0][1], 0.8 / 0.9 + 1.0)
+        self.assertEqual(store.last_search_stats["overlap"], 1)
+
+    def test_failed_arm_is_left_out(self):
+        store = StubFusionStore({**self.arms, "keyword": RuntimeError("index missing")}, "rrf")
+        with self.assertLogs(level="ERROR"):
+            results = store.fusion_search([0.1], "query", 3)
+        self.assertEqual([document.metadata["id"] for document, _ in results], ["a", "b"])
+        self.assertEqual(store.last_search_stats["keyword"]["error"], "index missing")
+
+
+class MmrSelectTests(SimpleTestCase):
+    query = [1.0, 0.0, 0.0]
+    # A near-duplicate of the best hit, then a less similar but different one
+    candidates = [[0.95, 0.31, 0.0], [0.94, 0.34, 0.0], [0.9, -0.3, 0.3]]
+
+    def test_near_duplicate_is_demoted(self):
+        self.assertEqual(mmr_select(self.query, self.candidates, 3, lambda_mult=0.7), [0, 2, 1])
+
+    def test_relevance_only(self):
+        self.assertEqual(mmr_select(self.query, self.candidates, 3, lambda_mult=1.0), [0, 1, 2])
+
+    def test_lambda_one_is_similarity_order(self):
+        generator = np.random.default_rng(7)
+        query = generator.normal(size=16)
+        candidates = generator.normal(size=(50, 16))
+        similarity = candidates @ query / np.linalg.norm(candidates, axis=1) / np.linalg.norm(query)
+        self.assertEqual(mmr_select(query, candidates, 10, lambda_mult=1.0), list(np.argsort(-similarity)[:10]))
+
+    def test_bounds(self):
+        self.assertEqual(sorted(mmr_select(self.query, self.candidates, 10)), [0, 1, 2])
+        self.assertEqual(mmr_select(self.query, [], 3), [])
+        self.assertEqual(mmr_select(self.query, self.candidates, 0), [])
+
+
+class BudgetTests(SimpleTestCase):
+    def budget_of(self, budget):
+        started = time.monotonic()
+        return start_deadline(budget) - started
+
+    def test_default_and_given_budgets(self):
+        self.assertAlmostEqual(self.budget_of(None), REQUEST_BUDGET_SECONDS, places=2)
+        self.assertAlmostEqual(self.budget_of(5), 5, places=2)
+        self.assertAlmostEqual(self.budget_of("2.5"), 2.5, places=2)
+        self.assertAlmostEqual(self.budget_of(0), 0, places=2)
+
+    def test_budgets_are_clamped(self):
+        self.assertAlmostEqual(self.budget_of(-3), 0, places=2)
+        self.assertAlmostEqual(self.budget_of(10 * MAX_REQUEST_BUDGET_SECONDS), MAX_REQUEST_BUDGET_SECONDS, places=2)
+
+    def test_non_finite_budgets_are_rejected(self):
+        for budget in (math.nan, math.inf, -math.inf, "nan"):
+            with self.assertRaises(ValueError):
+                start_deadline(budget)
+
+    def test_remaining_and_capped_timeout(self):
+        self.assertEqual(remaining({}), math.inf)
+        self.assertEqual(capped_timeout({}, 4.0), 4.0)
+        self.assertEqual(remaining({"deadline": time.monotonic() - 1}), 0.0)
+        self.assertEqual(capped_timeout({"deadline": time.monotonic() - 1}, 4.0), 0.0)
+        state = {"deadline": time.monotonic() + 2}
+        self.assertAlmostEqual(capped_timeout(state, 4.0), 2.0, places=2)
+        self.assertAlmostEqual(capped_timeout(state, 1.0), 1.0, places=2)
+
+
+class SearchOptionsTests(SimpleTestCase):
+    def test_budgets(self):
+        for budget, expected in ((None, None), ("", None), ("0", 0.0), (0, 0.0), ("2.5", 2.5), (4, 4.0)):
+            self.assertEqual(search_options({"budget": budget})["budget"], expected, budget)
+
+    def test_invalid_budgets(self):
+        for budget in ("nan", "inf", "-inf", "soon", True, [1], math.nan):
+            with self.assertRaisesMessage(ValueError, "budget must be a number of seconds"):
+                search_options({"budget": budget})
+
+    def test_invalid_model_and_tool(self):
+        with self.assertRaisesMessage(ValueError, "model must be one of"):
+            search_options({"model": "gpt-2"})
+        with self.assertRaisesMessage(ValueError, "tool must be one of"):
+            search_options({"tool": "grep"})
+
+    def test_search_answers_400(self):
+        for params in ({"q": "x", "budget": "nan"}, {"q": "x", "tool": "grep"}, {"q": "x", "session_id": "a b"}):
+            with self.assertLogs("django.request", level="WARNING"):
+                response = self.client.get(reverse("search"), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+    def test_batch_answers_400(self):
+        for body in ('{"queries": ["x"], "budget": NaN}', '{"queries": ["x"], "budget": "inf"}',
+                     '{"queries": []}', "not json"):
+            with self.assertLogs("django.request", level="WARNING"):
+                response = self.client.post(reverse("search_batch"), body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", json.loads(response.content))
+
+
+FILLER = "Lorem ipsum dolor sit amet consectetur adipiscing elit. " * 20
+
+
+class BestSnippetsTests(SimpleTestCase):
+    text = (
+        FILLER
+        + "Export settings are on the study page. "
+        + FILLER
+        + "To export study data as CSV, open the study page and click Export. "
+        + FILLER
+    )
+
+    def test_passage_covering_most_terms_comes_first(self):
+        snippets = best_snippets(self.text, "export study data csv", count=1, width=120)
+        self.assertEqual(len(snippets), 1)
+        self.assertIn("To export study data as CSV", snippets[0]["text"])
+
+    def test_offsets_point_into_the_text(self):
+        snippets = best_snippets(self.text, "export study data csv", count=2, width=120)
+        self.assertEqual(len(snippets), 2)
+        self.assertLess(snippets[0]["end"], snippets[1]["start"])
+        for snippet in snippets:
+            self.assertEqual(self.text[snippet["start"]:snippet["end"]], snippet["text"])
+            self.assertLessEqual(len(snippet["text"]), 120)
+            self.assertFalse(snippet["text"][0].isspace() or snippet["text"][-1].isspace())
+            for start, end in snippet["matches"]:
+                self.assertIn(snippet["text"][start:end].lower(), {"export", "study", "data", "csv"})
+
+    def test_words_are_not_cut(self):
+        words = set(self.text.split())
+        for snippet in best_snippets(self.text, "study", width=90):
+            self.assertTrue(set(snippet["text"].split()) <= words)
+
+    def test_without_matches_the_opening_passage(self):
+        snippets = best_snippets(self.text, "genomic consent", width=60)
+        self.assertEqual(len(snippets), 1)
+        self.assertEqual(snippets[0]["start"], 0)
+        self.assertEqual(snippets[0]["matches"], [])
+        self.assertTrue(self.text.startswith(snippets[0]["text"]))
+
+    def test_empty_text(self):
+        self.assertEqual(best_snippets("", "export"), [])
+
+
+class BuildResponseTests(SimpleTestCase):
+    def test_titles_of_graphs_loaded_encoded_are_decoded(self):
+        document = Document(page_content="Rock &amp; roll stays as stored", metadata={
+            "id": "42", "title": "Researcher&rsquo;s guide", "space_name": "Data &amp; Access",
+            "data_source": "confluence",
+        })
+        response = build_response("guide", {"relevant_documents": [document]}, search_options({}))
+        fields = response["relevant_documents"][0]
+        self.assertEqual(fields["title"], "Researcher\u2019s guide")
+        self.assertEqual(fields["space_name"], "Data & Access")
+        self.assertEqual(fields["text"], "Rock &amp; roll stays as stored")
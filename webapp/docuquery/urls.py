@@ -1,10 +1,12 @@
-from django.urls import path
+from django.urls import path, re_path
 
 from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
     path('search/', views.search, name='search'),
+    # APPEND_SLASH can't redirect a POST, so the slash is optional
+    re_path(r'^search/batch/?$', views.search_batch, name='search_batch'),
     path('status/', views.api_status, name='api_status'),
     path('health/', views.health, name='health'),
 ]
@@ -1,13 +1,27 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+import html
 import logging
+import math
 import traceback
 import re
 import json
 import socket
+import time
 
-# from docuquery.graph.DocuQuery import DocuQuery
-from docuquery.graph.DocuQueryMultiRetriever import DocuQuery
+# The pipeline (langgraph, LangChain, the LLM and Neo4j clients) is
+# imported by the search views on first use, so health checks and worker
+# boots don't pay for it
+from docuquery.graph.llm_provider import hedge_stats, summarize_usage
+from docuquery.constants.app import DEFAULT_TOOL, MODELS, TOOLS
+from docuquery.constants.batch import BATCH_MAX_QUERIES
+from docuquery.constants.llm import LLM_PROVIDER
+from docuquery.constants.response import DOCUMENT_FIELDS, RESPONSE_FIELDS
+from docuquery.constants.session import SESSION_ID_MAX_LENGTH
+from docuquery.responses import FastJsonResponse, dumps
+
+SESSION_ID_PATTERN = re.compile(rf"[A-Za-z0-9_-]{{1,{SESSION_ID_MAX_LENGTH}}}")
 
 
 @require_http_methods(["GET"])
@@ -40,61 +54,226 @@ def api_status(request):
                 "host": request.get_host(),
                 "method": request.method,
                 "path": request.path,
-            }
+            },
+            # Counts of this worker process only
+            "llm_hedging": hedge_stats(),
         }
         return JsonResponse(status_data)
     except Exception as e:
         logging.error(f"Status check error: {str(e)}")
         return JsonResponse({"status": "error", "error": str(e)}, status=500)
 
+def parse_fields(value):
+    """
+    Splits a fields= selector into response and document fields. Naming a
+    document field implies relevant_documents.
+
+    Returns:
+        (response fields, document fields), None where nothing was selected
+    """
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RESPONSE_FIELDS + DOCUMENT_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"unknown fields {', '.join(unknown)}; expected any of {', '.join(RESPONSE_FIELDS + DOCUMENT_FIELDS)}"
+        )
+    response_fields = [name for name in names if name in RESPONSE_FIELDS]
+    document_fields = [name for name in names if name in DOCUMENT_FIELDS]
+    if document_fields and response_fields and "relevant_documents" not in response_fields:
+        response_fields.append("relevant_documents")
+    return response_fields or None, document_fields or None
+
+def search_options(params):
+    """
+    Validates the options search and search_batch share.
+
+    Args:
+        params: The query parameters, or the decoded batch request body
+
+    Returns:
+        Dict of budget, model, tool, response_fields, document_fields,
+        snippets and extractive (None when not given)
+
+    Raises:
+        ValueError: With the message for a 400 response
+    """
+    budget = params.get('budget')
+    if budget == '':
+        budget = None
+    if budget is not None:
+        # 0 in a JSON body is a budget, as "0" in a query string is
+        try:
+            budget = None if isinstance(budget, bool) else float(budget)
+        except (TypeError, ValueError):
+            budget = None
+        if budget is None or not math.isfinite(budget):
+            raise ValueError("budget must be a number of seconds")
+    model = params.get('model') or None
+    if model and model not in [name for name, _ in MODELS]:
+        raise ValueError(f"model must be one of {', '.join(name for name, _ in MODELS)}")
+    if model and LLM_PROVIDER == "ollama":
+        # MODELS are OpenAI models; Ollama serves the stage models set up for it
+        raise ValueError("model can't be chosen with the Ollama provider")
+    tool = params.get('tool') or DEFAULT_TOOL
+    if tool not in [name for name, _ in TOOLS]:
+        raise ValueError(f"tool must be one of {', '.join(name for name, _ in TOOLS)}")
+    fields = params.get('fields') or ''
+    response_fields, document_fields = parse_fields(",".join(fields) if isinstance(fields, list) else str(fields))
+    snippets = str(params.get('snippets', '')).lower() in ("1", "true", "yes") or "snippets" in (document_fields or [])
+    # Snippets replace the full page text unless it is asked for by name
+    if snippets and document_fields is None:
+        document_fields = [name for name in DOCUMENT_FIELDS if name != "text"]
+    # Left unset, EXTRACTIVE_ENABLED decides
+    extractive = params.get('extractive')
+    extractive = str(extractive).lower() in ("1", "true", "yes") if extractive not in (None, '') else None
+    return {
+        "budget": budget,
+        "model": model,
+        "tool": tool,
+        "response_fields": response_fields,
+        "document_fields": document_fields,
+        "snippets": snippets,
+        "extractive": extractive,
+    }
+
+def stored_text(value):
+    """
+    A title or space name as stored. Ingestion decodes HTML entities, but
+    graphs loaded before it did still hold them encoded; decoded here until
+    they are reloaded.
+    """
+    return html.unescape(value) if value and "&" in value else value
+
+def build_response(query, response, options, session_id=None):
+    """
+    Response body of one search from the pipeline result.
+    """
+    from docuquery.graph.snippets import best_snippets
+
+    parsed_document = []
+    for document in response.get("relevant_documents", []):
+        # Retrieval returns these fields as metadata and the page text as
+        # the content, decoded at ingestion
+        metadata = document.metadata
+        clean_doc = {
+            "id": metadata.get("id", ""),
+            "title": stored_text(metadata.get("title", "")),
+            "data_source": metadata.get("data_source", ""),
+            "text": document.page_content,
+            "space_name": stored_text(metadata.get("space_name", "")),
+            "space_key": metadata.get("space_key", ""),
+            "score": metadata.get("similarity"),
+        }
+        if options["snippets"]:
+            clean_doc["snippets"] = best_snippets(clean_doc["text"], query)
+        if options["document_fields"] is not None:
+            clean_doc = {name: clean_doc[name] for name in options["document_fields"] if name in clean_doc}
+        parsed_document.append(clean_doc)
+
+    response_data = {
+        "answer": response.get("final_response"),
+        "postgres_rows": response.get("postgres_rows"),
+        "graph_rows": response.get("graph_rows"),
+        "query": query,
+        "tool": options["tool"],
+        "relevant_documents": parsed_document,
+        "degradations": response.get("degradations", []),
+        "usage": summarize_usage(response.get("llm_usage", [])),
+        # Quoted from the top document rather than generated
+        "extractive": bool(response.get("extractive")),
+    }
+    if session_id:
+        response_data["session"] = {
+            "id": session_id,
+            "reused": bool(response.get("session_reused")),
+            "similarity": response.get("session_similarity"),
+        }
+    logging.info(f"LLM usage for query '{query}': {dumps(response_data['usage']).decode()}")
+    if options["response_fields"] is not None:
+        response_data = {name: response_data[name] for name in options["response_fields"] if name in response_data}
+    return response_data
+
 @require_http_methods(["GET"])
 def search(request):
     query = request.GET.get('q', '')
     try:
-        docuquery = DocuQuery()
-        response = docuquery.invoke({"query": query, "username": "JaneSmith"})
-
-        parsed_document = []
-        for document in response.get("relevant_documents", []):
-            # Parse the document content
-            data = DocuQuery.parse_document_content(document.page_content)
-            
-            # Get the metadata
-            metadata = document.metadata
-            
-            # If text field is empty, use the raw page content with field names stripped
-            if not data.get("text"):
-                # Extract text by removing known field patterns
-                page_text = document.page_content
-                # Remove id:, title:, and data_source: patterns
-                page_text = re.sub(r'id:"[^"]*"\s*', '', page_text)
-                page_text = re.sub(r'title:"[^"]*"\s*', '', page_text)
-                page_text = re.sub(r'data_source:"[^"]*"\s*', '', page_text)
-                page_text = page_text.strip()
-                data["text"] = page_text
-            
-            # Create a clean document structure
-            clean_doc = {
-                "id": data.get("id", metadata.get("id", "")),
-                "title": data.get("title", metadata.get("title", "")),
-                "data_source": metadata.get("data_source", ""),
-                # Ensure 'text' field doesn't contain metadata fields
-                "text": data.get("text", ""),
-                # Add space information
-                "space_name": data.get("space_name", metadata.get("space_name", "")),
-                "space_key": data.get("space_key", metadata.get("space_key", "")),
-            }
-            
-            parsed_document.append(clean_doc)
-
-        response_data = {
-            "answer": response.get("final_response"),
-            "postgres_rows": response.get("postgres_rows"),
+        options = search_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    session_id = request.GET.get('session_id') or None
+    if session_id and not SESSION_ID_PATTERN.fullmatch(session_id):
+        return JsonResponse(
+            {"error": f"session_id must be up to {SESSION_ID_MAX_LENGTH} letters, digits, '-' or '_'"}, status=400
+        )
+    try:
+        from docuquery.graph.DocuQueryMultiRetriever import DocuQuery
+        docuquery = DocuQuery(options["tool"])
+        response = docuquery.invoke({
             "query": query,
-            "relevant_documents": parsed_document,
-        }
-        return JsonResponse(response_data)
+            "username": "JaneSmith",
+            "budget": options["budget"],
+            "model": options["model"],
+            "extractive": options["extractive"],
+            "session_id": session_id,
+        })
+        return FastJsonResponse(build_response(query, response, options, session_id))
     except Exception as e:
+        # The traceback stays in the logs; clients only get the message
         logging.error(f"Search error for query '{query}': {str(e)}")
         logging.error(traceback.format_exc())
-        return JsonResponse({"error": str(e), "traceback": traceback.format_exc()}, status=500) 
\ No newline at end of file
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def search_batch(request):
+    """
+    Searches a list of queries, {"queries": [...]} plus any search option,
+    and streams one NDJSON line per query as it finishes, tagged with its
+    index in the list, then a line with the batch summary.
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "body must be a JSON object"}, status=400)
+    queries = body.get("queries") if isinstance(body, dict) else None
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, str) for query in queries):
+        return JsonResponse({"error": "queries must be a non-empty list of strings"}, status=400)
+    if len(queries) > BATCH_MAX_QUERIES:
+        return JsonResponse({"error": f"at most {BATCH_MAX_QUERIES} queries per batch"}, status=400)
+    try:
+        options = search_options(body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    from docuquery.graph.batch import run_batch
+
+    def lines():
+        stats = {}
+        usage = []
+        started = time.monotonic()
+        for indexes, response, error in run_batch(
+            queries, options["tool"], options["budget"], options["model"], stats=stats,
+            extractive=options["extractive"],
+        ):
+            if error is not None:
+                logging.error(f"Batch search error for query '{queries[indexes[0]]}': {str(error)}")
+                logging.error("".join(traceback.format_exception(error)))
+            else:
+                usage.extend(response.get("llm_usage", []))
+            for index in indexes:
+                if error is not None:
+                    line = {"index": index, "query": queries[index], "error": str(error)}
+                else:
+                    line = {"index": index, **build_response(queries[index], response, options)}
+                yield dumps(line) + b"\n"
+        yield dumps({"summary": {
+            **stats,
+            "seconds": round(time.monotonic() - started, 3),
+            "usage": summarize_usage(usage),
+        }}) + b"\n"
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    # Lines go out as each query finishes: not compressed (CompressionMiddleware)
+    # nor buffered by nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings picked up from the working directory (/webapp).
+
+Command line flags in docker-compose still set bind, workers and worker
+class; this file only adds hooks and the preload mode.
+
+With GUNICORN_PRELOAD=true the master imports the app and the search
+pipeline before forking (docuquery.graph.preload), so workers start
+serving at once and share that memory copy-on-write.
+"""
+import os
+import sys
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+if preload_app and any("gevent" in arg for arg in sys.argv):
+    # Locks and sockets created while preloading must already be gevent's;
+    # gevent workers otherwise only patch after the fork
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def when_ready(server):
+    # Runs in the master once the app is loaded, before any worker forks
+    if not server.cfg.preload_app:
+        return
+    import gc
+    from django.urls import get_resolver
+    from docuquery.graph.preload import preload
+
+    get_resolver().url_patterns
+    preload()
+    # Keeps the collector from touching, and so copying, the preloaded
+    # objects in every worker
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Runs in each worker after the app is loaded and, for gevent workers,
+    # after monkey patching, so the pooled sockets are cooperative
+    from docuquery.graph.llm_provider import warm_up
+    warm_up()